@@ -1,14 +1,8 @@
 import streamlit as st
-from pathlib import Path
 import calendar
 from datetime import datetime
-
-# Funzione per caricare il CSS
-def load_css():
-    css_path = Path("assets/styles.css")
-    with open(css_path, "r") as f:
-        css = f.read()
-    st.markdown(f"<style>{css}</style>", unsafe_allow_html=True)
+from utils.assets import asset_url, load_css
+from utils.warmup import start_warmup
 
 # Funzione per nascondere la sidebar
 def hide_sidebar():
@@ -27,7 +21,8 @@ def home_page():
     hide_sidebar()  # Nasconde la sidebar
     load_css()  # Carica il CSS personalizzato
     st.title("Benvenuto!")
-    st.image("assets/logo.png", width=200)  # Mostra il logo
+    # Logo come file statico: st.image importerebbe numpy e PIL anche solo per un URL
+    st.markdown(f'<img src="{asset_url("logo.png")}" width="200" alt="Logo">', unsafe_allow_html=True)
     st.write("Benvenuto nella nostra piattaforma! Scegli un'opzione per continuare.")
 
     col1, col2 = st.columns([1, 1])  # Due colonne uguali
@@ -172,4 +167,7 @@ else:
     st.error("Accesso non autorizzato! Torna al Login.")
 
 
-    
\ No newline at end of file
+    
+
+# Dopo il rendering: le librerie delle altre pagine si caricano mentre l'utente legge questa
+start_warmup()
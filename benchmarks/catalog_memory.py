@@ -0,0 +1,91 @@
+"""Memoria del catalogo mappato: caricamento originale contro importazione con schema compatto.
+
+Il riferimento ("before") è il percorso della prima versione della pagina: pd.read_csv
+delle colonne usate, le stesse conversioni dei tipi e la mappatura riga per riga, con il
+testo come oggetti Python (il comportamento di pandas 2, su cui la pagina è stata
+scritta). Il risultato ("after") è ingest_files seguito da map_data con lo schema di
+utils.schema. Il confronto è sulle colonne presenti in entrambi.
+
+    python benchmarks/catalog_memory.py --products temp_files/products_*.csv \
+        --categories temp_files/categories_*.csv --manufacturers temp_files/manufacturers_*.csv
+"""
+import argparse
+import glob
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from check_map_data import map_data_rowwise  # noqa: E402
+from utils.catalog_utils import map_data  # noqa: E402
+from utils.ingest import ingest_files  # noqa: E402
+from utils.schema import memory_report  # noqa: E402
+
+# Colonne lette dalla prima versione della pagina
+LEGACY_PRODUCT_COLUMNS = ['ID', 'NAME', 'DESCRIPTION', 'CATEGORY', 'BRAND', 'PRICE', 'STOCK', 'EAN13', 'IMAGE1']
+
+# Testo libero: non si riduce cambiando tipo, solo comprimendolo
+FREE_TEXT_COLUMNS = ['DESCRIPTION']
+
+
+def _expand(patterns):
+    return sorted(path for pattern in patterns for path in glob.glob(pattern))
+
+
+def _read_legacy(files, columns):
+    frame = pd.concat([pd.read_csv(file, delimiter=';', usecols=columns, low_memory=False) for file in files],
+                      ignore_index=True)
+    frame.columns = frame.columns.str.strip()
+    # Testo come oggetti Python, come in pandas 2 (pandas 3 usa stringhe Arrow per default)
+    return frame.astype({col: object for col in frame.columns if pd.api.types.is_string_dtype(frame[col])})
+
+
+def load_legacy(product_files, category_files, manufacturer_files):
+    """Catalogo mappato con il caricamento e la mappatura originali."""
+    products = _read_legacy(product_files, LEGACY_PRODUCT_COLUMNS)
+    categories = _read_legacy(category_files, ['ID', 'NAME'])
+    manufacturers = _read_legacy(manufacturer_files, ['ID', 'NAME'])
+
+    categories['ID'] = pd.to_numeric(categories['ID'], errors='coerce').fillna(0).astype(int)
+    products['CATEGORY'] = products['CATEGORY'].astype(str).astype(object)
+    products['BRAND'] = pd.to_numeric(products['BRAND'], errors='coerce').fillna(0).astype(int)
+    products['PRICE'] = pd.to_numeric(products['PRICE'], errors='coerce').fillna(0)
+    products['EAN13'] = products['EAN13'].apply(lambda x: f"{int(x):013}" if pd.notnull(x) and x != '' else '')
+    # La vecchia mappatura richiede ID univoci (pivot e merge per ID)
+    products = products.drop_duplicates('ID', keep='last')
+    mapped = map_data_rowwise(products, categories, manufacturers)
+    return mapped.astype({col: object for col in mapped.columns if pd.api.types.is_string_dtype(mapped[col])})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", nargs="+", default=["temp_files/products_*.csv"])
+    parser.add_argument("--categories", nargs="+", default=["temp_files/categories_*.csv"])
+    parser.add_argument("--manufacturers", nargs="+", default=["temp_files/manufacturers_*.csv"])
+    args = parser.parse_args()
+    files = _expand(args.products), _expand(args.categories), _expand(args.manufacturers)
+
+    before = load_legacy(*files)
+    products, categories, manufacturers, _ = ingest_files(*files)
+    after = map_data(products.drop_duplicates('ID', keep='last'), categories, manufacturers)
+    common = [col for col in before.columns if col in after.columns]
+    report = memory_report(before[common], after[common])
+
+    print(f"{len(after)} prodotti")
+    print(report.to_string())
+    total = report.loc["TOTAL"]
+    print(f"Totale: {total['before'] / 2**20:.1f} MB -> {total['after'] / 2**20:.1f} MB ({total['ratio']:.2f}x)")
+    # Il testo libero (descrizioni HTML) occupa quasi lo stesso spazio in entrambi i formati
+    rest = report.drop(index=["TOTAL", *FREE_TEXT_COLUMNS], errors="ignore")[["before", "after"]].sum()
+    print(f"Senza {', '.join(FREE_TEXT_COLUMNS)}: {rest['before'] / 2**20:.1f} MB -> {rest['after'] / 2**20:.1f} MB "
+          f"({rest['before'] / rest['after']:.2f}x)")
+    extra = [col for col in after.columns if col not in common]
+    if extra:
+        extra_bytes = after[extra].memory_usage(index=False, deep=True).sum()
+        print(f"Colonne in più dell'importazione ({', '.join(extra)}): {extra_bytes / 2**20:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Verifica le statistiche del catalogo sui feed limite: vuoti, senza categorie, con prezzi mancanti.
+
+Ogni caso passa dal percorso di un caricamento reale (file CSV BigBuy, ingest_files,
+map_data, compute_catalog_stats) e dal salvataggio e rilettura delle statistiche, e i
+totali vengono confrontati con i valori attesi. Termina con errore alla prima differenza.
+
+    python benchmarks/check_catalog_stats.py
+"""
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from generate_catalog import CATEGORY_HEADER, MANUFACTURER_HEADER, PRODUCT_HEADER  # noqa: E402
+from utils.catalog_stats import compute_catalog_stats, read_catalog_stats, save_catalog_stats  # noqa: E402
+from utils.catalog_utils import map_data  # noqa: E402
+from utils.ingest import ingest_files  # noqa: E402
+
+# Categorie e produttori comuni a tutti i casi
+CATEGORIES = [{"ID": "10", "NAME": "Casa"}, {"ID": "11", "NAME": "Giardino"}]
+MANUFACTURERS = [{"ID": "1", "NAME": "Marca A"}]
+
+# Casi: nome -> (righe prodotto, totali attesi)
+CASES = {
+    "solo intestazione": ([], {"products": 0, "categories": 0, "manufacturers": 0, "price_mean": None}),
+    "categorie vuote": (
+        [{"ID": "1", "CATEGORY": "", "BRAND": "1", "PRICE": "9.50", "STOCK": "3"},
+         {"ID": "2", "CATEGORY": "", "BRAND": "1", "PRICE": "10.50", "STOCK": "0"}],
+        {"products": 2, "categories": 0, "manufacturers": 1, "price_mean": 10.0, "in_stock": 1},
+    ),
+    # L'importazione legge i prezzi mancanti come 0, come la prima versione della pagina
+    "prezzi mancanti": (
+        [{"ID": "1", "CATEGORY": "10", "BRAND": "1", "PRICE": "", "STOCK": "2"},
+         {"ID": "2", "CATEGORY": "10,11", "BRAND": "", "PRICE": "", "STOCK": "0"}],
+        {"products": 2, "categories": 2, "manufacturers": 1, "price_mean": 0.0, "stock": 2},
+    ),
+    "con e senza categorie": (
+        [{"ID": "1", "CATEGORY": "10", "BRAND": "1", "PRICE": "4.00", "STOCK": "1"},
+         {"ID": "2", "CATEGORY": "", "BRAND": "1", "PRICE": "6.00", "STOCK": "1"}],
+        {"products": 2, "categories": 1, "manufacturers": 1, "price_mean": 5.0},
+    ),
+}
+
+
+def _write(path, header, rows):
+    with open(path, "w", encoding="utf-8-sig") as f:
+        f.write(";".join(header) + "\n")
+        for row in rows:
+            f.write(";".join(row.get(col, "") for col in header) + "\n")
+
+
+def check(name, rows, expected, directory):
+    paths = [os.path.join(directory, f"{kind}.csv") for kind in ("products", "categories", "manufacturers")]
+    _write(paths[0], PRODUCT_HEADER, [{"NAME": f"Prodotto {row['ID']}", **row} for row in rows])
+    _write(paths[1], CATEGORY_HEADER, CATEGORIES)
+    _write(paths[2], MANUFACTURER_HEADER, MANUFACTURERS)
+
+    products, categories, manufacturers, _ = ingest_files([paths[0]], [paths[1]], [paths[2]])
+    stats = compute_catalog_stats(map_data(products, categories, manufacturers))
+    save_catalog_stats(stats, directory)
+    stats = read_catalog_stats(directory)
+
+    for key, value in expected.items():
+        actual = stats["summary"][key]
+        if actual != value and not (value is not None and actual is not None and abs(actual - value) < 1e-6):
+            raise AssertionError(f"{name}: {key} = {actual!r}, atteso {value!r}")
+    print(f"{name}: statistiche corrette")
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        for name, (rows, expected) in CASES.items():
+            check(name, rows, expected, directory)
+
+
+if __name__ == "__main__":
+    main()
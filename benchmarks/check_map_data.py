@@ -0,0 +1,106 @@
+"""Verifica che map_data dia lo stesso risultato della mappatura riga per riga originale.
+
+Confronta Category_List, Manufacturer e CATEGORY_1..N prodotti da map_data con quelli
+della vecchia implementazione (re.split in un apply, poi explode/pivot/merge), su un
+insieme di casi limite (categorie mancanti, vuote, multiple con separatori diversi, ID
+sconosciuti o non numerici, produttori mancanti o sconosciuti) e sui file di esempio in
+temp_files. Termina con errore alla prima differenza.
+
+    python benchmarks/check_map_data.py
+"""
+import glob
+import os
+import re
+import sys
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from utils.catalog_utils import load_data, map_data  # noqa: E402
+
+# File di esempio del feed BigBuy versionati con il progetto
+SAMPLE_DIR = os.path.join(ROOT, "temp_files")
+
+
+def map_data_rowwise(products, categories, manufacturers):
+    """La mappatura originale, riga per riga, usata come riferimento."""
+    products = products.copy()
+    category_map = categories.set_index('ID')['NAME'].to_dict()
+
+    def map_category_names(category_ids):
+        if pd.isnull(category_ids):
+            return []
+        try:
+            id_list = [int(cat.strip()) for cat in re.split(r'[ ,;]+', category_ids) if cat.strip().isdigit()]
+            category_names = [category_map.get(cat, f"ID: {cat}") for cat in id_list]
+            return category_names
+        except ValueError:
+            return []
+
+    products['Category_List'] = products['CATEGORY'].apply(map_category_names)
+    manufacturer_map = manufacturers.set_index('ID')['NAME'].to_dict()
+    products['Manufacturer'] = products['BRAND'].map(manufacturer_map)
+
+    exploded = products.explode('Category_List')
+    exploded['Category_Index'] = exploded.groupby('ID').cumcount() + 1
+    pivoted = exploded.pivot(index='ID', columns='Category_Index', values='Category_List')
+    pivoted.columns = [f"CATEGORY_{col}" for col in pivoted.columns]
+    pivoted.reset_index(inplace=True)
+    return pd.merge(products, pivoted, on='ID', how='left')
+
+
+def edge_cases():
+    """Prodotti, categorie e produttori con i casi limite della mappatura."""
+    products = pd.DataFrame({
+        "ID": [1, 2, 3, 4, 5, 6, 7, 8, 9],
+        "NAME": [f"Prodotto {i}" for i in range(1, 10)],
+        "CATEGORY": ["10,11", np.nan, "10;999", "abc", "", "12 10", " 11 , 12;; 10 ", "10,x,11", "999"],
+        "BRAND": [1.0, 2.0, np.nan, 99.0, 1.0, 2.0, 1.0, np.nan, 2.0],
+    })
+    categories = pd.DataFrame({"ID": [10, 11, 12, 12], "NAME": ["Casa", "Giardino", "Vecchio nome", "Cucina"]})
+    manufacturers = pd.DataFrame({"ID": [1, 2], "NAME": ["Marca A", "Marca B"]})
+    return products, categories, manufacturers
+
+
+def _normalized(products):
+    """Colonne calcolate in forma confrontabile: liste Python e None per i mancanti."""
+    category_columns = sorted((col for col in products.columns if re.fullmatch(r"CATEGORY_\d+", col)),
+                              key=lambda col: int(col.split("_")[1]))
+    frame = pd.DataFrame({
+        "ID": products["ID"].to_numpy(),
+        "Category_List": [list(values) for values in products["Category_List"]],
+        "Manufacturer": products["Manufacturer"].astype(object).where(products["Manufacturer"].notna(), None),
+    })
+    for col in category_columns:
+        values = products[col].astype(object)
+        frame[col] = values.where(values.notna(), None).to_numpy()
+    # Le colonne CATEGORY_k senza alcun valore non cambiano il significato del catalogo
+    empty = [col for col in category_columns if frame[col].isna().all()]
+    return frame.drop(columns=empty).sort_values("ID", kind="stable").reset_index(drop=True)
+
+
+def check(name, products, categories, manufacturers):
+    expected = _normalized(map_data_rowwise(products, categories, manufacturers))
+    actual = _normalized(map_data(products, categories, manufacturers, compact=False))
+    pd.testing.assert_frame_equal(actual, expected, check_dtype=False)
+    print(f"{name}: {len(products)} prodotti, risultato identico")
+
+
+def main():
+    check("casi limite", *edge_cases())
+    product_files = sorted(glob.glob(os.path.join(SAMPLE_DIR, "products_*.csv")))
+    if product_files:
+        products, categories, manufacturers = load_data(
+            product_files,
+            sorted(glob.glob(os.path.join(SAMPLE_DIR, "categories_*.csv"))),
+            sorted(glob.glob(os.path.join(SAMPLE_DIR, "manufacturers_*.csv"))),
+        )
+        # La vecchia mappatura richiede ID univoci (pivot e merge per ID)
+        check("file di esempio", products.drop_duplicates("ID", keep="last"), categories, manufacturers)
+
+
+if __name__ == "__main__":
+    main()
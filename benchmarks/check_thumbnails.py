@@ -0,0 +1,88 @@
+"""Verifica che la cache delle miniature scarichi solo URL http e https.
+
+Gli URL delle immagini arrivano dai feed caricati: un URL file:// (o un reindirizzamento
+verso file://) non deve essere letto dal server né pubblicato come miniatura, ma finire
+tra gli URL non riusciti, per cui la pagina mostra l'immagine originale. Come controllo,
+la stessa immagine servita in http da un server locale produce la miniatura. Termina con
+errore alla prima differenza.
+
+    python benchmarks/check_thumbnails.py
+"""
+import http.server
+import os
+import sys
+import tempfile
+import threading
+from functools import partial
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image  # noqa: E402
+
+from utils.thumbnails import ThumbnailCache, fetch_url  # noqa: E402
+
+# Attesa massima delle miniature in coda (s)
+WAIT_TIMEOUT = 30
+
+
+class _Handler(http.server.SimpleHTTPRequestHandler):
+    """Serve la directory dell'immagine; /redirect rimanda all'immagine come file://."""
+
+    def do_GET(self):
+        if self.path == "/redirect":
+            self.send_response(302)
+            self.send_header("Location", self.server.file_url)
+            self.end_headers()
+            return
+        super().do_GET()
+
+    def log_message(self, *args):
+        pass
+
+
+def thumbnail_url(cache, url):
+    """URL della miniatura di `url` dopo averne atteso la creazione (None se rifiutata)."""
+    cache.thumbnail_urls([url])
+    if not cache.wait(WAIT_TIMEOUT):
+        raise AssertionError(f"{url}: miniatura ancora in coda dopo {WAIT_TIMEOUT} s")
+    return cache.thumbnail_urls([url])[0]
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        image_path = os.path.join(directory, "image.png")
+        Image.new("RGB", (64, 48), "red").save(image_path)
+        file_url = "file://" + image_path
+
+        server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), partial(_Handler, directory=directory))
+        server.file_url = file_url
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base = f"http://127.0.0.1:{server.server_address[1]}"
+
+        cache = ThumbnailCache(directory=os.path.join(directory, "thumbnails"),
+                               index_path=os.path.join(directory, "thumbnails.db"))
+        try:
+            try:
+                fetch_url(file_url)
+            except ValueError:
+                print("fetch_url file://: rifiutato")
+            else:
+                raise AssertionError("fetch_url ha letto un URL file://")
+
+            for name, url in (("file://", file_url), ("reindirizzamento a file://", f"{base}/redirect")):
+                if thumbnail_url(cache, url) is not None:
+                    raise AssertionError(f"{name}: miniatura creata da {url}")
+                print(f"{name}: nessuna miniatura, si mostra l'immagine originale")
+            if cache.stats()["files"] != 0:
+                raise AssertionError("Miniature salvate per URL rifiutati")
+
+            if thumbnail_url(cache, f"{base}/image.png") is None:
+                raise AssertionError("http: miniatura non creata")
+            print("http: miniatura creata")
+        finally:
+            cache.close()
+            server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
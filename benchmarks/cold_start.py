@@ -0,0 +1,119 @@
+"""Avvio a freddo: primo rendering di ogni pagina in un interprete appena avviato.
+
+Ogni pagina viene eseguita con AppTest in un processo nuovo, con `python -X importtime`:
+si misurano l'avvio (import di Streamlit), il primo rendering della pagina (import dei moduli
+della pagina compresi) e i pacchetti più costosi importati durante il rendering. Con
+--after-home la pagina viene aperta dopo la pagina iniziale e una pausa (il tempo del
+login), come avviene per un utente: si vede l'effetto del caricamento in background
+(utils.warmup). Con --check i tempi mediani vengono confrontati con
+cold_start_budget.json e lo script termina con errore se una pagina supera il budget.
+
+    python benchmarks/cold_start.py --repeat 5 --check
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Budget in millisecondi del primo rendering di ogni pagina, a freddo e dopo la pagina iniziale
+BUDGET_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cold_start_budget.json")
+
+# Pagine misurate (percorsi relativi alla radice del progetto)
+PAGES = ("app.py", "pages/catalogo.py", "pages/finanze.py", "pages/dashboard.py")
+
+# Pausa tra la pagina iniziale e la pagina misurata con --after-home (s)
+HOME_PAUSE = 2.0
+
+# Separa nell'output di -X importtime l'avvio di Streamlit dal rendering della pagina
+RENDER_MARKER = "-- cold start: render --"
+
+RUNNER = """
+import json, sys, time
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+if {after_home!r}:
+    AppTest.from_file("app.py", default_timeout=120).run()
+    time.sleep({pause!r})
+imported = time.perf_counter()
+print({marker!r}, file=sys.stderr, flush=True)
+at = AppTest.from_file({page!r}, default_timeout=120)
+at.session_state["username"] = "benchmark"
+at.session_state["role"] = "user"
+at.run()
+rendered = time.perf_counter()
+print(json.dumps({{"startup_ms": (imported - start) * 1000, "render_ms": (rendered - imported) * 1000,
+                  "exceptions": [e.message for e in at.exception]}}))
+"""
+
+
+def _heaviest_imports(stderr, limit):
+    """Pacchetti di primo livello importati durante il rendering, per tempo cumulativo."""
+    totals = {}
+    rendering = False
+    for line in stderr.splitlines():
+        if line == RENDER_MARKER:
+            rendering = True
+            continue
+        if not rendering or not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        package = name.strip().split(".")[0]
+        # Solo le voci di primo livello: quelle annidate sono già nel cumulativo
+        if len(name) - len(name.lstrip()) == 1:
+            totals[package] = totals.get(package, 0) + int(cumulative) / 1000
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)[:limit]
+
+
+def measure(page, after_home=False):
+    runner = RUNNER.format(marker=RENDER_MARKER, page=page, after_home=after_home, pause=HOME_PAUSE)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", runner],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    timings["imports"] = _heaviest_imports(result.stderr, limit=6)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", nargs="+", default=list(PAGES))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--after-home", action="store_true", help="apre la pagina dopo la pagina iniziale")
+    parser.add_argument("--check", action="store_true", help="confronta con il budget (uscita 1 se superato)")
+    args = parser.parse_args()
+
+    budget = {}
+    if args.check:
+        with open(BUDGET_FILE, "r") as f:
+            budget = json.load(f)["after_home" if args.after_home else "cold"]
+
+    over_budget = []
+    for page in args.pages:
+        runs = [measure(page, args.after_home) for _ in range(args.repeat)]
+        render_ms = statistics.median(run["render_ms"] for run in runs)
+        startup_ms = statistics.median(run["startup_ms"] for run in runs)
+        limit = budget.get(page)
+        status = "" if limit is None else (" OK" if render_ms <= limit else " OLTRE IL BUDGET")
+        print(f"{page}: rendering {render_ms:.0f} ms (budget {limit or '-'} ms){status}, "
+              f"prima del rendering {startup_ms:.0f} ms")
+        for package, ms in runs[-1]["imports"]:
+            print(f"    {package:<24} {ms:8.1f} ms")
+        if runs[-1]["exceptions"]:
+            print(f"    eccezioni: {runs[-1]['exceptions']}")
+        if limit is not None and render_ms > limit:
+            over_budget.append(page)
+
+    if over_budget:
+        print(f"Budget superato: {', '.join(over_budget)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+"""Benchmark dei percorsi critici dei dati su un catalogo BigBuy sintetico.
+
+Misura tempo e picco di memoria di: importazione (load_data), mappatura (map_data),
+costruzione degli indici, ogni filtro della sidebar, impaginazione con rendering HTML,
+esportazione CSV, salvataggio e caricamento del catalogo (load_catalog_from_file) e
+scritture dei dati di sessione (auth.update_user_data). I file del catalogo vengono
+generati con generate_catalog.py alla prima esecuzione per ogni dimensione e riusati.
+
+I risultati si confrontano con quelli salvati in baseline.json per la stessa dimensione:
+un passo più lento o con più memoria oltre la tolleranza è una regressione e lo script
+termina con errore. I tempi dipendono dalla macchina: la baseline va salvata sulla
+stessa macchina su cui si confronta.
+
+    python benchmarks/data_paths.py --rows 100000
+    python benchmarks/data_paths.py --rows 100000 --save-baseline
+    python benchmarks/data_paths.py --rows 1000000 --repeat 1
+
+La baseline è salvata per 10.000, 100.000 e 1.000.000 di prodotti (quest'ultima con una
+sola ripetizione per passo, per durare pochi minuti).
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import streamlit.logger  # noqa: E402
+
+import auth  # noqa: E402
+from generate_catalog import generate_catalog  # noqa: E402
+from utils import catalog_utils  # noqa: E402
+from utils.data_utils import catalog_version, load_catalog_from_file, store_catalog  # noqa: E402
+from utils.export import write_export  # noqa: E402
+from utils.ingest import _PeakMemory  # noqa: E402
+from utils.query import CatalogQuery, QueryEngine  # noqa: E402
+from utils.render import build_page, page_table_html  # noqa: E402
+from utils.search_index import CategoryIndex, TextSearchIndex  # noqa: E402
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Risultati di riferimento, per numero di prodotti
+BASELINE_FILE = os.path.join(BENCHMARK_DIR, "baseline.json")
+
+# File generati, uno per dimensione (non versionati)
+DATA_DIR = os.path.join(BENCHMARK_DIR, "data")
+
+# Regressione: oltre questa quota rispetto alla baseline e oltre le soglie assolute sotto
+TOLERANCE = 0.25
+MIN_SECONDS_DELTA = 0.02
+MIN_MEMORY_DELTA_MB = 16
+
+# Prodotti per pagina nel passo di impaginazione (il massimo offerto dalla pagina)
+PAGE_SIZE = 100
+
+# Scritture dei dati di sessione nel passo auth
+SESSION_WRITES = 200
+
+# Intervallo di campionamento della memoria (s): i passi più brevi durano pochi millisecondi
+PEAK_INTERVAL = 0.01
+
+
+class Suite:
+    """Esegue i passi e ne raccoglie tempo (il migliore su `repeat`) e picco di memoria."""
+
+    def __init__(self, repeat):
+        self.repeat = repeat
+        self.results = {}
+
+    def measure(self, name, fn, setup=None, repeat=None):
+        result, seconds, memory = None, float("inf"), 0.0
+        for _ in range(repeat or self.repeat):
+            argument = setup() if setup else None
+            # Picco della memoria residente durante il passo, rispetto all'inizio del passo
+            peak = _PeakMemory(interval=PEAK_INTERVAL)
+            baseline = peak.peak
+            with peak:
+                start = time.perf_counter()
+                result = fn(argument) if setup else fn()
+                seconds = min(seconds, time.perf_counter() - start)
+            memory = max(memory, (peak.peak - baseline) / 2**20)
+        self.results[name] = {"seconds": round(seconds, 4), "peak_mb": round(memory, 1)}
+        print(f"  {name:<28} {seconds * 1000:10.1f} ms  {memory:8.1f} MB")
+        return result
+
+
+def _catalog_files(rows):
+    directory = os.path.join(DATA_DIR, str(rows))
+    marker = os.path.join(directory, "complete")
+    if not os.path.exists(marker):
+        print(f"Generazione del catalogo sintetico ({rows} prodotti) in {directory}...")
+        generate_catalog(rows, directory)
+        open(marker, "w").close()
+    names = sorted(os.listdir(directory))
+    pick = lambda prefix: [os.path.join(directory, name) for name in names if name.startswith(prefix)]  # noqa: E731
+    return pick("products_"), pick("categories_"), pick("manufacturers_")
+
+
+def _export_csv(products, positions):
+    with tempfile.TemporaryFile() as out:
+        write_export(products, positions, list(products.columns), "CSV", out)
+        return out.tell()
+
+
+def _session_writes():
+    auth.set_user_session("benchmark", "user")
+    for i in range(SESSION_WRITES):
+        auth.update_user_data("catalogo_data", {"ref": f"{i:032x}", "view": {"page_size": 50, "view_mode": "Tabella HTML"}})
+
+
+def run(rows, repeat):
+    product_files, category_files, manufacturer_files = _catalog_files(rows)
+    suite = Suite(repeat)
+
+    feed, categories, manufacturers = suite.measure(
+        "load_data", lambda: catalog_utils.load_data(product_files, category_files, manufacturer_files))
+    products = suite.measure("map_data", lambda: catalog_utils.map_data(feed, categories, manufacturers))
+    del feed
+    version = catalog_version(products, categories, manufacturers)
+
+    text_index = suite.measure("indice parole chiave", lambda: TextSearchIndex(products))
+    category_index = suite.measure("indice categorie", lambda: CategoryIndex(products, categories))
+    new_engine = lambda: QueryEngine(products, text_index, category_index, version)  # noqa: E731
+
+    top_categories = category_index.category_counts().index[:2].tolist()
+    top_manufacturers = category_index.manufacturer_counts().index[:3].tolist()
+    filters = {
+        "filtro nome": CatalogQuery.from_sidebar(keywords_name="lamp"),
+        "filtro descrizione": CatalogQuery.from_sidebar(keywords_description="waterproof"),
+        "filtro combinato": CatalogQuery.from_sidebar(keywords_combined="kettle, speaker"),
+        "filtro categorie": CatalogQuery.from_sidebar(categories=top_categories),
+        "filtro produttori": CatalogQuery.from_sidebar(manufacturers=top_manufacturers),
+        "filtro prezzo": CatalogQuery.from_sidebar(min_price=20, max_price=80),
+        "filtro disponibili": CatalogQuery.from_sidebar(in_stock=True),
+        "tutti i filtri": CatalogQuery.from_sidebar("lamp", "", "", top_categories, (), 10, 200, True),
+    }
+    for name, query in filters.items():
+        # Una sola esecuzione su un motore nuovo: le ripetizioni troverebbero i risultati e le
+        # parole chiave già in cache
+        suite.measure(name, lambda engine, query=query: engine.positions(query), setup=new_engine, repeat=1)
+    suite.measure("conteggi sidebar", lambda engine: (
+        category_index.category_counts(engine.mask(filters["filtro nome"])),
+        category_index.manufacturer_counts(engine.mask(filters["filtro nome"])),
+    ), setup=new_engine)
+
+    positions = new_engine().positions(CatalogQuery.from_sidebar())
+    middle = max(1, len(positions) // PAGE_SIZE // 2)
+    suite.measure("pagina HTML", lambda: page_table_html(build_page(products, positions, middle, PAGE_SIZE)))
+    suite.measure("esportazione CSV", lambda: _export_csv(products, positions))
+
+    suite.measure("store_catalog", lambda _: store_catalog(version, products, categories, manufacturers),
+                  setup=lambda: shutil.rmtree("catalog_data", ignore_errors=True))
+    suite.measure("load_catalog_from_file", load_catalog_from_file)
+    suite.measure(f"auth: {SESSION_WRITES} scritture", _session_writes)
+    return suite.results
+
+
+def compare(results, baseline):
+    """Passi con tempo o memoria oltre la tolleranza rispetto alla baseline."""
+    regressions = []
+    for name, current in results.items():
+        reference = baseline.get(name)
+        if reference is None:
+            continue
+        if (current["seconds"] > reference["seconds"] * (1 + TOLERANCE)
+                and current["seconds"] - reference["seconds"] > MIN_SECONDS_DELTA):
+            regressions.append(f"{name}: {reference['seconds'] * 1000:.1f} -> {current['seconds'] * 1000:.1f} ms")
+        if (current["peak_mb"] > reference["peak_mb"] * (1 + TOLERANCE)
+                and current["peak_mb"] - reference["peak_mb"] > MIN_MEMORY_DELTA_MB):
+            regressions.append(f"{name}: {reference['peak_mb']:.1f} -> {current['peak_mb']:.1f} MB")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000, help="prodotti del catalogo (es. 10000, 100000, 1000000)")
+    parser.add_argument("--repeat", type=int, default=3, help="ripetizioni di ogni passo (si tiene il tempo migliore)")
+    parser.add_argument("--save-baseline", action="store_true", help="salva i risultati come nuova baseline")
+    args = parser.parse_args()
+
+    streamlit.logger.set_log_level("error")
+    if os.path.exists(BASELINE_FILE):
+        with open(BASELINE_FILE, "r") as f:
+            baselines = json.load(f)
+    else:
+        baselines = {}
+
+    # Archivio dei cataloghi e sessioni in una directory temporanea, non in quella del progetto
+    workdir = tempfile.mkdtemp(prefix="bench_")
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    os.makedirs("utils")
+    try:
+        print(f"{args.rows} prodotti, {args.repeat} ripetizioni per passo")
+        results = run(args.rows, args.repeat)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    key = str(args.rows)
+    if args.save_baseline:
+        baselines[key] = {"machine": f"{platform.machine()} {os.cpu_count()} CPU, Python {platform.python_version()}",
+                          "steps": results}
+        with open(BASELINE_FILE, "w") as f:
+            json.dump(baselines, f, indent=2, ensure_ascii=False)
+            f.write("\n")
+        print(f"Baseline salvata in {BASELINE_FILE}")
+        return
+
+    if key not in baselines:
+        print("Nessuna baseline per questa dimensione: usa --save-baseline per salvarla.")
+        return
+    regressions = compare(results, baselines[key]["steps"])
+    if regressions:
+        print("Regressioni rispetto alla baseline:")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(1)
+    print("Nessuna regressione rispetto alla baseline.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+"""Genera un catalogo BigBuy sintetico (prodotti, categorie, produttori) per i benchmark.
+
+I file hanno lo schema e il formato dei feed BigBuy: separatore ';', BOM UTF-8 iniziale,
+tutte le colonne del feed (anche quelle non importate), categorie multiple per prodotto
+("2662,2669,2663") con popolarità molto sbilanciata, descrizioni HTML lunghe, EAN13 e
+produttori a volte mancanti o sconosciuti. Con lo stesso seme i file sono identici.
+
+    python benchmarks/generate_catalog.py --rows 100000 --out benchmarks/data/100000
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+# Colonne del file prodotti BigBuy, nell'ordine del feed
+PRODUCT_HEADER = [
+    "ID", "CATEGORY", "NAME", "ATTRIBUTE1", "ATTRIBUTE2", "VALUE1", "VALUE2", "DESCRIPTION", "BRAND", "FEATURE",
+    "PRICE", "PVP_BIGBUY", "PVD", "IVA", "VIDEO", "EAN13", "WIDTH", "HEIGHT", "DEPTH", "WEIGHT", "STOCK",
+    "DATE_ADD", "DATE_UPD", "IMAGE1", "IMAGE2", "IMAGE3", "IMAGE4", "IMAGE5", "IMAGE6", "IMAGE7", "IMAGE8",
+    "IMAGE_ENERGY_EFFICIENCY", "CONDITION", "INTRASTAT",
+]
+CATEGORY_HEADER = ["ID", "ACTIVE", "NAME", "PARENT_CATEGORY", "ROOT_CATEGORY", "DESCRIPTION", "META_TITLE",
+                   "META_KEYWORDS", "META_DESCRIPTION", "URL_REWRITTEN", "IMAGE_URL", "DATE_ADD", "DATE_UPD"]
+MANUFACTURER_HEADER = ["ID", "ACTIVE", "NAME", "DESCRIPTION", "SHORT_DESCRIPTION", "META_TITLE", "META_KEYWORDS",
+                       "META_DESCRIPTION", "IMAGE_URL"]
+
+# Righe generate e scritte per volta
+GENERATE_CHUNK_ROWS = 100_000
+
+# Righe per file prodotti (BigBuy divide il feed in più file)
+ROWS_PER_PRODUCT_FILE = 250_000
+
+# File in cui vengono divise le categorie
+CATEGORY_FILES = 4
+
+# Quote di prodotti senza EAN13, senza produttore e con un produttore assente dal file produttori
+MISSING_EAN_SHARE = 0.05
+MISSING_BRAND_SHARE = 0.03
+UNKNOWN_BRAND_SHARE = 0.01
+
+ADJECTIVES = [
+    "Compact", "Deluxe", "Portable", "Wireless", "Ergonomic", "Classic", "Smart", "Foldable", "Vintage", "Premium",
+    "Rechargeable", "Waterproof", "Adjustable", "Magnetic", "Stainless", "Children's", "Professional", "Mini",
+    "Extra-Large", "Organic", "Decorative", "Inflatable", "Electric", "Manual", "Multifunction",
+]
+NOUNS = [
+    "Lamp", "Backpack", "Speaker", "Kettle", "Mug", "Pillow", "Blender", "Headphones", "Toy Car", "Puzzle",
+    "Cushion", "Frying Pan", "Watch", "Sunglasses", "Hair Dryer", "Doll", "Tent", "Bicycle Bell", "Notebook",
+    "Plant Pot", "Towel Set", "Umbrella", "Keyboard", "Mouse", "Charger", "Rug", "Vase", "Jacket", "Sneakers",
+    "Shampoo", "Perfume", "Candle", "Clock", "Mirror", "Chair", "Shelf", "Drone", "Camera", "Tripod", "Wallet",
+]
+MATERIALS = ["Metal", "Plastic", "Wood", "Cotton", "Glass", "Ceramic", "Bamboo", "Silicone", "Leather", "Polyester"]
+COLOURS = ["Black", "White", "Red", "Blue", "Green", "Grey", "Pink", "Beige", "Yellow", "Multicolour"]
+FEATURES = {
+    "Material": MATERIALS,
+    "Colour": COLOURS,
+    "Recommended age": ["+ 0 years", "+ 3 years", "+ 6 years", "Adults"],
+    "Power": ["40 W", "600 W", "1200 W", "2000 W"],
+    "Capacity": ["250 ml", "1,5 L", "5 L", "20 L"],
+    "Instruction manual": ["Multilanguage", "English", "Spanish"],
+}
+SENTENCES = [
+    "Ideal for those who seek quality products for everyday use.",
+    "Get it now at the best price!",
+    "Its modern design fits perfectly in any environment.",
+    "Made with resistant materials that guarantee a long service life.",
+    "Perfect as a gift for birthdays, anniversaries and special occasions.",
+    "Easy to clean and to store when not in use.",
+    "Complies with the current European safety regulations.",
+    "Lightweight and practical, you can take it anywhere.",
+    "Includes an instruction manual in several languages.",
+    "Energy efficient and respectful of the environment.",
+]
+CATEGORY_WORDS = [
+    "Home", "Garden", "Toys", "Baby", "Sports", "Outdoor", "Kitchen", "Electronics", "Computing", "Beauty",
+    "Health", "Fashion", "Accessories", "Pets", "Car", "Motorbike", "DIY", "Tools", "Lighting", "Decoration",
+    "Party", "Gaming", "Audio", "Photography", "Office", "Stationery", "Jewellery", "Watches", "Bags", "Travel",
+]
+
+
+def _pick(rng, words, size):
+    return np.asarray(words, dtype=object)[rng.integers(0, len(words), size)]
+
+
+def _dates(rng, size, start="2016-01-01", end="2025-06-30"):
+    low, high = np.datetime64(start, "s").astype(np.int64), np.datetime64(end, "s").astype(np.int64)
+    stamps = rng.integers(low, high, size).astype("datetime64[s]")
+    return pd.Series(np.datetime_as_string(stamps)).str.replace("T", " ", regex=False)
+
+
+def _popularity(rng, size, exponent=0.9):
+    """Probabilità sbilanciate (tipo Zipf) in ordine casuale: poche voci molto frequenti."""
+    weights = 1.0 / np.arange(1, size + 1) ** exponent
+    return rng.permutation(weights / weights.sum())
+
+
+def generate_categories(rng, count):
+    ids = np.sort(rng.choice(np.arange(2000, 2000 + count * 4), count, replace=False))
+    first, second = _pick(rng, CATEGORY_WORDS, count), _pick(rng, CATEGORY_WORDS, count)
+    names = pd.Series(first) + np.where(rng.random(count) < 0.5, " & ", " and ") + pd.Series(second)
+    # Nomi ripetuti in rami diversi, come nel feed reale
+    names = names + np.where(rng.random(count) < 0.3, " (" + pd.Series(ids.astype(str)) + ")", "")
+    parents = _pick(rng, CATEGORY_WORDS, count)
+    return pd.DataFrame({
+        "ID": ids, "ACTIVE": 1, "NAME": names, "PARENT_CATEGORY": parents, "ROOT_CATEGORY": 0,
+        "DESCRIPTION": "", "META_TITLE": "", "META_KEYWORDS": "", "META_DESCRIPTION": "",
+        "URL_REWRITTEN": names.str.lower().str.replace(r"[^a-z0-9]+", "-", regex=True), "IMAGE_URL": "",
+        "DATE_ADD": _dates(rng, count), "DATE_UPD": _dates(rng, count, start="2022-01-01"),
+    })[CATEGORY_HEADER]
+
+
+def generate_manufacturers(rng, count):
+    syllables = ["Ta", "Ko", "Ri", "Mex", "Lu", "Von", "Zar", "Pel", "Qui", "Bo", "Sun", "Gal", "Ner", "Fi"]
+    names = pd.Series(_pick(rng, syllables, count)) + pd.Series(_pick(rng, syllables, count)).str.lower()
+    names = names + np.where(rng.random(count) < 0.4, " " + pd.Series(_pick(rng, ["Home", "Kids", "Pro", "Style"], count)), "")
+    names = names + " " + pd.Series(np.arange(1, count + 1).astype(str))
+    return pd.DataFrame({
+        "ID": np.arange(1, count + 1), "ACTIVE": 1, "NAME": names, "DESCRIPTION": "", "SHORT_DESCRIPTION": "",
+        "META_TITLE": "", "META_KEYWORDS": "", "META_DESCRIPTION": "", "IMAGE_URL": "",
+    })[MANUFACTURER_HEADER]
+
+
+def _description_bodies(rng, count=400):
+    bodies = []
+    for _ in range(count):
+        sentences = " ".join(rng.choice(SENTENCES, rng.integers(2, 8)))
+        features = "".join(
+            f"<li>{feature}: {rng.choice(FEATURES[feature])}</li>"
+            for feature in rng.choice(list(FEATURES), 3, replace=False)
+        )
+        # Ripetizioni per descrizioni tra qualche centinaio e qualche migliaio di caratteri
+        bodies.append(f"{sentences}<br><br><ul>{features}</ul>&nbsp;" + sentences * int(rng.integers(0, 4)))
+    return np.asarray(bodies, dtype=object)
+
+
+def generate_products(rng, start, count, ids, category_ids, category_weights, manufacturer_count, bodies):
+    names = (pd.Series(_pick(rng, ADJECTIVES, count)) + " " + _pick(rng, NOUNS, count) + " "
+             + _pick(rng, COLOURS, count) + " " + _pick(rng, MATERIALS, count)
+             + " (" + rng.integers(5, 120, count).astype(str) + " x " + rng.integers(5, 120, count).astype(str) + " cm)")
+
+    # Da 1 a 4 categorie per prodotto, scelte secondo la popolarità
+    per_product = rng.choice([1, 2, 3, 4], count, p=[0.35, 0.4, 0.17, 0.08])
+    picks = category_ids[rng.choice(len(category_ids), per_product.sum(), p=category_weights)].astype(str)
+    offsets = np.concatenate([[0], np.cumsum(per_product)])
+    categories = [",".join(picks[offsets[i]:offsets[i + 1]]) for i in range(count)]
+
+    brands = rng.integers(1, manufacturer_count + 1, count).astype(object)
+    roll = rng.random(count)
+    brands[roll < MISSING_BRAND_SHARE] = ""
+    brands[(roll >= MISSING_BRAND_SHARE) & (roll < MISSING_BRAND_SHARE + UNKNOWN_BRAND_SHARE)] = manufacturer_count + 999
+
+    ean = rng.integers(10**12, 10**13 - 1, count, dtype=np.int64).astype(str).astype(object)
+    ean[rng.random(count) < MISSING_EAN_SHARE] = ""
+    price = np.round(rng.lognormal(mean=3.2, sigma=0.9, size=count), 2)
+    stock = np.where(rng.random(count) < 0.4, 0, rng.geometric(0.02, count))
+    brand_names = pd.Series(_pick(rng, ["Gonher", "Fisher Price", "Bosch", "Philips", "Lego"], count))
+    descriptions = ("Discover <b>" + names + "</b>, by <b>" + brand_names + "</b>! "
+                    + bodies[rng.integers(0, len(bodies), count)])
+    images = "https://cdnbigbuy.com/images/" + pd.Series(ean).where(pd.Series(ean) != "", "0") + "_P0" \
+        + rng.integers(0, 9, count).astype(str) + ".jpg"
+
+    frame = pd.DataFrame({
+        "ID": ["S" + str(value) for value in ids[start:start + count]],
+        "CATEGORY": categories,
+        "NAME": names,
+        "ATTRIBUTE1": "", "ATTRIBUTE2": "", "VALUE1": "", "VALUE2": "",
+        "DESCRIPTION": descriptions,
+        "BRAND": brands,
+        "FEATURE": "",
+        "PRICE": price,
+        "PVP_BIGBUY": np.round(price * 1.45, 2),
+        "PVD": np.round(price * 0.8, 2),
+        "IVA": 21,
+        "VIDEO": 0,
+        "EAN13": ean,
+        "WIDTH": rng.integers(1, 120, count), "HEIGHT": rng.integers(1, 120, count), "DEPTH": rng.integers(1, 60, count),
+        "WEIGHT": np.round(rng.gamma(2.0, 0.8, count), 2),
+        "STOCK": stock,
+        "DATE_ADD": _dates(rng, count),
+        "DATE_UPD": _dates(rng, count, start="2024-01-01"),
+        "IMAGE1": images,
+    })
+    for column in PRODUCT_HEADER:
+        if column not in frame:
+            frame[column] = ""
+    frame["CONDITION"] = "NEW"
+    return frame[PRODUCT_HEADER]
+
+
+def _write(frame, path, header):
+    # utf-8-sig: BOM all'inizio del file come nei feed BigBuy
+    frame.to_csv(path, sep=";", index=False, header=header, mode="w" if header else "a",
+                 encoding="utf-8-sig" if header else "utf-8")
+
+
+def generate_catalog(rows, out, seed=0):
+    """Scrive i file del catalogo in `out` e ne restituisce i percorsi (prodotti, categorie, produttori)."""
+    rng = np.random.default_rng(seed)
+    os.makedirs(out, exist_ok=True)
+
+    categories = generate_categories(rng, min(2500, max(50, rows // 40)))
+    category_paths = []
+    for i, part in enumerate(np.array_split(np.arange(len(categories)), CATEGORY_FILES)):
+        path = os.path.join(out, f"categories_category_{i}_en.csv")
+        _write(categories.iloc[part], path, header=True)
+        category_paths.append(path)
+
+    manufacturers = generate_manufacturers(rng, min(4000, max(20, rows // 25)))
+    manufacturer_path = os.path.join(out, "manufacturers_en.csv")
+    _write(manufacturers, manufacturer_path, header=True)
+
+    ids = rng.choice(9_000_000, rows, replace=False) + 1_000_000
+    category_ids = categories["ID"].to_numpy()
+    category_weights = _popularity(rng, len(category_ids))
+    bodies = _description_bodies(rng)
+
+    product_paths = []
+    for file_start in range(0, rows, ROWS_PER_PRODUCT_FILE):
+        path = os.path.join(out, f"products_product_{len(product_paths)}_en.csv")
+        file_rows = min(ROWS_PER_PRODUCT_FILE, rows - file_start)
+        for chunk_start in range(0, file_rows, GENERATE_CHUNK_ROWS):
+            count = min(GENERATE_CHUNK_ROWS, file_rows - chunk_start)
+            frame = generate_products(rng, file_start + chunk_start, count, ids, category_ids, category_weights,
+                                      len(manufacturers), bodies)
+            _write(frame, path, header=chunk_start == 0)
+        product_paths.append(path)
+    return product_paths, category_paths, [manufacturer_path]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000, help="prodotti (es. 10000, 100000, 1000000)")
+    parser.add_argument("--out", default=None, help="directory dei file (predefinita: benchmarks/data/<righe>)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    out = args.out or os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", str(args.rows))
+    start = time.perf_counter()
+    products, categories, manufacturers = generate_catalog(args.rows, out, args.seed)
+    size = sum(os.path.getsize(path) for path in products + categories + manufacturers)
+    print(f"{args.rows} prodotti in {len(products)} file, {len(categories)} file categorie, "
+          f"{size / 2**20:.0f} MB in {time.perf_counter() - start:.1f} s: {out}")
+
+
+if __name__ == "__main__":
+    main()
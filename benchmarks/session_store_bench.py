@@ -0,0 +1,102 @@
+"""Confronta il vecchio file JSON delle sessioni con l'archivio SQLite sotto molti scrittori concorrenti.
+
+Ogni thread simula una sessione che salva ripetutamente le proprie chiavi. Per il file
+JSON si riproduce il comportamento originale (lettura di tutto il file, modifica di una
+chiave, riscrittura completa) e si contano gli aggiornamenti persi.
+
+    python benchmarks/session_store_bench.py --users 20 --writes 50 --payload-kb 64
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.session_store import SessionStore  # noqa: E402
+
+
+def _payload(kb):
+    return {"products": [{"ID": f"S{i:07d}", "NAME": "x" * 40} for i in range(kb * 1024 // 64)]}
+
+
+def _run_threads(users, target):
+    threads = [threading.Thread(target=target, args=(f"user{u}",)) for u in range(users)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start
+
+
+def bench_json(directory, users, writes, payload):
+    path = os.path.join(directory, "user_sessions.json")
+    with open(path, "w") as file:
+        json.dump({f"user{u}": {"role": "user", "last_page": "dashboard", "data": {"catalogo_data": payload}}
+                   for u in range(users)}, file)
+
+    def writer(username):
+        for i in range(writes):
+            try:
+                with open(path, "r") as file:
+                    sessions = json.load(file)
+            except json.JSONDecodeError:
+                # Come nel vecchio auth.py: file letto durante la riscrittura, scrittura saltata
+                continue
+            if username not in sessions:
+                continue
+            sessions[username]["data"][f"counter_{i}"] = i
+            with open(path, "w") as file:
+                json.dump(sessions, file)
+
+    seconds = _run_threads(users, writer)
+    try:
+        with open(path, "r") as file:
+            sessions = json.load(file)
+    except json.JSONDecodeError:
+        # Scritture concorrenti interlacciate: il file finale non è più leggibile
+        print("   json: file delle sessioni corrotto dalle scritture concorrenti")
+        return seconds, 0
+    kept = sum(key.startswith("counter_") for s in sessions.values() for key in s["data"])
+    return seconds, kept
+
+
+def bench_sqlite(directory, users, writes, payload):
+    store = SessionStore(os.path.join(directory, "user_sessions.db"), legacy_file=None)
+    for u in range(users):
+        store.ensure_user(f"user{u}", "user")
+        store.set_value(f"user{u}", "catalogo_data", payload)
+
+    def writer(username):
+        for i in range(writes):
+            store.set_value(username, f"counter_{i}", i)
+
+    seconds = _run_threads(users, writer)
+    kept = sum(key.startswith("counter_") for u in range(users) for key in store.get_user(f"user{u}")["data"])
+    store.close()
+    return seconds, kept
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=20, help="sessioni concorrenti")
+    parser.add_argument("--writes", type=int, default=50, help="scritture per sessione")
+    parser.add_argument("--payload-kb", type=int, default=64, help="dati già salvati per ogni utente")
+    args = parser.parse_args()
+
+    payload = _payload(args.payload_kb)
+    expected = args.users * args.writes
+    print(f"{args.users} sessioni x {args.writes} scritture, {args.payload_kb} KB di dati per utente")
+    for name, bench in (("json", bench_json), ("sqlite", bench_sqlite)):
+        with tempfile.TemporaryDirectory() as directory:
+            seconds, kept = bench(directory, args.users, args.writes, payload)
+        print(f"{name:>7}: {seconds:8.3f} s  {expected / seconds:10.0f} scritture/s  "
+              f"aggiornamenti persi: {expected - kept}/{expected}")
+
+
+if __name__ == "__main__":
+    main()
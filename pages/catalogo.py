@@ -2,10 +2,22 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 import os
-import re
-import random
 from auth import update_user_data, get_global_state
-from utils.data_utils import save_catalog_to_file, load_catalog_from_file
+from utils import catalog_utils
+from utils.data_utils import CATALOG_TABLES, catalog_in_store, catalog_version, get_catalog_version, load_catalog_stats, source_files_key, store_catalog
+from utils.catalog_stats import histogram_frame
+from utils.invoice_ledger import get_invoice_ledger
+from utils.catalog_registry import get_catalog_registry
+from utils.schema import compact_products, format_ean13
+from utils.ingest import ingest_files
+from utils.suppliers import DEFAULT_SUPPLIER, SUPPLIERS
+from utils.thumbnails import get_thumbnail_cache
+from utils.upload_spool import evict_uploads, spool_upload
+from utils.search_index import TextSearchIndex, CategoryIndex
+from utils.query import CatalogQuery, QueryEngine
+from utils.render import PAGE_SIZES, page_count, clamp_page, build_page, page_table_html
+from utils.export import ExportManager, available_formats
+from utils.perf import finish_rerun, start_rerun
 
 
 # Configurazione del layout
@@ -16,161 +28,267 @@ if "username" not in st.session_state:
     st.error("Accesso non autorizzato! Torna al login.")
     st.stop()
 
-# Caricamento dati persistenti
-user_data = get_global_state("catalogo_data", default={})
-if "products" in user_data:
-    st.session_state["products"] = pd.DataFrame(user_data["products"])
-if "categories" in user_data:
-    st.session_state["categories"] = pd.DataFrame(user_data["categories"])
-if "manufacturers" in user_data:
-    st.session_state["manufacturers"] = pd.DataFrame(user_data["manufacturers"])
-
-# Funzione per caricare i file
-@st.cache_data
-def load_data(product_files, category_files, manufacturer_files):
-    product_dfs = [pd.read_csv(file, delimiter=';', usecols=['ID', 'NAME', 'DESCRIPTION', 'CATEGORY', 'BRAND', 'PRICE', 'STOCK', 'EAN13', 'IMAGE1'], low_memory=False) for file in product_files]
-    products = pd.concat(product_dfs, ignore_index=True)
-
-    category_dfs = [pd.read_csv(file, delimiter=';', usecols=['ID', 'NAME'], low_memory=False) for file in category_files]
-    categories = pd.concat(category_dfs, ignore_index=True)
-
-    manufacturer_dfs = [pd.read_csv(file, delimiter=';', usecols=['ID', 'NAME'], low_memory=False) for file in manufacturer_files]
-    manufacturers = pd.concat(manufacturer_dfs, ignore_index=True)
-
-    products.columns = products.columns.str.strip()
-    categories.columns = categories.columns.str.strip()
-    manufacturers.columns = manufacturers.columns.str.strip()
-
-    if 'ID' in categories.columns:
-        categories['ID'] = pd.to_numeric(categories['ID'], errors='coerce').fillna(0).astype(int)
-    if 'CATEGORY' in products.columns:
-        products['CATEGORY'] = products['CATEGORY'].astype(str)
-    if 'BRAND' in products.columns:
-        products['BRAND'] = pd.to_numeric(products['BRAND'], errors='coerce').fillna(0).astype(int)
-    if 'PRICE' in products.columns:
-        products['PRICE'] = pd.to_numeric(products['PRICE'], errors='coerce').fillna(0)
-    if 'EAN13' in products.columns:
-        products['EAN13'] = products['EAN13'].apply(lambda x: f"{int(x):013}" if pd.notnull(x) and x != '' else '')
-
+# Tempi delle fasi di questo rerun (pagina Prestazioni, se la registrazione è attiva)
+start_rerun("catalogo", st.session_state["username"])
+
+# Impostazioni di visualizzazione salvate con i dati dell'utente
+VIEW_SETTINGS = ("show_full_description", "view_mode", "page_size")
+
+# Dati persistenti dell'utente: solo il riferimento al catalogo nell'archivio condiviso
+catalog_settings = get_global_state("catalogo_data", default={})
+if "products" in catalog_settings:
+    # Formato precedente, con il catalogo intero nei dati dell'utente: si sposta nell'archivio
+    legacy = [pd.DataFrame(catalog_settings.get(name, [])) for name in CATALOG_TABLES]
+    legacy[0] = compact_products(legacy[0])
+    catalog_settings = {"ref": store_catalog(catalog_version(*legacy), *legacy)}
+    update_user_data("catalogo_data", catalog_settings)
+    del legacy
+
+for key, value in catalog_settings.get("view", {}).items():
+    if key in VIEW_SETTINGS and key not in st.session_state:
+        st.session_state[key] = value
+
+# Funzione per caricare i file (in parallelo e a blocchi, con barra di avanzamento)
+def load_data(product_files, category_files, manufacturer_files, supplier):
+    progress_bar = st.progress(0.0, text="Importazione dei file in corso...")
+
+    def report_progress(done, total, rows):
+        progress_bar.progress(done / total, text=f"File importati: {done}/{total} ({rows} righe)")
+
+    products, categories, manufacturers, report = ingest_files(
+        product_files, category_files, manufacturer_files, progress=report_progress, supplier=supplier
+    )
+    progress_bar.empty()
+    st.info(
+        f"Importate {report['rows']} righe da {report['files']} file in {report['seconds']:.1f} s "
+        f"({report['workers']} processi, picco di memoria {report['peak_memory_bytes'] / 2**20:.0f} MB)."
+    )
     return products, categories, manufacturers
 
-# Verifica se i cataloghi sono già memorizzati
-if "products" not in st.session_state:
-    # Carica i cataloghi salvati sul disco
-    products, categories, manufacturers = load_catalog_from_file()
-    if products is not None:
-        st.session_state["products"] = products
-        st.session_state["categories"] = categories
-        st.session_state["manufacturers"] = manufacturers
+# Il catalogo è condiviso tra le sessioni del processo: in sessione resta solo l'handle
+if "catalog" not in st.session_state:
+    handle = get_catalog_registry().acquire(catalog_settings.get("ref"))
+    if handle is not None:
+        st.session_state["catalog"] = handle
         st.success("Cataloghi caricati correttamente dalla memoria persistente.")
     else:
         st.warning("Nessun catalogo trovato. Caricali per iniziare.")
-
-# Funzione per mappare i dati
-@st.cache_data
-def map_data(products, categories, manufacturers):
-    category_map = categories.set_index('ID')['NAME'].to_dict()
-
-    def map_category_names(category_ids):
-        if pd.isnull(category_ids):
-            return []
-        try:
-            id_list = [int(cat.strip()) for cat in re.split(r'[ ,;]+', category_ids) if cat.strip().isdigit()]
-            category_names = [category_map.get(cat, f"ID: {cat}") for cat in id_list]
-            return category_names
-        except ValueError:
-            return []
-
-    products['Category_List'] = products['CATEGORY'].apply(map_category_names)
-    manufacturer_map = manufacturers.set_index('ID')['NAME'].to_dict()
-    products['Manufacturer'] = products['BRAND'].map(manufacturer_map)
-
-    # Suddividere le categorie in colonne separate
-    exploded = products.explode('Category_List')
-    exploded['Category_Index'] = exploded.groupby('ID').cumcount() + 1
-    pivoted = exploded.pivot(index='ID', columns='Category_Index', values='Category_List')
-    pivoted.columns = [f"CATEGORY_{col}" for col in pivoted.columns]
-    pivoted.reset_index(inplace=True)
-    products = pd.merge(products, pivoted, on='ID', how='left')
-
-    return products
-
-# Funzione per salvare i file caricati
-@st.cache_data
+catalog = st.session_state.get("catalog")
+
+# Statistiche della dashboard, calcolate all'importazione e salvate con il catalogo
+@st.cache_data(max_entries=8, show_spinner=False)
+def get_catalog_stats(ref):
+    return load_catalog_stats(ref)
+
+# Categorie e produttori mostrati nei grafici della dashboard
+DASHBOARD_TOP_GROUPS = 10
+
+# Indice delle parole chiave, costruito una volta per versione del catalogo
+@st.cache_resource(max_entries=4, show_spinner="Indicizzazione del catalogo in corso...")
+def get_text_index(version, _products):
+    return TextSearchIndex(_products)
+
+# Indice di categorie e produttori (liste di righe e conteggi per le faccette)
+@st.cache_resource(max_entries=4, show_spinner="Indicizzazione delle categorie in corso...")
+def get_category_index(version, _products, _categories):
+    return CategoryIndex(_products, _categories)
+
+# Motore dei filtri con la cache dei risultati per (versione, query)
+@st.cache_resource(max_entries=4)
+def get_query_engine(version, _products, _categories):
+    return QueryEngine(_products, get_text_index(version, _products), get_category_index(version, _products, _categories), version)
+
+# Confronto tra fornitori, una volta per versione del catalogo (riusa le parti dei fornitori invariati)
+@st.cache_resource(max_entries=2, show_spinner="Confronto dei fornitori in corso...")
+def get_supplier_comparison(version, _products):
+    # Importato solo quando si apre il confronto
+    from utils.product_match import get_product_matcher
+
+    return get_product_matcher().compare(_products)
+
+# Articoli per pagina nel confronto tra fornitori
+COMPARISON_PAGE_SIZE = 50
+
+# Esportazioni in background, condivise tra le sessioni
+@st.cache_resource
+def get_export_manager():
+    return ExportManager()
+
+# Avanzamento dell'esportazione: aggiorna solo questo frammento finché il file non è pronto
+@st.fragment(run_every=1)
+def show_export_progress(job):
+    if job.done:
+        st.rerun()
+    st.progress(job.progress, text=f"Esportazione in corso: {job.rows_written} di {job.total_rows} righe")
+
+# Salva i file caricati, con l'impronta del contenuto nel nome. Ogni caricamento viene
+# salvato una sola volta per sessione: ai rerun successivi si riusa il percorso.
 def save_uploaded_files(uploaded_files, file_type):
-    TEMP_DIR = "temp_files"
-    if not os.path.exists(TEMP_DIR):
-        os.makedirs(TEMP_DIR)
-
+    spooled = st.session_state.setdefault('spooled_uploads', {})
     file_paths = []
     for uploaded_file in uploaded_files:
-        file_path = os.path.join(TEMP_DIR, f"{file_type}_{uploaded_file.name}")
-        with open(file_path, "wb") as f:
-            f.write(uploaded_file.getbuffer())
-        file_paths.append(file_path)
-
+        key = (uploaded_file.file_id, file_type)
+        path = spooled.get(key)
+        if path is None or not os.path.exists(path):
+            path = spooled[key] = spool_upload(uploaded_file, file_type)
+            evict_uploads(keep=spooled.values())
+        file_paths.append(path)
     return file_paths
 
+# Opzioni di un filtro a faccette: quelle con prodotti, più quelle già selezionate
+# (mostrate con 0), così un filtro a monte non cancella la selezione dell'utente
+def facet_options(counts, key):
+    options = counts.index.tolist()
+    return options + [value for value in st.session_state.get(key, []) if value not in counts.index]
+
 # Navigazione interna
-menu = ["Dashboard", "BigBuy", "Dreamlove", "VidaXL"]
+menu = ["Dashboard", *SUPPLIERS, "Confronto Fornitori"]
 choice = st.sidebar.radio("Navigazione Catalogo", menu)
 
 if choice == "Dashboard":
     st.markdown("<h2 style='text-align: center;'>Dashboard Interattiva</h2>", unsafe_allow_html=True)
 
+    stats = get_catalog_stats(catalog.ref) if catalog else None
+    summary = stats["summary"] if stats else {}
+
     # Visualizzazione di metriche principali
     col1, col2, col3, col4 = st.columns(4)
-    col1.metric("Prodotti Caricati", value=len(st.session_state.get("products", [])))
-    col2.metric("Categorie Disponibili", value=len(st.session_state.get("categories", [])))
-    col3.metric("Produttori", value=len(st.session_state.get("manufacturers", [])))
-    col4.metric("Stock Totale", value=random.randint(2000, 5000))
+    col1.metric("Prodotti Caricati", value=len(catalog.products) if catalog else 0)
+    col2.metric("Categorie Disponibili", value=len(catalog.categories) if catalog else 0)
+    col3.metric("Produttori", value=len(catalog.manufacturers) if catalog else 0)
+    col4.metric("Stock Totale", value=summary.get("stock", 0),
+                help=f"{summary['in_stock']} prodotti disponibili" if summary else None)
+
+    # Memoria dei cataloghi condivisi dal processo (per dimensionare i container)
+    if st.session_state.get("role") == "admin":
+        with st.expander("Memoria dei cataloghi condivisi"):
+            registry_stats = get_catalog_registry().stats()
+            col1, col2, col3, col4 = st.columns(4)
+            col1.metric("Memoria residente", f"{registry_stats['resident_bytes'] / 2**20:.1f} MB")
+            col2.metric("Budget", f"{registry_stats['budget_bytes'] / 2**20:.0f} MB")
+            col3.metric("Hit / Miss", f"{registry_stats['hits']} / {registry_stats['misses']}")
+            col4.metric("Rimossi", registry_stats['evictions'])
+            if registry_stats['catalogs']:
+                st.dataframe(pd.DataFrame(registry_stats['catalogs']), hide_index=True, use_container_width=True)
 
     st.markdown("<hr>", unsafe_allow_html=True)
 
-    # Grafici dinamici con numpy
     col1, col2, col3 = st.columns(3)
+    top_categories = stats["categories"].head(DASHBOARD_TOP_GROUPS).set_index("name") if stats else pd.DataFrame()
 
-    # Grafico 1: Distribuzione Prezzi
+    # Grafico 1: Prezzo medio delle categorie con più prodotti
     with col1:
-        st.markdown("<h5>Distribuzione Prezzi</h5>", unsafe_allow_html=True)
-        categories = ["Elettronica", "Casa", "Sport", "Moda"]
-        prices = [random.randint(10, 100) for _ in categories]
-        st.bar_chart(pd.DataFrame({"Categoria": categories, "Prezzo Medio (€)": prices}).set_index("Categoria"))
+        st.markdown("<h5>Prezzo Medio per Categoria</h5>", unsafe_allow_html=True)
+        if len(top_categories):
+            st.bar_chart(top_categories["price_mean"].round(2).rename("Prezzo Medio (€)").rename_axis("Categoria"))
+        else:
+            st.caption("Nessun catalogo caricato.")
 
     # Grafico 2: Stock per Categoria
     with col2:
         st.markdown("<h5>Stock per Categoria</h5>", unsafe_allow_html=True)
-        stocks = [random.randint(100, 1000) for _ in categories]
-        st.bar_chart(pd.DataFrame({"Categoria": categories, "Stock Totale": stocks}).set_index("Categoria"))
+        if len(top_categories):
+            st.bar_chart(top_categories["stock"].rename("Stock Totale").rename_axis("Categoria"))
+        else:
+            st.caption("Nessun catalogo caricato.")
 
-    # Grafico 3: Vendite per Mese
+    # Grafico 3: Vendite per Mese, dai riepiloghi del registro delle fatture
     with col3:
         st.markdown("<h5>Vendite Mensili</h5>", unsafe_allow_html=True)
-        months = ["Gen", "Feb", "Mar", "Apr", "Mag", "Giu"]
-        sales = [random.randint(100, 500) for _ in months]
-        st.line_chart(pd.DataFrame({"Mese": months, "Vendite (€)": sales}).set_index("Mese"))
+        sales = get_invoice_ledger().monthly_totals(st.session_state["username"])
+        if len(sales):
+            st.line_chart(sales.set_index("month")["revenue"].rename("Vendite (€)").rename_axis("Mese"))
+        else:
+            st.caption("Nessuna fattura registrata.")
+
+    # Distribuzione dei prezzi, per tutto il catalogo o per una categoria o un produttore
+    if stats:
+        with st.expander("Distribuzione dei prezzi"):
+            group_type = st.radio("Raggruppa per", ["Categoria", "Produttore"], horizontal=True, key="stats_group_type")
+            groups = stats["categories"] if group_type == "Categoria" else stats["manufacturers"]
+            selected = st.selectbox(group_type, options=[None] + groups["name"].tolist(),
+                                    format_func=lambda name: "Tutto il catalogo" if name is None else name,
+                                    key="stats_group")
+            if selected is None:
+                st.bar_chart(histogram_frame(stats, stats["price_histogram"]))
+            else:
+                st.bar_chart(histogram_frame(stats, groups.loc[groups["name"] == selected, "histogram"].iloc[0]))
+            st.dataframe(
+                groups.drop(columns="histogram").round(2).rename(columns={
+                    "name": group_type, "products": "Prodotti", "stock": "Stock", "in_stock": "Disponibili",
+                    "price_mean": "Prezzo Medio (€)", "price_min": "Minimo (€)", "price_q25": "1° Quartile (€)",
+                    "price_median": "Mediana (€)", "price_q75": "3° Quartile (€)", "price_max": "Massimo (€)",
+                }),
+                hide_index=True, use_container_width=True,
+            )
 
-elif choice == "BigBuy":
-    st.markdown("<h2 style='text-align: center;'>Catalogo BigBuy</h2>", unsafe_allow_html=True)
+elif choice in SUPPLIERS:
+    # Ogni fornitore ha il suo adattatore; l'importazione e il catalogo sono gli stessi
+    supplier = SUPPLIERS[choice]
+    st.markdown(f"<h2 style='text-align: center;'>Catalogo {supplier.name}</h2>", unsafe_allow_html=True)
     product_files = st.file_uploader("Carica i file prodotti", type=["csv"], accept_multiple_files=True)
-    category_files = st.file_uploader("Carica i file categorie", type=["csv"], accept_multiple_files=True)
-    manufacturer_files = st.file_uploader("Carica i file produttori", type=["csv"], accept_multiple_files=True)
-
-    if product_files and category_files and manufacturer_files:
-        product_paths = save_uploaded_files(product_files, "products")
-        category_paths = save_uploaded_files(category_files, "categories")
-        manufacturer_paths = save_uploaded_files(manufacturer_files, "manufacturers")
-
-        st.session_state['products'], st.session_state['categories'], st.session_state['manufacturers'] = load_data(product_paths, category_paths, manufacturer_paths)
-        st.session_state['products'] = map_data(st.session_state['products'], st.session_state['categories'], st.session_state['manufacturers'])
-        update_user_data('catalogo_data', {
-            'products': st.session_state['products'].to_dict(orient='records'),
-            'categories': st.session_state['categories'].to_dict(orient='records'),
-            'manufacturers': st.session_state['manufacturers'].to_dict(orient='records')
-        })
-
-    if st.session_state.get('products') is not None:
-        products = st.session_state['products']
+    category_files, manufacturer_files = [], []
+    if supplier.reference_files:
+        category_files = st.file_uploader("Carica i file categorie", type=["csv"], accept_multiple_files=True)
+        manufacturer_files = st.file_uploader("Carica i file produttori", type=["csv"], accept_multiple_files=True)
+    else:
+        st.caption(f"Categorie e produttori sono letti dai file prodotti {supplier.name}.")
+
+    # Aggiornamento incrementale: integra il feed nel catalogo esistente
+    incremental = st.checkbox(
+        "Aggiornamento incrementale (solo prodotti nuovi o modificati)",
+        value=catalog is not None,
+        key="incremental_upload",
+    )
+    full_feed = st.checkbox("Il feed è completo: rimuovi i prodotti assenti", key="full_feed", disabled=not incremental)
+
+    if product_files and (not supplier.reference_files or (category_files and manufacturer_files)):
+        product_paths = save_uploaded_files(product_files, f"{supplier.key}_products")
+        category_paths = save_uploaded_files(category_files, f"{supplier.key}_categories")
+        manufacturer_paths = save_uploaded_files(manufacturer_files, f"{supplier.key}_manufacturers")
+
+        # Il feed viene elaborato una sola volta, non a ogni rerun
+        upload_key = (supplier.name, tuple(product_paths), tuple(category_paths), tuple(manufacturer_paths), incremental, full_feed)
+        if st.session_state.get('last_upload') != upload_key:
+            # Il catalogo risultante dipende dai file, dal fornitore e, se incrementale, dal catalogo di partenza
+            base_ref = catalog.ref if incremental and catalog is not None else None
+            options = {'base': base_ref, 'full_feed': full_feed} if base_ref else {}
+            if supplier.name != DEFAULT_SUPPLIER:
+                # I riferimenti dei cataloghi BigBuy restano quelli calcolati finora
+                options['supplier'] = supplier.name
+            ref = source_files_key(product_paths, category_paths, manufacturer_paths, options=options or None)
+            if catalog_in_store(ref):
+                catalog = get_catalog_registry().acquire(ref)
+                st.info("Questi file sono già stati importati: catalogo caricato dall'archivio.")
+            else:
+                feed, categories, manufacturers = load_data(product_paths, category_paths, manufacturer_paths, supplier)
+                if base_ref:
+                    previous_categories = catalog.categories
+                    previous_manufacturers = catalog.manufacturers
+                    categories = catalog_utils.merge_reference(previous_categories, categories)
+                    manufacturers = catalog_utils.merge_reference(previous_manufacturers, manufacturers)
+                    products, stats = catalog_utils.upsert_catalog(
+                        catalog.products, feed, categories, manufacturers,
+                        previous_categories=previous_categories,
+                        previous_manufacturers=previous_manufacturers,
+                        full_feed=full_feed,
+                    )
+                    st.success(
+                        f"Catalogo aggiornato: {stats['new']} nuovi, {stats['updated']} modificati, "
+                        f"{stats['deleted']} rimossi, {stats['remapped']} ricalcolati."
+                    )
+                else:
+                    products = catalog_utils.map_data(feed, categories, manufacturers)
+                store_catalog(ref, products, categories, manufacturers)
+                catalog = get_catalog_registry().put(ref, get_catalog_version(ref), products, categories, manufacturers)
+
+            st.session_state['catalog'] = catalog
+            st.session_state['last_upload'] = upload_key
+            catalog_settings = {**catalog_settings, 'ref': ref}
+            update_user_data('catalogo_data', catalog_settings)
+
+    if catalog is not None:
+        products = catalog.products
 
         # Filtri dinamici
         st.sidebar.markdown('<div class="sidebar-title">Filtri:</div>', unsafe_allow_html=True)
@@ -178,110 +296,143 @@ elif choice == "BigBuy":
         keywords_description = st.sidebar.text_input("Parole chiave nella Descrizione (separate da virgola)", key="keywords_description")
         keywords_combined = st.sidebar.text_input("Parole chiave combinate (separate da virgola)", key="keywords_combined")
 
-        filtered_products = products.copy()
-
-        # Filtrare in base al Nome con logica AND
-        if keywords_name:
-            name_keywords = [kw.strip().lower() for kw in keywords_name.split(',')]
-            filtered_products = filtered_products[
-                filtered_products['NAME'].apply(lambda name: all(kw in name.lower() for kw in name_keywords))
-            ]
-
-        # Filtrare in base alla Descrizione con logica AND
-        if keywords_description:
-            description_keywords = [kw.strip().lower() for kw in keywords_description.split(',')]
-            filtered_products = filtered_products[
-                filtered_products['DESCRIPTION'].apply(lambda desc: all(kw in desc.lower() for kw in description_keywords))
-            ]
-
-        # Filtrare in base alla combinazione personalizzata con logica AND
-        if keywords_combined:
-            combined_keywords = [kw.strip().lower() for kw in keywords_combined.split(',')]
-            filtered_products = filtered_products[
-                filtered_products['NAME'].apply(lambda name: any(kw in name.lower() for kw in combined_keywords)) |
-                filtered_products['DESCRIPTION'].apply(lambda desc: any(kw in desc.lower() for kw in combined_keywords))
-            ]
-
-        # Filtri aggiuntivi
-        available_categories = sorted(set(cat for sublist in filtered_products['Category_List'] for cat in sublist))
-        category_filter = st.sidebar.multiselect("Categorie", options=available_categories)
-        if category_filter:
-            filtered_products = filtered_products[filtered_products['Category_List'].apply(lambda x: any(cat in x for cat in category_filter))]
-
-        available_brands = filtered_products['Manufacturer'].dropna().unique()
-        manufacturer_filter = st.sidebar.multiselect("Produttori", options=available_brands)
-        if manufacturer_filter:
-            filtered_products = filtered_products[filtered_products['Manufacturer'].isin(manufacturer_filter)]
-
-        min_price = st.sidebar.number_input("Prezzo Minimo (€)", value=float(filtered_products['PRICE'].min()), step=0.01)
-        max_price = st.sidebar.number_input("Prezzo Massimo (€)", value=float(filtered_products['PRICE'].max()), step=0.01)
-        filtered_products = filtered_products[(filtered_products['PRICE'] >= min_price) & (filtered_products['PRICE'] <= max_price)]
+        # I filtri formano un'unica query, valutata sugli indici con i risultati in cache
+        engine = get_query_engine(catalog.version, products, catalog.categories)
+        query = CatalogQuery.from_sidebar(keywords_name, keywords_description, keywords_combined)
+
+        # Filtri aggiuntivi, con il numero di prodotti rimasti per ogni opzione
+        category_counts = engine.category_index.category_counts(engine.mask(query))
+        category_filter = st.sidebar.multiselect(
+            "Categorie", options=facet_options(category_counts, "category_filter"),
+            format_func=lambda cat: f"{cat} ({category_counts.get(cat, 0)})",
+            # Chiave fissa: senza, l'identità del widget dipende dalle etichette con i conteggi
+            # e la selezione si perde quando i conteggi cambiano
+            key="category_filter",
+        )
+        query = query.refine(categories=category_filter)
 
+        manufacturer_counts = engine.category_index.manufacturer_counts(engine.mask(query))
+        manufacturer_filter = st.sidebar.multiselect(
+            "Produttori", options=facet_options(manufacturer_counts, "manufacturer_filter"),
+            format_func=lambda brand: f"{brand} ({manufacturer_counts.get(brand, 0)})",
+            key="manufacturer_filter",
+        )
+        query = query.refine(manufacturers=manufacturer_filter)
+
+        prices = products['PRICE'].to_numpy()[engine.positions(query)]
+        min_price = st.sidebar.number_input("Prezzo Minimo (€)", value=float(np.nanmin(prices)) if len(prices) else 0.0, step=0.01)
+        max_price = st.sidebar.number_input("Prezzo Massimo (€)", value=float(np.nanmax(prices)) if len(prices) else 0.0, step=0.01)
         stock_filter = st.sidebar.checkbox("Mostra solo prodotti in stock")
-        if stock_filter:
-            filtered_products = filtered_products[filtered_products['STOCK'] > 0]
+        query = query.refine(min_price=min_price, max_price=max_price, in_stock=stock_filter)
 
-        # Opzione per mostrare testo completo nella colonna DESCRIPTION
-        show_full_description = st.sidebar.checkbox("Mostra testo completo nella descrizione")
+        positions = engine.positions(query)
 
-        if not show_full_description:
-            filtered_products['DESCRIPTION'] = filtered_products['DESCRIPTION'].apply(
-                lambda desc: " ".join(desc.split()[:8]) + "..." if isinstance(desc, str) and len(desc.split()) > 8 else desc
-            )
+        # Opzioni di visualizzazione
+        show_full_description = st.sidebar.checkbox("Mostra testo completo nella descrizione", key="show_full_description")
+        view_mode = st.sidebar.radio("Visualizzazione", ["Tabella HTML", "Griglia interattiva"], key="view_mode")
 
-        # Aggiungere la colonna delle immagini e abbreviazione del testo per la descrizione
-        filtered_products['IMAG'] = filtered_products['IMAGE1'].apply(
-            lambda url: f'<img src="{url}" width="50">' if pd.notnull(url) and url else ""
-        )
+        # Paginazione: le trasformazioni di visualizzazione si applicano solo alla pagina mostrata
+        page_size = st.sidebar.selectbox("Prodotti per pagina", PAGE_SIZES, key="page_size")
 
-        # Paginazione
-        items_per_page = 20
-        total_items = len(filtered_products)
-        total_pages = (total_items + items_per_page - 1) // items_per_page
+        # Le impostazioni di visualizzazione si salvano solo quando cambiano
+        view = {key: st.session_state[key] for key in VIEW_SETTINGS}
+        if catalog_settings.get('view') != view:
+            catalog_settings = {**catalog_settings, 'view': view}
+            update_user_data('catalogo_data', catalog_settings)
+        total_items = len(positions)
+        total_pages = page_count(total_items, page_size)
 
         if 'current_page' not in st.session_state:
-            st.session_state['current_page'] = 1
+            st.session_state['current_page'] = st.query_params.get('page', 1)
+        st.session_state['current_page'] = clamp_page(st.session_state['current_page'], total_pages)
+
+        def change_page(delta):
+            st.session_state['current_page'] = clamp_page(st.session_state['current_page'] + delta, total_pages)
 
         col1, col2, col3 = st.columns([1, 2, 1])
         with col1:
-            if st.button("← Pagina precedente"):
-                if st.session_state['current_page'] > 1:
-                    st.session_state['current_page'] -= 1
+            st.button("← Pagina precedente", on_click=change_page, args=(-1,))
+        with col2:
+            st.number_input("Vai alla pagina", min_value=1, max_value=total_pages, step=1, key="current_page")
         with col3:
-            if st.button("Pagina successiva →"):
-                if st.session_state['current_page'] < total_pages:
-                    st.session_state['current_page'] += 1
+            st.button("Pagina successiva →", on_click=change_page, args=(1,))
 
-        start_idx = (st.session_state['current_page'] - 1) * items_per_page
-        end_idx = start_idx + items_per_page
+        current_page = st.session_state['current_page']
+        st.query_params['page'] = str(current_page)
 
-        st.markdown(f"### Prodotti Filtrati ({total_items} totali) - Pagina {st.session_state['current_page']} di {total_pages}")
+        st.markdown(f"### Prodotti Filtrati ({total_items} totali) - Pagina {current_page} di {total_pages}")
 
         # Visualizzazione della tabella filtrata
-        st.write(
-            filtered_products.iloc[start_idx:end_idx][['IMAG', 'ID', 'EAN13', 'NAME', 'DESCRIPTION', 'CATEGORY_1', 'CATEGORY_2', 'CATEGORY_3', 'Manufacturer', 'STOCK', 'PRICE']]
-            .to_html(escape=False, index=False),
-            unsafe_allow_html=True
-        )
-
-        # Esportazione CSV
-        st.sidebar.markdown("## Esporta i Dati Filtrati")
-        selected_columns = st.sidebar.multiselect("Seleziona le colonne da esportare:", options=filtered_products.columns.tolist(), default=filtered_products.columns.tolist())
-
-        if st.sidebar.button("Esporta in CSV"):
-            csv_data = filtered_products[selected_columns].to_csv(index=False, sep=';')
-            st.sidebar.download_button(
-                label="Scarica CSV",
-                data=csv_data,
-                file_name="prodotti_filtrati.csv",
-                mime="text/csv"
+        thumbnails = get_thumbnail_cache()
+        if view_mode == "Tabella HTML":
+            page_table = build_page(products, positions, current_page, page_size, show_full_description,
+                                    image_urls=thumbnails.thumbnail_urls)
+            st.write(page_table_html(page_table), unsafe_allow_html=True)
+        else:
+            page_table = build_page(products, positions, current_page, page_size, show_full_description, html_images=False,
+                                    image_urls=thumbnails.thumbnail_urls)
+            st.dataframe(
+                page_table,
+                hide_index=True,
+                use_container_width=True,
+                column_config={
+                    "IMAG": st.column_config.ImageColumn("Immagine", width="small"),
+                    "PRICE": st.column_config.NumberColumn("PRICE", format="%.2f €"),
+                },
             )
 
-elif choice == "Dreamlove" or choice == "VidaXL":
-    st.markdown(f"<h2 style='text-align: center;'>Catalogo {choice}</h2>", unsafe_allow_html=True)
-    st.markdown("<p>Carica i tuoi file per iniziare:</p>", unsafe_allow_html=True)
-    uploaded_files = st.file_uploader("Carica file CSV", type=["csv"], accept_multiple_files=True)
-
-    if uploaded_files:
-        file_paths = save_uploaded_files(uploaded_files, choice.lower())
-        st.success(f"File caricati con successo in temp_files.")
+        # Esportazione dei prodotti filtrati
+        st.sidebar.markdown("## Esporta i Dati Filtrati")
+        selected_columns = st.sidebar.multiselect("Seleziona le colonne da esportare:", options=products.columns.tolist(), default=products.columns.tolist())
+        export_format = st.sidebar.selectbox("Formato:", available_formats())
+
+        export_manager = get_export_manager()
+        export_key = (engine.version, query, tuple(selected_columns), export_format)
+        export_job = export_manager.get(export_key)
+        if st.sidebar.button("Esporta", disabled=not selected_columns):
+            export_job = export_manager.submit(export_key, products, positions, selected_columns, export_format)
+
+        if export_job is not None:
+            with st.sidebar:
+                if not export_job.done:
+                    show_export_progress(export_job)
+                elif export_job.error:
+                    st.error(f"Esportazione non riuscita: {export_job.error}")
+                else:
+                    # Il file viene letto solo al clic: i rerun non lo ricaricano in memoria
+                    st.download_button(
+                        label=f"Scarica {export_format}",
+                        data=export_job.read,
+                        file_name=f"prodotti_filtrati{export_job.file_extension}",
+                        mime=export_job.mime
+                    )
+
+elif choice == "Confronto Fornitori":
+    st.markdown("<h2 style='text-align: center;'>Confronto Fornitori</h2>", unsafe_allow_html=True)
+    if catalog is None:
+        st.warning("Nessun catalogo trovato. Caricalo per iniziare.")
+        st.stop()
+
+    comparison = get_supplier_comparison(catalog.version, catalog.products)
+    shared = comparison["SUPPLIERS"] > 1
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Articoli", len(comparison))
+    col2.metric("Offerti da più fornitori", int(shared.sum()))
+    col3.metric("Riconosciuti dal nome", int((comparison["MATCH"] == "Nome").sum()))
+
+    only_shared = st.toggle("Solo articoli offerti da più fornitori", value=True, key="comparison_shared")
+    search = st.text_input("Cerca nel nome", key="comparison_search")
+    rows = comparison[shared] if only_shared else comparison
+    if search:
+        rows = rows[rows["NAME"].str.contains(search, case=False, regex=False, na=False)]
+
+    # Solo la pagina visibile viene inviata al browser
+    pages = max(1, -(-len(rows) // COMPARISON_PAGE_SIZE))
+    page = st.number_input(f"Pagina (di {pages})", min_value=1, max_value=pages, step=1, key="comparison_page")
+    start = (min(page, pages) - 1) * COMPARISON_PAGE_SIZE
+    page_rows = rows.iloc[start:start + COMPARISON_PAGE_SIZE].copy()
+    page_rows["EAN13"] = format_ean13(page_rows["EAN13"])
+    st.dataframe(page_rows.round(2), hide_index=True, use_container_width=True)
+
+# Fine del rerun: le uscite anticipate (st.stop) vengono chiuse al rerun successivo
+finish_rerun()
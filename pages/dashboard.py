@@ -1,14 +1,8 @@
 import streamlit as st
 import datetime
 import pandas as pd
-import random
 import plotly.express as px
-
-# Funzione per caricare il CSS
-def load_css():
-    css_path = "assets/styles.css"
-    with open(css_path, "r") as f:
-        st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
+from utils.assets import load_css
 
 # Funzione per la pagina Dashboard
 def dashboard_page():
@@ -4,13 +4,79 @@ import datetime
 import uuid
 import numpy as np
 from auth import update_user_data, get_global_state
-from utils.data_utils import load_catalog_from_file
+from utils.assets import load_css
+from utils.catalog_registry import get_catalog_registry
+from utils.invoice_ledger import INVOICE_PAGE_SIZE, get_invoice_ledger
+from utils.perf import finish_rerun, start_rerun
+from utils.search_index import ProductLookup
 
-# Funzione per caricare il CSS
-def load_css():
-    css_path = "assets/styles.css"
-    with open(css_path, "r") as f:
-        st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
+# Suggerimenti mostrati dal selettore dei prodotti
+PICKER_LIMIT = 20
+
+# Ordinamenti dell'elenco fatture: etichetta -> colonna del registro
+INVOICE_SORTS = {"Data": "issued_on", "Cliente": "customer", "Tipo Cliente": "customer_type", "Totale": "total"}
+
+# Intestazioni dell'elenco fatture e delle righe
+INVOICE_HEADERS = {
+    "id": "ID", "issued_on": "Data", "customer_type": "Tipo Cliente", "customer": "Cliente",
+    "address": "Indirizzo", "phone": "Telefono", "email": "Email", "total": "Totale (€)",
+}
+LINE_HEADERS = {"product_id": "ID Prodotto", "name": "Prodotto", "quantity": "Quantità", "price": "Prezzo (€)"}
+
+# Ricerca dei prodotti per le fatture, costruita una volta per versione del catalogo
+@st.cache_resource(max_entries=4, show_spinner="Indicizzazione dei prodotti in corso...")
+def get_product_lookup(version, _products):
+    return ProductLookup(_products)
+
+# Elenco delle fatture: filtri, ordinamento e paginazione sono eseguiti dal registro
+def elenco_fatture(ledger, owner):
+    st.markdown("### Elenco Fatture")
+
+    with st.expander("Filtri e ordinamento"):
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            periodo = st.date_input("Periodo", value=(), key="invoice_period")
+            cliente = st.text_input("Cliente", key="invoice_customer")
+        with col2:
+            importo_min = st.number_input("Totale minimo (€)", min_value=0.0, value=None, key="invoice_min_total")
+            importo_max = st.number_input("Totale massimo (€)", min_value=0.0, value=None, key="invoice_max_total")
+        with col3:
+            ordina_per = st.selectbox("Ordina per", list(INVOICE_SORTS), key="invoice_sort")
+            decrescente = st.toggle("Decrescente", value=True, key="invoice_descending")
+
+    data_da = periodo[0] if len(periodo) > 0 else None
+    data_a = periodo[1] if len(periodo) > 1 else data_da
+    filtri = dict(date_from=data_da, date_to=data_a, customer=cliente.strip() or None,
+                  min_total=importo_min, max_total=importo_max)
+    ordinamento = dict(sort=INVOICE_SORTS[ordina_per], descending=decrescente)
+
+    # Con filtri o ordinamento diversi si riparte dalla prima pagina
+    if st.session_state.get("invoice_query") != (filtri, ordinamento):
+        st.session_state["invoice_query"] = (filtri, ordinamento)
+        st.session_state["invoice_page"] = 1
+
+    totale_fatture = ledger.count_invoices(owner, **filtri)
+    if totale_fatture == 0:
+        st.info("Nessuna fattura trovata.")
+        return
+    pagine = (totale_fatture + INVOICE_PAGE_SIZE - 1) // INVOICE_PAGE_SIZE
+    pagina = st.number_input(f"Pagina (di {pagine})", min_value=1, max_value=pagine, step=1, key="invoice_page")
+    fatture_df = ledger.query_invoices(owner, page=pagina - 1, **ordinamento, **filtri)
+    st.caption(f"{totale_fatture} fatture")
+    st.dataframe(fatture_df.round({"total": 2}).rename(columns=INVOICE_HEADERS), hide_index=True, use_container_width=True)
+
+    # Le righe si leggono solo per la fattura aperta
+    scelta = st.selectbox(
+        "Dettaglio fattura",
+        options=fatture_df.index.tolist(),
+        format_func=lambda i: f"{fatture_df['issued_on'].iloc[i]} - {fatture_df['customer'].iloc[i]} - €{fatture_df['total'].iloc[i]:.2f}",
+        index=None,
+        placeholder="Seleziona una fattura della pagina",
+        key="invoice_detail",
+    )
+    if scelta is not None:
+        righe_df = ledger.invoice_lines(fatture_df["id"].iloc[scelta]).rename(columns=LINE_HEADERS)
+        st.dataframe(righe_df, hide_index=True, use_container_width=True)
 
 # Funzione per gestire il sistema di fatturazione
 def sistema_fatturazione():
@@ -26,48 +92,58 @@ def sistema_fatturazione():
     menu = ["Dashboard", "Invoice", "Cost", "Supplier"]
     choice = st.sidebar.radio("Navigazione Finanze", menu)
 
-    # Carica le fatture salvate
-    if "invoices" not in st.session_state:
-        st.session_state["invoices"] = get_global_state("invoices", default=[])
+    # Controllo dell'accesso: registro e fatture sono per utente
+    if "username" not in st.session_state:
+        st.error("Accesso non autorizzato! Torna al login.")
+        st.stop()
 
-    # Recupera il catalogo se non è disponibile in sessione
-    if "products" not in st.session_state:
-        products, categories, manufacturers = load_catalog_from_file()
-        if products is not None:
-            st.session_state["products"] = products
-        else:
+    # Registro delle fatture; quelle salvate nei dati utente vi vengono importate una volta sola
+    ledger = get_invoice_ledger()
+    owner = st.session_state["username"]
+    fatture_salvate = get_global_state("invoices", default=[])
+    if fatture_salvate:
+        ledger.import_invoices(owner, fatture_salvate)
+        update_user_data("invoices", [])
+
+    # Recupera il catalogo condiviso se la sessione non ne ha ancora uno
+    if "catalog" not in st.session_state:
+        handle = get_catalog_registry().acquire(get_global_state("catalogo_data", default={}).get("ref"))
+        if handle is None:
             st.error("Devi prima caricare i prodotti nella sezione Catalogo.")
             st.stop()
-
-    # Verifica se il catalogo è caricato
-    if "products" in st.session_state and st.session_state["products"] is not None:
-        products_df = st.session_state["products"]
-    else:
-        st.error("Il catalogo non è stato caricato correttamente.")
-        st.stop()
+        st.session_state["catalog"] = handle
+    catalog = st.session_state["catalog"]
+    products_df = catalog.products
 
     if choice == "Dashboard":
         st.markdown("<div class='section-header'>Dashboard Finanziaria</div>", unsafe_allow_html=True)
 
-        # Dati simulati per il grafico
-        data = {
-            "Mese": ["Gennaio", "Febbraio", "Marzo", "Aprile", "Maggio"],
-            "Entrate (€)": [1200, 1500, 1700, 2000, 1800],
-            "Uscite (€)": [800, 900, 1100, 1000, 950]
-        }
-        df = pd.DataFrame(data)
+        # Riepiloghi mensili e per cliente del registro: non dipendono dal numero di fatture
+        mesi = ledger.monthly_totals(owner)
+        if mesi.empty:
+            st.info("Nessuna fattura registrata: le entrate compariranno qui dopo la prima fattura.")
+        else:
+            df = mesi.rename(columns={"month": "Mese", "invoices": "Fatture", "revenue": "Entrate (€)"})
 
-        # Grafico dinamico delle entrate e uscite
-        st.line_chart(data=df.set_index("Mese"), use_container_width=True)
+            # Grafico delle entrate per mese
+            st.line_chart(data=df.set_index("Mese")[["Entrate (€)"]], use_container_width=True)
 
-        # Riepilogo metriche
-        col1, col2, col3 = st.columns(3)
-        with col1:
-            st.metric(label="Entrate Totali (€)", value=sum(df["Entrate (€)"]))
-        with col2:
-            st.metric(label="Uscite Totali (€)", value=sum(df["Uscite (€)"]))
-        with col3:
-            st.metric(label="Saldo Netto (€)", value=sum(df["Entrate (€)"]) - sum(df["Uscite (€)"]))
+            # Riepilogo metriche
+            entrate = df["Entrate (€)"].sum()
+            numero_fatture = int(df["Fatture"].sum())
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                st.metric(label="Entrate Totali (€)", value=f"{entrate:.2f}")
+            with col2:
+                st.metric(label="Fatture Emesse", value=numero_fatture)
+            with col3:
+                st.metric(label="Fattura Media (€)", value=f"{entrate / numero_fatture:.2f}")
+
+            st.markdown("### Clienti Principali")
+            clienti = ledger.customer_totals(owner).rename(columns={
+                "customer": "Cliente", "invoices": "Fatture", "revenue": "Entrate (€)", "last_invoice": "Ultima Fattura",
+            })
+            st.dataframe(clienti, hide_index=True, use_container_width=True)
 
     elif choice == "Invoice":
         st.markdown("<div class='section-header'>Sistema di Fatturazione</div>", unsafe_allow_html=True)
@@ -97,16 +173,52 @@ def sistema_fatturazione():
                 telefono = st.text_input("Numero di Telefono")
                 email = st.text_input("Email")
 
-        # Selezione dei prodotti
+        # Selezione dei prodotti: ricerca sul server, al browser arrivano solo i primi risultati
         st.markdown("### Seleziona Prodotti dal Catalogo")
-        prodotti_selezionati = st.multiselect(
-            "Scegli i prodotti",
-            options=products_df["NAME"].tolist(),
-            format_func=lambda x: f"{x}",
-        )
+        lookup = get_product_lookup(catalog.version, products_df)
+        righe = st.session_state.setdefault("invoice_lines", {})
+
+        ricerca = st.text_input("Cerca un prodotto (nome, ID o EAN13)", key="product_search")
+        risultati = lookup.search(ricerca, limit=PICKER_LIMIT)
+        if len(risultati):
+            col1, col2, col3 = st.columns([4, 1, 1])
+            with col1:
+                scelto = st.selectbox(
+                    "Scegli il prodotto",
+                    options=risultati.tolist(),
+                    format_func=lambda pos: f"{products_df['NAME'].iloc[pos]} ({products_df['ID'].iloc[pos]}) - €{lookup.prices[pos]:.2f}",
+                )
+            with col2:
+                quantita = st.number_input("Quantità", min_value=1, value=1, step=1, key="product_quantity")
+            with col3:
+                if st.button("Aggiungi"):
+                    product_id = str(products_df['ID'].iloc[scelto])
+                    righe[product_id] = righe.get(product_id, 0) + int(quantita)
+        elif ricerca:
+            st.info("Nessun prodotto trovato.")
+
+        # Righe della fattura, per ID prodotto
+        if righe:
+            posizioni = lookup.positions_of(righe.keys())
+            righe_df = pd.DataFrame({
+                "ID": list(righe),
+                "Prodotto": [products_df['NAME'].iloc[pos] if pos >= 0 else "Non più in catalogo" for pos in posizioni],
+                "Quantità": list(righe.values()),
+                "Prezzo (€)": [lookup.prices[pos] if pos >= 0 else np.nan for pos in posizioni],
+            })
+            righe_df["Subtotale (€)"] = righe_df["Quantità"] * righe_df["Prezzo (€)"]
+            st.dataframe(righe_df, hide_index=True, use_container_width=True)
+
+            col1, col2 = st.columns([4, 1])
+            with col1:
+                da_rimuovere = st.selectbox("Rimuovi una riga", options=list(righe), index=None, placeholder="Seleziona il prodotto")
+            with col2:
+                if st.button("Rimuovi") and da_rimuovere:
+                    del righe[da_rimuovere]
+                    st.rerun()
 
         # Calcolo totale
-        totale = products_df[products_df["NAME"].isin(prodotti_selezionati)]["PRICE"].sum()
+        totale = lookup.totals(righe)
 
         st.markdown(f"### Totale: €{totale:.2f}")
 
@@ -119,19 +231,20 @@ def sistema_fatturazione():
                 "Indirizzo": indirizzo,
                 "Telefono": telefono,
                 "Email": email,
-                "Prodotti": prodotti_selezionati,
+                "Prodotti": [products_df['NAME'].iloc[pos] for pos in lookup.positions_of(righe.keys()) if pos >= 0],
+                "Righe": [
+                    {"ID": product_id, "Quantità": quantity, "Prezzo (€)": float(lookup.prices[pos]) if pos >= 0 else None}
+                    for (product_id, quantity), pos in zip(righe.items(), lookup.positions_of(righe.keys()))
+                ],
                 "Totale (€)": totale,
                 "Data": datetime.date.today().isoformat(),
             }
-            st.session_state["invoices"].append(fattura)
-            update_user_data("invoices", st.session_state["invoices"])
+            ledger.append(owner, fattura)
+            st.session_state["invoice_lines"] = {}
             st.success("Fattura generata con successo!")
 
         # Visualizzazione delle fatture
-        if st.session_state["invoices"]:
-            st.markdown("### Elenco Fatture")
-            fatture_df = pd.DataFrame(st.session_state["invoices"])
-            st.table(fatture_df)
+        elenco_fatture(ledger, owner)
 
     elif choice == "Cost":
         st.markdown("<div class='section-header'>Gestione Costi</div>", unsafe_allow_html=True)
@@ -142,4 +255,6 @@ def sistema_fatturazione():
         st.info("Questa sezione permetterà di gestire i fornitori.")
 
 if __name__ == "__main__":
-    sistema_fatturazione()
\ No newline at end of file
+    start_rerun("finanze", st.session_state.get("username"))
+    sistema_fatturazione()
+    finish_rerun()
\ No newline at end of file
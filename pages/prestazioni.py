@@ -0,0 +1,95 @@
+import datetime
+import streamlit as st
+import pandas as pd
+from utils.assets import load_css
+from utils.perf import get_perf_tracer, percentile, slowest_reruns, stage_summary
+
+# Modalità di registrazione: etichetta -> valore di PerfTracer.configure
+TRACE_MODES = {"Spenta": "", "Attiva": "1", "Attiva con allocazioni (più lenta)": "memory"}
+
+# Rerun più lenti mostrati nel dettaglio
+SLOWEST_RERUNS = 10
+
+# Intestazioni delle tabelle
+SUMMARY_HEADERS = {
+    "stage": "Fase", "count": "Esecuzioni", "p50_ms": "p50 (ms)", "p95_ms": "p95 (ms)", "max_ms": "Massimo (ms)",
+    "total_ms": "Totale (ms)", "rows_out": "Righe in uscita (media)", "allocated_mb": "Allocati (MB, max)",
+}
+STAGE_HEADERS = {
+    "name": "Fase", "seconds": "Tempo (ms)", "rows_in": "Righe in ingresso", "rows_out": "Righe in uscita",
+    "rss_delta_bytes": "Memoria residente (MB)", "allocated_bytes": "Allocati (MB)", "depth": "Livello",
+}
+
+
+def stages_frame(stages):
+    frame = pd.DataFrame(stages, columns=list(STAGE_HEADERS))
+    frame["seconds"] = frame["seconds"] * 1000
+    for column in ("rss_delta_bytes", "allocated_bytes"):
+        frame[column] = pd.to_numeric(frame[column]) / 2**20
+    return frame.round(2).rename(columns=STAGE_HEADERS)
+
+
+# Pagina riservata agli amministratori: tempi delle fasi di ogni rerun
+def prestazioni_page():
+    st.set_page_config(page_title="Prestazioni", layout="wide")
+    load_css()
+
+    if st.session_state.get("role") != "admin":
+        st.error("Accesso non autorizzato! Pagina riservata agli amministratori.")
+        st.stop()
+
+    st.title("Prestazioni")
+    tracer = get_perf_tracer()
+
+    # La modalità vale per tutto il processo: il selettore mostra quella attuale, anche se
+    # cambiata da un altro amministratore, e la modifica solo quando viene usato
+    labels = list(TRACE_MODES)
+    st.session_state["perf_trace_mode"] = labels[list(TRACE_MODES.values()).index(tracer.mode)]
+    st.radio("Registrazione dei tempi", labels, horizontal=True, key="perf_trace_mode",
+             on_change=lambda: tracer.configure(TRACE_MODES[st.session_state["perf_trace_mode"]]),
+             help="Vale per tutte le sessioni del processo. Le allocazioni usano tracemalloc e "
+                  "rallentano le pagine: attivarle solo per un'indagine.")
+    if tracer.log_path:
+        st.caption(f"I rerun vengono scritti anche in {tracer.log_path}.")
+
+    reruns = tracer.reruns()
+    pages = sorted({rerun["page"] for rerun in reruns})
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        page = st.selectbox("Pagina", [None] + pages, format_func=lambda name: "Tutte" if name is None else name)
+    with col2:
+        if st.button("Svuota lo storico"):
+            tracer.clear()
+            st.rerun()
+    if page is not None:
+        reruns = [rerun for rerun in reruns if rerun["page"] == page]
+
+    if not reruns:
+        st.info("Nessun rerun registrato. Attiva la registrazione e usa le pagine del catalogo o delle finanze.")
+        return
+
+    seconds = sorted(rerun["seconds"] for rerun in reruns)
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Rerun registrati", len(reruns))
+    col2.metric("p50", f"{percentile(seconds, 50) * 1000:.0f} ms")
+    col3.metric("p95", f"{percentile(seconds, 95) * 1000:.0f} ms")
+    col4.metric("Interrotti", sum(not rerun["complete"] for rerun in reruns),
+                help="Rerun terminati da st.stop, st.rerun o da un errore: la durata arriva all'ultima fase.")
+
+    st.markdown("### Tempi per fase")
+    summary = pd.DataFrame(stage_summary(reruns), columns=list(SUMMARY_HEADERS))
+    st.dataframe(summary.round(2).rename(columns=SUMMARY_HEADERS), hide_index=True, use_container_width=True)
+
+    st.markdown("### Rerun più lenti")
+    for rerun in slowest_reruns(reruns, SLOWEST_RERUNS):
+        started = datetime.datetime.fromtimestamp(rerun["started_at"]).strftime("%d/%m %H:%M:%S")
+        title = f"{rerun['seconds'] * 1000:.0f} ms - {rerun['page']} - {rerun['user'] or '-'} - {started}"
+        with st.expander(title if rerun["complete"] else f"{title} (interrotto)"):
+            if rerun["stages"]:
+                st.dataframe(stages_frame(rerun["stages"]), hide_index=True, use_container_width=True)
+            else:
+                st.caption("Nessuna fase misurata.")
+
+
+if __name__ == "__main__":
+    prestazioni_page()
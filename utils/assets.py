@@ -0,0 +1,74 @@
+import hashlib
+import os
+import re
+import tempfile
+import threading
+
+import streamlit as st
+
+# File sorgente di stili e immagini
+ASSET_DIR = "assets"
+
+# Copie con l'impronta nel nome, servite da Streamlit come file statici (server.enableStaticServing).
+# URL relativo come quello delle miniature (utils.thumbnails)
+STATIC_ASSET_DIR = os.path.join("static", "assets")
+STATIC_ASSET_URL = "app/static/assets"
+
+# Caratteri dell'impronta nel nome dei file
+FINGERPRINT_LENGTH = 12
+
+_COMMENTS = re.compile(r"/\*.*?\*/", re.DOTALL)
+_SPACES = re.compile(r"\s+")
+_AROUND_PUNCTUATION = re.compile(r"\s*([{};,>])\s*")
+
+
+def minify_css(css):
+    """Toglie commenti e spazi superflui da un foglio di stile."""
+    css = _COMMENTS.sub("", css)
+    css = _SPACES.sub(" ", css)
+    css = _AROUND_PUNCTUATION.sub(r"\1", css)
+    # Solo dopo i due punti: prima possono separare un selettore da una pseudo-classe
+    css = re.sub(r":\s+", ":", css)
+    return css.replace(";}", "}").strip()
+
+
+_urls = {}
+_urls_lock = threading.Lock()
+
+
+def _publish(name):
+    with open(os.path.join(ASSET_DIR, name), "rb") as f:
+        data = f.read()
+    stem, extension = os.path.splitext(name)
+    if extension == ".css":
+        data = minify_css(data.decode("utf-8")).encode("utf-8")
+    fingerprint = hashlib.blake2b(data, digest_size=16).hexdigest()[:FINGERPRINT_LENGTH]
+    file_name = f"{stem}.{fingerprint}{extension}"
+    path = os.path.join(STATIC_ASSET_DIR, file_name)
+    if not os.path.exists(path):
+        os.makedirs(STATIC_ASSET_DIR, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix=".asset_", dir=STATIC_ASSET_DIR)
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    return f"{STATIC_ASSET_URL}/{file_name}"
+
+
+def asset_url(name):
+    """URL statico di un file di assets/ (minificato se CSS), pubblicato una volta per processo.
+
+    Il nome pubblicato contiene l'impronta del contenuto: cambiando il file cambia l'URL,
+    e il browser può tenere in cache le versioni precedenti senza rischio.
+    """
+    url = _urls.get(name)
+    if url is None:
+        with _urls_lock:
+            url = _urls.get(name)
+            if url is None:
+                url = _urls[name] = _publish(name)
+    return url
+
+
+def load_css():
+    """Applica il CSS del progetto: a ogni rerun si invia solo il riferimento al file statico."""
+    st.markdown(f'<style>@import url("{asset_url("styles.css")}");</style>', unsafe_allow_html=True)
@@ -0,0 +1,171 @@
+import os
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+from utils.data_utils import catalog_version, get_catalog_version, latest_catalog_ref, load_catalog
+
+# Memoria massima dei cataloghi non in uso tenuti pronti (MB, configurabile da ambiente)
+CATALOG_MEMORY_BUDGET = int(os.environ.get("CATALOG_MEMORY_BUDGET_MB", "2048")) * 1024 * 1024
+
+
+def frame_bytes(df):
+    """Memoria occupata da un DataFrame, stringhe comprese."""
+    return 0 if df is None else int(df.memory_usage(index=True, deep=True).sum())
+
+
+class _Entry:
+    def __init__(self, version, ref, products, categories, manufacturers):
+        self.version = version
+        self.ref = ref
+        self.products = products
+        self.categories = categories
+        self.manufacturers = manufacturers
+        self.nbytes = sum(frame_bytes(df) for df in (products, categories, manufacturers))
+        self.refcount = 0
+        self.last_used = time.time()
+
+
+class CatalogHandle:
+    """Riferimento di una sessione a un catalogo condiviso, in sola lettura.
+
+    Finché l'handle esiste il catalogo non viene rimosso dal registro; viene rilasciato
+    automaticamente quando l'handle non è più referenziato (ad esempio quando la
+    sessione termina o carica un altro catalogo).
+    """
+
+    def __init__(self, registry, entry):
+        self.ref = entry.ref
+        self.version = entry.version
+        self.products = entry.products
+        self.categories = entry.categories
+        self.manufacturers = entry.manufacturers
+        self._finalizer = weakref.finalize(self, registry.release, entry.version)
+
+    def release(self):
+        self._finalizer()
+
+
+class CatalogRegistry:
+    """Cataloghi caricati, condivisi da tutte le sessioni del processo.
+
+    Ogni versione del catalogo è in memoria una sola volta, con un contatore delle
+    sessioni che la usano. Quando la memoria supera il budget si rimuovono, dalla meno
+    usata di recente, le versioni senza sessioni attive.
+    """
+
+    def __init__(self, budget_bytes=CATALOG_MEMORY_BUDGET, loader=load_catalog):
+        self.budget_bytes = budget_bytes
+        self._loader = loader
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+        self._load_locks = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _handle(self, entry):
+        entry.refcount += 1
+        entry.last_used = time.time()
+        self._entries.move_to_end(entry.version)
+        return CatalogHandle(self, entry)
+
+    def _lookup(self, version):
+        with self._lock:
+            entry = self._entries.get(version)
+            if entry is not None:
+                self.hits += 1
+                return self._handle(entry)
+            return None
+
+    def acquire(self, ref=None):
+        """Handle del catalogo con il riferimento indicato (o dell'ultimo salvato); None se non esiste."""
+        ref = ref or latest_catalog_ref()
+        version = get_catalog_version(ref) if ref else None
+        handle = self._lookup(version) if version else None
+        if handle is not None:
+            return handle
+
+        # Una sola sessione carica una data versione; le altre la attendono e la riusano
+        with self._lock:
+            load_lock = self._load_locks.setdefault(version or ref, threading.Lock())
+        with load_lock:
+            handle = self._lookup(version) if version else None
+            if handle is not None:
+                return handle
+            ref, products, categories, manufacturers = self._loader(ref)
+            if products is None:
+                return None
+            version = get_catalog_version(ref) or catalog_version(products, categories, manufacturers)
+            with self._lock:
+                self.misses += 1
+                if version in self._entries:
+                    return self._handle(self._entries[version])
+                return self._add(_Entry(version, ref, products, categories, manufacturers))
+
+    def put(self, ref, version, products, categories, manufacturers):
+        """Registra un catalogo appena costruito (es. dopo un caricamento) e ne restituisce l'handle."""
+        with self._lock:
+            entry = self._entries.get(version)
+            if entry is not None:
+                self.hits += 1
+                return self._handle(entry)
+            self.misses += 1
+            return self._add(_Entry(version, ref, products, categories, manufacturers))
+
+    def _add(self, entry):
+        self._entries[entry.version] = entry
+        handle = self._handle(entry)
+        self._evict()
+        return handle
+
+    def release(self, version):
+        with self._lock:
+            entry = self._entries.get(version)
+            if entry is not None:
+                entry.refcount = max(entry.refcount - 1, 0)
+                self._evict()
+
+    def _evict(self):
+        """Rimuove le versioni non in uso, dalla meno recente, finché si rientra nel budget."""
+        for version in list(self._entries):
+            if self.resident_bytes <= self.budget_bytes:
+                break
+            if self._entries[version].refcount == 0:
+                del self._entries[version]
+                self.evictions += 1
+
+    @property
+    def resident_bytes(self):
+        return sum(entry.nbytes for entry in self._entries.values())
+
+    def stats(self):
+        """Metriche del registro, per dimensionare la memoria dei container."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "resident_bytes": self.resident_bytes,
+                "budget_bytes": self.budget_bytes,
+                "catalogs": [
+                    {"version": e.version, "ref": e.ref, "bytes": e.nbytes, "sessions": e.refcount,
+                     "rows": len(e.products), "last_used": e.last_used}
+                    for e in reversed(self._entries.values())
+                ],
+            }
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_catalog_registry():
+    """Registro dei cataloghi condiviso dal processo, creato al primo utilizzo."""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = CatalogRegistry()
+    return _registry
@@ -0,0 +1,182 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# File con le statistiche, salvato accanto alle tabelle del catalogo
+STATS_FILE = "stats.json"
+
+# Intervalli dell'istogramma dei prezzi; l'ultimo raccoglie anche i prezzi oltre il limite
+PRICE_HISTOGRAM_BINS = 20
+
+# Quantile del prezzo usato come limite superiore dell'istogramma (esclude i pochi prezzi estremi)
+PRICE_HISTOGRAM_UPPER_QUANTILE = 0.99
+
+# Quantili del prezzo calcolati per categoria e per produttore
+PRICE_QUANTILES = (0.25, 0.5, 0.75)
+
+# Colonne delle tabelle per categoria e per produttore
+GROUP_COLUMNS = ("name", "products", "stock", "in_stock", "price_mean", "price_min",
+                 "price_q25", "price_median", "price_q75", "price_max", "histogram")
+
+
+def _price_edges(prices):
+    prices = prices[~np.isnan(prices)]
+    if len(prices) == 0:
+        return np.linspace(0.0, 1.0, PRICE_HISTOGRAM_BINS + 1)
+    low, high = float(prices.min()), float(np.quantile(prices, PRICE_HISTOGRAM_UPPER_QUANTILE))
+    if high <= low:
+        high = low + 1.0
+    return np.linspace(low, high, PRICE_HISTOGRAM_BINS + 1)
+
+
+def _price_bins(prices, edges):
+    """Intervallo dell'istogramma di ogni prezzo (-1 se il prezzo manca)."""
+    bins = np.clip(np.searchsorted(edges, prices, side="right") - 1, 0, PRICE_HISTOGRAM_BINS - 1)
+    return np.where(np.isnan(prices), -1, bins)
+
+
+def _group_stats(codes, names, prices, stock, bins):
+    """Statistiche per gruppo da un codice di gruppo per voce (-1 = nessun gruppo).
+
+    Conteggi, somme e istogrammi sono bincount sui codici; i quantili vengono da un
+    unico groupby. Restituisce una riga per gruppo, ordinata per numero di prodotti.
+    """
+    valid = codes >= 0
+    codes, prices, stock, bins = codes[valid], prices[valid], stock[valid], bins[valid]
+    size = len(names)
+
+    products = np.bincount(codes, minlength=size)
+    priced = ~np.isnan(prices)
+    price_sum = np.bincount(codes[priced], weights=prices[priced], minlength=size)
+    price_count = np.bincount(codes[priced], minlength=size)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        price_mean = price_sum / price_count
+
+    grouped = pd.Series(prices[priced]).groupby(codes[priced])
+    # Senza prezzi nei gruppi (es. feed vuoto o senza categorie) unstack non ha colonne dei quantili
+    quantiles = grouped.quantile(list(PRICE_QUANTILES)).unstack().reindex(index=range(size), columns=list(PRICE_QUANTILES))
+    histogram = np.bincount(codes[bins >= 0] * PRICE_HISTOGRAM_BINS + bins[bins >= 0],
+                            minlength=size * PRICE_HISTOGRAM_BINS).reshape(size, PRICE_HISTOGRAM_BINS)
+
+    table = pd.DataFrame({
+        "name": np.asarray(names, dtype=object),
+        "products": products,
+        "stock": np.bincount(codes, weights=stock, minlength=size).astype(np.int64),
+        "in_stock": np.bincount(codes[stock > 0], minlength=size),
+        "price_mean": price_mean,
+        "price_min": grouped.min().reindex(range(size)).to_numpy(),
+        "price_q25": quantiles[PRICE_QUANTILES[0]].to_numpy(),
+        "price_median": quantiles[PRICE_QUANTILES[1]].to_numpy(),
+        "price_q75": quantiles[PRICE_QUANTILES[2]].to_numpy(),
+        "price_max": grouped.max().reindex(range(size)).to_numpy(),
+        "histogram": list(histogram),
+    })
+    table = table[table["products"] > 0]
+    return table.sort_values(["products", "name"], ascending=[False, True], kind="stable").reset_index(drop=True)
+
+
+def _category_entries(products):
+    """Righe e codici delle coppie (prodotto, categoria) dalla colonna Category_List."""
+    column = products.get("Category_List")
+    if column is None or not isinstance(column.dtype, pd.ArrowDtype) or not pa.types.is_list(column.dtype.pyarrow_dtype):
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0, dtype=object)
+    lists = column.array.__arrow_array__()
+    rows = pc.list_parent_indices(lists).to_numpy().astype(np.int64)
+    flat = pc.list_flatten(lists)
+    if pa.types.is_dictionary(flat.type):
+        # Il dizionario può ripetere un nome (ID diversi con lo stesso nome): i codici vanno per nome
+        flat = flat.unify_dictionaries()
+        if flat.num_chunks == 0:
+            return rows, np.empty(0, dtype=np.int64), np.empty(0, dtype=object)
+        name_codes, names = pd.factorize(flat.chunk(0).dictionary.to_numpy(zero_copy_only=False))
+        indices = np.concatenate([chunk.indices.fill_null(-1).to_numpy() for chunk in flat.chunks]).astype(np.int64)
+        codes = np.where(indices >= 0, name_codes[np.maximum(indices, 0)], -1) if len(name_codes) else np.full(len(indices), -1)
+        return rows, codes.astype(np.int64), np.asarray(names, dtype=object)
+    names = pd.Categorical(flat.to_pandas())
+    return rows, names.codes.astype(np.int64), names.categories.to_numpy(dtype=object)
+
+
+def compute_catalog_stats(products):
+    """Statistiche del catalogo mappato: totali, prezzi e stock per categoria e per produttore.
+
+    Da calcolare una volta per versione del catalogo (vedi data_utils.store_catalog).
+    """
+    prices = pd.to_numeric(products["PRICE"], errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan) \
+        if "PRICE" in products else np.full(len(products), np.nan)
+    stock = pd.to_numeric(products["STOCK"], errors="coerce").fillna(0).to_numpy(dtype=np.int64) \
+        if "STOCK" in products else np.zeros(len(products), dtype=np.int64)
+    edges = _price_edges(prices)
+    bins = _price_bins(prices, edges)
+
+    rows, codes, names = _category_entries(products)
+    categories = _group_stats(codes, names, prices[rows], stock[rows], bins[rows])
+
+    if "Manufacturer" in products:
+        manufacturer = products["Manufacturer"].astype("category")
+        manufacturer_codes = manufacturer.cat.codes.to_numpy(dtype=np.int64)
+        manufacturer_names = manufacturer.cat.categories.to_numpy(dtype=object)
+    else:
+        manufacturer_codes, manufacturer_names = np.full(len(products), -1, dtype=np.int64), np.empty(0, dtype=object)
+    manufacturers = _group_stats(manufacturer_codes, manufacturer_names, prices, stock, bins)
+
+    priced = prices[~np.isnan(prices)]
+    summary = {
+        "products": int(len(products)),
+        "stock": int(stock.sum()),
+        "in_stock": int((stock > 0).sum()),
+        "price_mean": float(priced.mean()) if len(priced) else None,
+        "price_median": float(np.median(priced)) if len(priced) else None,
+        "categories": int(len(categories)),
+        "manufacturers": int(len(manufacturers)),
+    }
+    histogram = np.bincount(bins[bins >= 0], minlength=PRICE_HISTOGRAM_BINS)
+    return {
+        "summary": summary,
+        "price_edges": edges.tolist(),
+        "price_histogram": histogram.tolist(),
+        "categories": categories,
+        "manufacturers": manufacturers,
+    }
+
+
+def _table_to_json(table):
+    table = table.astype({"histogram": object})
+    table["histogram"] = table["histogram"].map(lambda counts: [int(c) for c in counts])
+    return {col: [None if isinstance(v, float) and np.isnan(v) else v for v in table[col].tolist()]
+            for col in table.columns}
+
+
+def save_catalog_stats(stats, directory):
+    """Salva le statistiche nella directory del catalogo (scrittura atomica)."""
+    payload = {
+        **{key: value for key, value in stats.items() if key not in ("categories", "manufacturers")},
+        "categories": _table_to_json(stats["categories"]),
+        "manufacturers": _table_to_json(stats["manufacturers"]),
+    }
+    path = os.path.join(directory, STATS_FILE)
+    with open(path + ".tmp", "w") as f:
+        json.dump(payload, f)
+    os.replace(path + ".tmp", path)
+
+
+def read_catalog_stats(directory):
+    """Statistiche salvate nella directory del catalogo, oppure None."""
+    try:
+        with open(os.path.join(directory, STATS_FILE), "r") as f:
+            stats = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    for key in ("categories", "manufacturers"):
+        stats[key] = pd.DataFrame(stats[key], columns=list(GROUP_COLUMNS))
+    return stats
+
+
+def histogram_frame(stats, counts):
+    """Istogramma come DataFrame per i grafici, con l'intervallo di prezzo come indice."""
+    edges = stats["price_edges"]
+    labels = [f"{edges[i]:.0f}-{edges[i + 1]:.0f}" for i in range(len(edges) - 2)] + [f">{edges[-2]:.0f}"]
+    return pd.DataFrame({"Prezzo (€)": labels, "Prodotti": list(counts)}).set_index("Prezzo (€)")
@@ -0,0 +1,228 @@
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+from utils.ingest import ingest_files
+from utils.perf import traced
+from utils.schema import CATEGORY_COLUMN_PATTERN, category_lists, compact_products
+from utils.suppliers import BIGBUY
+
+# Colonne calcolate da map_data
+DERIVED_COLUMNS = ['Category_List', 'Manufacturer']
+
+
+def load_data(product_files, category_files, manufacturer_files, supplier=BIGBUY):
+    """Legge i file prodotti, categorie e produttori e ne normalizza i tipi."""
+    products, categories, manufacturers, _ = ingest_files(product_files, category_files, manufacturer_files, supplier=supplier)
+    return products, categories, manufacturers
+
+
+# Rappresentazione CSR delle categorie di ogni prodotto: le categorie della riga i sono
+# labels[codes[offsets[i]:offsets[i + 1]]], con ids[codes] gli ID BigBuy corrispondenti
+CategoryCSR = namedtuple('CategoryCSR', ['offsets', 'codes', 'ids', 'labels'])
+
+
+def _parse_category_strings(category_strings):
+    """Divide una sola volta ogni stringa CATEGORY distinta negli ID che contiene.
+
+    Restituisce, per ogni riga, l'indice della stringa distinta; per le stringhe distinte
+    gli offset e i codici dei loro ID; gli ID distinti ordinati.
+    """
+    # I valori mancanti diventano stringhe vuote: con il sentinella -1 di factorize le loro
+    # righe prenderebbero le categorie dell'ultima stringa distinta
+    row_keys, distinct = pd.factorize(pd.Series(category_strings).astype(str).fillna(''))
+    tokens = pd.Series(distinct).str.split(r'[ ,;]+', regex=True).explode().str.strip()
+    tokens = tokens[tokens.str.fullmatch(r'\d+', na=False)]
+    ids, token_codes = np.unique(tokens.astype('int64').to_numpy(), return_inverse=True)
+    distinct_offsets = np.zeros(len(distinct) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(tokens.index.to_numpy(dtype=np.int64), minlength=len(distinct)), out=distinct_offsets[1:])
+    return row_keys, distinct_offsets, token_codes.astype(np.int32), ids
+
+
+def _category_labels(ids, categories):
+    """Nomi delle categorie per gli ID indicati (ricerca su array); "ID: <n>" se assenti."""
+    table = categories.drop_duplicates('ID', keep='last')
+    positions = pd.Index(table['ID']).get_indexer(ids)
+    names = table['NAME'].to_numpy(dtype=object)
+    labels = np.array([f"ID: {cat}" for cat in ids], dtype=object)
+    labels[positions >= 0] = names[positions[positions >= 0]]
+    return labels
+
+
+def _expand_rows(row_keys, distinct_offsets, distinct_codes):
+    """Espande la CSR delle stringhe distinte sulle righe dei prodotti."""
+    counts = np.diff(distinct_offsets)[row_keys]
+    offsets = np.zeros(len(row_keys) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    entries = np.arange(offsets[-1]) - np.repeat(offsets[:-1] - distinct_offsets[:-1][row_keys], counts)
+    return offsets, distinct_codes[entries]
+
+
+def build_category_csr(category_strings, categories):
+    """Converte le stringhe CATEGORY (ID separati da spazi, virgole o punti e virgola) in CSR.
+
+    Ogni ID distinto riceve un codice intero e il nome viene risolto con una ricerca su
+    array nella tabella categorie.
+    """
+    row_keys, distinct_offsets, distinct_codes, ids = _parse_category_strings(category_strings)
+    offsets, codes = _expand_rows(row_keys, distinct_offsets, distinct_codes)
+    return CategoryCSR(offsets, codes, ids, _category_labels(ids, categories))
+
+
+def map_categories(products, categories):
+    """Calcola Category_List e CATEGORY_1..N dei prodotti; restituisce le colonne e la CSR."""
+    row_keys, distinct_offsets, distinct_codes, ids = _parse_category_strings(products['CATEGORY'])
+    labels = _category_labels(ids, categories)
+    offsets, codes = _expand_rows(row_keys, distinct_offsets, distinct_codes)
+
+    # Le liste sono codici sui nomi delle categorie, costruite direttamente dalla CSR
+    columns = {'Category_List': category_lists(offsets, codes, labels)}
+
+    counts = np.diff(distinct_offsets)
+    width = max(int(counts.max()), 1) if len(row_keys) else 0
+    for k in range(width):
+        # Suddividere le categorie in colonne separate
+        column = np.full(len(counts), np.nan, dtype=object)
+        has_k = counts > k
+        column[has_k] = labels[distinct_codes[distinct_offsets[:-1][has_k] + k]]
+        columns[f"CATEGORY_{k + 1}"] = column[row_keys]
+
+    return columns, CategoryCSR(offsets, codes, ids, labels)
+
+
+@traced("map_data", rows_in=lambda products, *args, **kwargs: len(products),
+        rows_out=lambda result: len(result[0] if isinstance(result, tuple) else result))
+def map_data(products, categories, manufacturers, return_csr=False, compact=True):
+    """Aggiunge ai prodotti i nomi di categorie e produttori.
+
+    Il risultato segue lo schema compatto di utils.schema (compact=False lascia i tipi
+    prodotti dal calcolo). Con return_csr=True restituisce anche la CategoryCSR delle
+    categorie dei prodotti.
+    """
+    columns, csr = map_categories(products, categories)
+    manufacturer_map = manufacturers.set_index('ID')['NAME'].to_dict()
+
+    category_columns = {name: values for name, values in columns.items() if name != 'Category_List'}
+    products = products.drop(columns=[col for col in products.columns if CATEGORY_COLUMN_PATTERN.match(col)])
+    products = products.assign(
+        Category_List=pd.Series(columns['Category_List'], index=products.index),
+        Manufacturer=products['BRAND'].map(manufacturer_map),
+        **{name: pd.Series(values, index=products.index, dtype=object).infer_objects() for name, values in category_columns.items()},
+    )
+    if compact:
+        products = compact_products(products)
+    return (products, csr) if return_csr else products
+
+
+def base_columns(products):
+    """Restituisce le colonne originali del feed, escluse quelle calcolate da map_data."""
+    return [col for col in products.columns if col not in DERIVED_COLUMNS and not CATEGORY_COLUMN_PATTERN.match(col)]
+
+
+def merge_reference(previous, update):
+    """Unisce una tabella di riferimento (categorie o produttori) con i nuovi record per ID."""
+    if previous is None:
+        return update.drop_duplicates('ID', keep='last').reset_index(drop=True)
+    merged = pd.concat([previous, update], ignore_index=True)
+    return merged.drop_duplicates('ID', keep='last').reset_index(drop=True)
+
+
+def changed_reference_ids(previous, current):
+    """ID delle categorie o dei produttori nuovi o con il nome modificato."""
+    if previous is None:
+        return set()
+    old_names = previous.drop_duplicates('ID', keep='last').set_index('ID')['NAME']
+    new_names = current.drop_duplicates('ID', keep='last').set_index('ID')['NAME']
+    old_names = old_names.reindex(new_names.index)
+    changed = (old_names != new_names) & ~(old_names.isna() & new_names.isna())
+    return set(new_names.index[changed.to_numpy()])
+
+
+def _rows_with_categories(products, category_ids):
+    """Maschera delle righe la cui colonna CATEGORY contiene almeno uno degli ID indicati."""
+    if not category_ids or len(products) == 0:
+        return pd.Series(False, index=products.index)
+    tokens = products['CATEGORY'].astype(str).str.split(r'[ ,;]+', regex=True).explode()
+    tokens = pd.to_numeric(tokens.where(tokens.str.fullmatch(r'\d+', na=False)), errors='coerce')
+    hits = tokens.isin(list(category_ids))
+    return hits.groupby(level=0).any().reindex(products.index, fill_value=False)
+
+
+def _latest_rows(feed):
+    """Tiene, per ogni ID del feed, solo la riga con DATE_UPD più recente."""
+    if 'DATE_UPD' in feed.columns:
+        order = pd.to_datetime(feed['DATE_UPD'], errors='coerce').argsort(kind='stable')
+        feed = feed.iloc[order]
+    return feed.drop_duplicates('ID', keep='last')
+
+
+def upsert_catalog(current, feed, categories, manufacturers, previous_categories=None, previous_manufacturers=None,
+                   deleted_ids=None, full_feed=False):
+    """Integra un feed nel catalogo già mappato, ricalcolando solo le righe interessate.
+
+    Le righe del feed sono confrontate con il catalogo per ID: quelle nuove o con DATE_UPD
+    più recente sostituiscono le esistenti. Se il feed è completo (full_feed) i prodotti
+    assenti vengono rimossi, così come quelli in deleted_ids. Categorie e produttori il cui
+    nome è cambiato rispetto alle tabelle precedenti fanno ricalcolare solo i prodotti che
+    li referenziano.
+
+    Restituisce il catalogo aggiornato e un dizionario con il conteggio delle modifiche.
+    """
+    feed = _latest_rows(feed).reset_index(drop=True)
+    if current is None or len(current) == 0:
+        products = map_data(feed, categories, manufacturers) if len(feed) else feed
+        return products, {"new": len(feed), "updated": 0, "deleted": 0, "remapped": 0, "unchanged": 0}
+
+    deleted_ids = list(deleted_ids or [])
+    feed = feed[~feed['ID'].isin(deleted_ids)]
+    current = current.drop_duplicates('ID', keep='last').reset_index(drop=True)
+    current_ids = pd.Index(current['ID'])
+    positions = current_ids.get_indexer(feed['ID'])
+    is_new = positions == -1
+
+    # Righe esistenti aggiornate: DATE_UPD più recente (o data non confrontabile)
+    if 'DATE_UPD' in feed.columns and 'DATE_UPD' in current.columns:
+        feed_dates = pd.to_datetime(feed['DATE_UPD'], errors='coerce').to_numpy()
+        current_dates = pd.to_datetime(current['DATE_UPD'], errors='coerce').to_numpy()[positions]
+        is_updated = ~is_new & ~(current_dates >= feed_dates)
+    else:
+        is_updated = ~is_new
+
+    replaced = pd.Series(False, index=current.index)
+    replaced.iloc[positions[is_updated]] = True
+
+    deleted = current['ID'].isin(deleted_ids)
+    if full_feed:
+        # Il feed completo di un fornitore non rimuove i prodotti degli altri fornitori
+        # (quelli senza SUPPLIER vengono dai cataloghi importati prima degli adattatori)
+        same_supplier = pd.Series(True, index=current.index)
+        if 'SUPPLIER' in current.columns and 'SUPPLIER' in feed.columns:
+            same_supplier = current['SUPPLIER'].isna() | current['SUPPLIER'].isin(feed['SUPPLIER'].dropna().unique())
+        deleted |= same_supplier & ~current['ID'].isin(feed['ID'])
+
+    # Prodotti da ricalcolare perché sono cambiati i nomi di categorie o produttori
+    changed_categories = changed_reference_ids(previous_categories, categories)
+    changed_manufacturers = changed_reference_ids(previous_manufacturers, manufacturers)
+    remap = _rows_with_categories(current, changed_categories) | current['BRAND'].isin(list(changed_manufacturers))
+    remap &= ~(replaced | deleted)
+
+    to_map = pd.concat([feed[is_new | is_updated], current.loc[remap, base_columns(current)]], ignore_index=True)
+    kept = current[~(replaced | deleted | remap)]
+    if len(to_map):
+        products = pd.concat([kept, map_data(to_map, categories, manufacturers)], ignore_index=True)
+    else:
+        products = kept.reset_index(drop=True)
+
+    # Mantiene l'ordine del catalogo; i prodotti nuovi vanno in coda
+    order = current_ids.get_indexer(products['ID'])
+    order[order == -1] = len(current) + np.arange(int((order == -1).sum()))
+    products = compact_products(products.iloc[order.argsort(kind='stable')].reset_index(drop=True))
+
+    stats = {
+        "new": int(is_new.sum()),
+        "updated": int(is_updated.sum()),
+        "deleted": int(deleted.sum()),
+        "remapped": int(remap.sum()),
+        "unchanged": len(kept),
+    }
+    return products, stats
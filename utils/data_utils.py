@@ -1,23 +1,256 @@
+import ast
+import hashlib
+import json
 import os
 import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+from utils.schema import compact_products
+from utils.catalog_stats import compute_catalog_stats, read_catalog_stats, save_catalog_stats
+from utils.upload_spool import file_digest
+from utils.perf import traced
+import shutil
+import tempfile
 
-# Directory per memorizzare i file catalogo
+# Directory per memorizzare i file catalogo (creata al primo salvataggio)
 CATALOG_DIR = "catalog_data"
-if not os.path.exists(CATALOG_DIR):
-    os.makedirs(CATALOG_DIR)
 
-def save_catalog_to_file(products, categories, manufacturers):
-    """Salva i dati del catalogo su file."""
-    products.to_csv(os.path.join(CATALOG_DIR, "products.csv"), index=False)
-    categories.to_csv(os.path.join(CATALOG_DIR, "categories.csv"), index=False)
-    manufacturers.to_csv(os.path.join(CATALOG_DIR, "manufacturers.csv"), index=False)
+# Tabelle che compongono un catalogo
+CATALOG_TABLES = ("products", "categories", "manufacturers")
+
+# Colonne che contengono liste (serializzate come testo nei CSV)
+LIST_COLUMNS = ("Category_List",)
+
+# File con la versione del catalogo salvato
+MANIFEST_FILE = "manifest.json"
+
+# Archivio condiviso dei cataloghi, uno per impronta dei file sorgente
+STORE_DIR = os.path.join(CATALOG_DIR, "store")
+
+# Riferimento all'ultimo catalogo salvato
+LATEST_FILE = "latest.json"
+
+# Colonne che identificano il contenuto di un catalogo
+VERSION_COLUMNS = ("ID", "NAME", "DESCRIPTION", "CATEGORY", "BRAND", "PRICE", "STOCK", "EAN13", "DATE_UPD")
+
+# Righe hashate per blocco nel calcolo della versione: l'hash delle stringhe passa da oggetti
+# Python, che per un milione di descrizioni non starebbero in memoria tutti insieme
+VERSION_CHUNK_SIZE = 20_000
+
+
+def _table_path(name, ext, directory=CATALOG_DIR):
+    return os.path.join(directory, f"{name}.{ext}")
+
+
+def _to_arrow_table(df):
+    """Converte un DataFrame in tabella Arrow mantenendo i tipi delle colonne."""
+    df = df.reset_index(drop=True)
+    try:
+        return pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Colonne object con tipi misti (es. numeri e testo): si salvano come testo
+        df = df.copy()
+        for col in df.columns:
+            if df[col].dtype == object and col not in LIST_COLUMNS:
+                df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+        return pa.Table.from_pandas(df, preserve_index=False)
+
+
+def list_to_text(values):
+    if isinstance(values, float) or values is None:
+        return "[]"
+    return str([str(value) for value in values])
+
+
+def catalog_version(products, categories=None, manufacturers=None):
+    """Calcola un identificativo del contenuto del catalogo, usato come chiave delle cache."""
+    digest = hashlib.blake2b(digest_size=16)
+    for df in (products, categories, manufacturers):
+        if df is None:
+            continue
+        columns = [col for col in df.columns if col in VERSION_COLUMNS]
+        digest.update(str(len(df)).encode())
+        if not columns:
+            continue
+        # L'hash di ogni riga non dipende dalle altre: a blocchi si ottiene la stessa versione
+        frame = df[columns]
+        for start in range(0, len(frame), VERSION_CHUNK_SIZE):
+            chunk = frame.iloc[start:start + VERSION_CHUNK_SIZE]
+            digest.update(pd.util.hash_pandas_object(chunk, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def save_catalog_to_file(products, categories, manufacturers, directory=CATALOG_DIR):
+    """Salva i dati del catalogo su file in formato colonnare (Arrow IPC).
+
+    Restituisce la versione del catalogo salvato.
+    """
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    for name, df in zip(CATALOG_TABLES, (products, categories, manufacturers)):
+        path = _table_path(name, "arrow", directory)
+        tmp_path = path + ".tmp"
+        # Non compresso, così il file può essere mappato in memoria senza copie
+        feather.write_feather(_to_arrow_table(df), tmp_path, compression="uncompressed")
+        os.replace(tmp_path, path)
+
+    version = catalog_version(products, categories, manufacturers)
+    with open(os.path.join(directory, MANIFEST_FILE), "w") as f:
+        json.dump({"version": version}, f)
+    return version
+
+
+def get_catalog_version(ref=None):
+    """Restituisce la versione del catalogo salvato (quello dell'archivio con il riferimento indicato)."""
+    directory = _store_path(ref) if ref else CATALOG_DIR
+    try:
+        with open(os.path.join(directory, MANIFEST_FILE), "r") as f:
+            return json.load(f).get("version")
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def _list_types(arrow_type):
+    return pd.ArrowDtype(arrow_type) if pa.types.is_list(arrow_type) else None
+
+
+def _read_catalog(directory):
+    paths = [_table_path(name, "arrow", directory) for name in CATALOG_TABLES]
+    if not all(os.path.exists(path) for path in paths):
+        return None, None, None
+    frames = []
+    for path in paths:
+        table = feather.read_table(path, memory_map=True)
+        # Le colonne di liste restano in Arrow (es. Category_List a codici)
+        frames.append(table.to_pandas(split_blocks=True, types_mapper=_list_types))
+    return tuple(frames)
+
+
+def source_files_key(*file_groups, options=None):
+    """Impronta del contenuto dei file sorgente, usata come riferimento del catalogo nell'archivio.
+
+    `file_groups` sono liste di percorsi (prodotti, categorie, produttori); `options`
+    contiene ciò che, oltre ai file, influisce sul catalogo risultante.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for paths in file_groups:
+        digest.update(f"group:{len(paths)}".encode())
+        for path in paths:
+            # Per i file caricati l'impronta è già nel nome: non si rilegge il contenuto
+            digest.update(f"file:{file_digest(path)}".encode())
+    if options is not None:
+        digest.update(json.dumps(options, sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+
+def _store_path(ref):
+    return os.path.join(STORE_DIR, ref)
+
+
+def catalog_in_store(ref):
+    """Indica se l'archivio contiene già il catalogo con il riferimento indicato."""
+    return bool(ref) and os.path.exists(os.path.join(_store_path(ref), MANIFEST_FILE))
+
+
+def latest_catalog_ref():
+    """Riferimento dell'ultimo catalogo salvato nell'archivio, se presente."""
+    try:
+        with open(os.path.join(CATALOG_DIR, LATEST_FILE), "r") as f:
+            return json.load(f).get("ref")
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+@traced("store_catalog", rows_in=lambda ref, products, *args: len(products))
+def store_catalog(ref, products, categories, manufacturers):
+    """Salva un catalogo nell'archivio condiviso, una sola volta per riferimento.
+
+    Il catalogo viene scritto in una directory temporanea e poi rinominato, così chi lo
+    legge non vede mai un catalogo incompleto. Le statistiche della dashboard vengono
+    calcolate qui, una volta per catalogo, e salvate accanto. Restituisce il riferimento.
+    """
+    if not catalog_in_store(ref):
+        os.makedirs(STORE_DIR, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(prefix=f".{ref}_", dir=STORE_DIR)
+        save_catalog_to_file(products, categories, manufacturers, directory=tmp_dir)
+        save_catalog_stats(compute_catalog_stats(products), tmp_dir)
+        try:
+            os.replace(tmp_dir, _store_path(ref))
+        except OSError:
+            # Salvato nel frattempo da un'altra sessione
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+    with open(os.path.join(CATALOG_DIR, LATEST_FILE), "w") as f:
+        json.dump({"ref": ref}, f)
+    return ref
+
+
+@traced("load_catalog", rows_out=lambda result: 0 if result[1] is None else len(result[1]))
+def load_catalog(ref=None):
+    """Carica dall'archivio il catalogo con il riferimento indicato, mappandolo in memoria.
+
+    Senza riferimento (o se non è nell'archivio) carica l'ultimo catalogo salvato,
+    migrando nell'archivio quelli salvati dalle versioni precedenti. Restituisce
+    riferimento, prodotti, categorie e produttori (tutti None se non c'è un catalogo).
+    """
+    for candidate in (ref, latest_catalog_ref()):
+        if catalog_in_store(candidate):
+            return (candidate,) + _read_catalog(_store_path(candidate))
+
+    # Cataloghi salvati con le versioni precedenti: Arrow o CSV nella directory principale
+    products, categories, manufacturers = _read_catalog(CATALOG_DIR)
+    if products is None:
+        products, categories, manufacturers = import_catalog_from_csv()
+    if products is None:
+        return None, None, None, None
+    products = compact_products(products)
+    ref = store_catalog(catalog_version(products, categories, manufacturers), products, categories, manufacturers)
+    return (ref,) + _read_catalog(_store_path(ref))
+
+
+def load_catalog_stats(ref):
+    """Statistiche del catalogo dell'archivio con il riferimento indicato, oppure None.
+
+    Per i cataloghi salvati prima delle statistiche vengono calcolate e salvate ora.
+    """
+    if not catalog_in_store(ref):
+        return None
+    stats = read_catalog_stats(_store_path(ref))
+    if stats is None:
+        products = _read_catalog(_store_path(ref))[0]
+        save_catalog_stats(compute_catalog_stats(products), _store_path(ref))
+        stats = read_catalog_stats(_store_path(ref))
+    return stats
+
 
 def load_catalog_from_file():
-    """Carica i dati del catalogo da file."""
+    """Carica i dati dell'ultimo catalogo salvato, mappandoli in memoria."""
+    return load_catalog()[1:]
+
+
+def export_catalog_to_csv(products, categories, manufacturers, directory=CATALOG_DIR):
+    """Esporta il catalogo in CSV (formato compatibile con le versioni precedenti)."""
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    for name, df in zip(CATALOG_TABLES, (products, categories, manufacturers)):
+        df = df.copy()
+        for col in LIST_COLUMNS:
+            if col in df.columns:
+                df[col] = df[col].map(list_to_text)
+        df.to_csv(_table_path(name, "csv", directory), index=False)
+
+
+def import_catalog_from_csv(directory=CATALOG_DIR):
+    """Importa un catalogo salvato in CSV."""
     try:
-        products = pd.read_csv(os.path.join(CATALOG_DIR, "products.csv"))
-        categories = pd.read_csv(os.path.join(CATALOG_DIR, "categories.csv"))
-        manufacturers = pd.read_csv(os.path.join(CATALOG_DIR, "manufacturers.csv"))
-        return products, categories, manufacturers
+        products = pd.read_csv(_table_path("products", "csv", directory), dtype={"EAN13": str}, low_memory=False)
+        categories = pd.read_csv(_table_path("categories", "csv", directory))
+        manufacturers = pd.read_csv(_table_path("manufacturers", "csv", directory))
     except FileNotFoundError:
         return None, None, None
+
+    for col in LIST_COLUMNS:
+        if col in products.columns:
+            products[col] = products[col].map(
+                lambda text: ast.literal_eval(text) if isinstance(text, str) and text.startswith("[") else []
+            )
+    return products, categories, manufacturers
@@ -0,0 +1,193 @@
+import gzip
+import io
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from utils.data_utils import LIST_COLUMNS, list_to_text
+from utils.query import LRUCache
+from utils.schema import decimal_values, format_ean13
+
+# Righe scritte per blocco
+EXPORT_CHUNK_ROWS = 50_000
+
+# Oltre questa dimensione il file temporaneo passa dalla memoria al disco
+SPOOL_MAX_BYTES = 16 * 1024 * 1024
+
+# Esportazioni completate tenute pronte per un nuovo download
+EXPORT_CACHE_SIZE = 8
+
+# Limite di righe di un foglio Excel (intestazione inclusa)
+XLSX_MAX_ROWS = 1_048_576
+
+# Formato -> (estensione, tipo MIME)
+EXPORT_FORMATS = {
+    "CSV": (".csv", "text/csv"),
+    "CSV compresso (gzip)": (".csv.gz", "application/gzip"),
+    "Parquet": (".parquet", "application/vnd.apache.parquet"),
+    "Excel (XLSX)": (".xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+}
+
+
+def available_formats():
+    """Formati di esportazione utilizzabili (XLSX richiede openpyxl)."""
+    formats = list(EXPORT_FORMATS)
+    try:
+        import openpyxl  # noqa: F401
+    except ImportError:
+        formats.remove("Excel (XLSX)")
+    return formats
+
+
+def _chunks(products, positions, columns):
+    for start in range(0, len(positions), EXPORT_CHUNK_ROWS):
+        frame = products.iloc[positions[start:start + EXPORT_CHUNK_ROWS]][columns]
+        if 'EAN13' in frame.columns:
+            frame = frame.assign(EAN13=format_ean13(frame['EAN13']))
+        yield start, frame
+
+
+def _as_text_lists(frame):
+    for col in LIST_COLUMNS:
+        if col in frame.columns:
+            frame = frame.assign(**{col: frame[col].map(list_to_text)})
+    return frame
+
+
+def _write_csv(products, positions, columns, out, progress, compress=False):
+    raw = gzip.GzipFile(fileobj=out, mode="wb") if compress else out
+    text = io.TextIOWrapper(raw, encoding="utf-8", newline="")
+    try:
+        if len(positions) == 0:
+            text.write(";".join(columns) + "\n")
+        for start, frame in _chunks(products, positions, columns):
+            _as_text_lists(frame).to_csv(text, index=False, sep=";", header=start == 0)
+            progress(start + len(frame))
+        text.flush()
+    finally:
+        # Chiude il flusso gzip senza chiudere il file di destinazione
+        text.detach()
+        if compress:
+            raw.close()
+
+
+def _write_parquet(products, positions, columns, out, progress):
+    writer = None
+    try:
+        for start, frame in _chunks(products, positions, columns):
+            table = pa.Table.from_pandas(frame, preserve_index=False, schema=writer.schema if writer else None)
+            if writer is None:
+                writer = pq.ParquetWriter(out, table.schema)
+            writer.write_table(table)
+            progress(start + len(frame))
+        if writer is None:
+            pq.write_table(pa.Table.from_pandas(products.iloc[:0][columns], preserve_index=False), out)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def _write_xlsx(products, positions, columns, out, progress):
+    from openpyxl import Workbook
+
+    if len(positions) + 1 > XLSX_MAX_ROWS:
+        raise ValueError(f"Troppe righe per un file Excel ({len(positions)}): usa CSV o Parquet.")
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Prodotti")
+    sheet.append(columns)
+    for start, frame in _chunks(products, positions, columns):
+        frame = _as_text_lists(frame)
+        frame = frame.assign(**{col: decimal_values(frame[col]) for col in frame.columns if frame[col].dtype == 'float32'})
+        frame = frame.astype(object).where(frame.notna(), None)
+        for row in frame.itertuples(index=False, name=None):
+            sheet.append(row)
+        progress(start + len(frame))
+    workbook.save(out)
+
+
+def write_export(products, positions, columns, fmt, out, progress=None):
+    """Scrive le righe indicate di products nel file `out`, a blocchi, nel formato richiesto.
+
+    `progress`, se indicata, riceve il numero di righe scritte finora.
+    """
+    progress = progress or (lambda rows: None)
+    if fmt == "CSV":
+        _write_csv(products, positions, columns, out, progress)
+    elif fmt == "CSV compresso (gzip)":
+        _write_csv(products, positions, columns, out, progress, compress=True)
+    elif fmt == "Parquet":
+        _write_parquet(products, positions, columns, out, progress)
+    elif fmt == "Excel (XLSX)":
+        _write_xlsx(products, positions, columns, out, progress)
+    else:
+        raise ValueError(f"Formato di esportazione non supportato: {fmt}")
+
+
+class ExportJob:
+    """Esportazione in corso o completata, scritta in un file temporaneo."""
+
+    def __init__(self, fmt, total_rows):
+        self.fmt = fmt
+        self.total_rows = total_rows
+        self.rows_written = 0
+        self.error = None
+        self.file = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    @property
+    def progress(self):
+        return 1.0 if self.done else self.rows_written / max(self.total_rows, 1)
+
+    @property
+    def file_extension(self):
+        return EXPORT_FORMATS[self.fmt][0]
+
+    @property
+    def mime(self):
+        return EXPORT_FORMATS[self.fmt][1]
+
+    def run(self, products, positions, columns):
+        try:
+            write_export(products, positions, columns, self.fmt, self.file, progress=self._set_progress)
+        except Exception as e:
+            self.error = str(e)
+        finally:
+            self._done.set()
+
+    def _set_progress(self, rows):
+        self.rows_written = rows
+
+    def read(self):
+        """Contenuto del file esportato."""
+        with self._lock:
+            self.file.seek(0)
+            return self.file.read()
+
+
+class ExportManager:
+    """Esegue le esportazioni in background e ricorda le ultime per firma dei filtri."""
+
+    def __init__(self, max_workers=2, cache_size=EXPORT_CACHE_SIZE):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="export")
+        self._jobs = LRUCache(cache_size)
+
+    def get(self, key):
+        """Esportazione già avviata per la chiave, se presente."""
+        return self._jobs.get(key)
+
+    def submit(self, key, products, positions, columns, fmt):
+        """Avvia l'esportazione identificata da key, o riusa quella già avviata se non è fallita."""
+        job = self.get(key)
+        if job is None or job.error is not None:
+            job = ExportJob(fmt, len(positions))
+            self._jobs.put(key, job)
+            self._executor.submit(job.run, products, positions, list(columns))
+        return job
@@ -0,0 +1,237 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+import pyarrow as pa
+
+from utils.perf import traced
+from utils.suppliers import BIGBUY
+
+# Colonne normalizzate dei prodotti, delle categorie e dei produttori (per ogni fornitore)
+PRODUCT_COLUMNS = ['ID', 'NAME', 'DESCRIPTION', 'CATEGORY', 'BRAND', 'PRICE', 'STOCK', 'EAN13', 'IMAGE1', 'DATE_ADD', 'DATE_UPD']
+REFERENCE_COLUMNS = ['ID', 'NAME']
+
+# Tipi Arrow delle colonne normalizzate (uguali per ogni blocco e per ogni file)
+COLUMN_TYPES = {
+    'ID': pa.string(),
+    'NAME': pa.string(),
+    'DESCRIPTION': pa.string(),
+    'CATEGORY': pa.string(),
+    'BRAND': pa.int32(),
+    'PRICE': pa.float32(),
+    'STOCK': pa.int32(),
+    'EAN13': pa.uint64(),
+    'IMAGE1': pa.string(),
+    'DATE_ADD': pa.string(),
+    'DATE_UPD': pa.string(),
+}
+REFERENCE_TYPES = {'ID': pa.int64(), 'NAME': pa.string()}
+
+# Righe lette per blocco da ciascun file
+CHUNK_SIZE = 50_000
+
+# Sotto questa dimensione totale i file si leggono nel processo corrente
+PARALLEL_MIN_BYTES = 32 * 1024 * 1024
+
+
+def normalize_products(chunk):
+    """Normalizza i tipi di un blocco di prodotti con operazioni vettoriali."""
+    if 'CATEGORY' in chunk.columns:
+        chunk['CATEGORY'] = chunk['CATEGORY'].fillna('')
+    for col in ('BRAND', 'STOCK'):
+        if col in chunk.columns:
+            chunk[col] = pd.to_numeric(chunk[col], errors='coerce').fillna(0).astype('int32')
+    if 'PRICE' in chunk.columns:
+        chunk['PRICE'] = pd.to_numeric(chunk['PRICE'], errors='coerce').fillna(0).astype('float32')
+    if 'EAN13' in chunk.columns:
+        # Codice numerico (0 se assente); le 13 cifre si formattano solo per la visualizzazione
+        ean = pd.to_numeric(chunk['EAN13'], errors='coerce')
+        chunk['EAN13'] = ean.where(ean >= 0).fillna(0).astype('uint64')
+    return chunk
+
+
+def normalize_reference(chunk):
+    """Normalizza i tipi di un blocco di categorie o produttori."""
+    chunk['ID'] = pd.to_numeric(chunk['ID'], errors='coerce').fillna(0).astype('int64')
+    return chunk
+
+
+class _ArrowParts:
+    """File Arrow IPC scritti a blocchi, uno per tipo di tabella."""
+
+    def __init__(self, out_path):
+        self.out_path = out_path
+        self.paths = {}
+        self._writers = {}
+
+    def write(self, name, df, types):
+        schema = pa.schema([(col, types.get(col, pa.string())) for col in df.columns])
+        table = pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+        if name not in self._writers:
+            self.paths[name] = self.out_path if name == 'main' else f"{self.out_path}.{name}"
+            self._writers[name] = pa.ipc.new_file(self.paths[name], schema)
+        self._writers[name].write_table(table)
+
+    def close(self):
+        for writer in self._writers.values():
+            writer.close()
+
+
+def _ingest_file(path, kind, out_path, chunksize, supplier=BIGBUY):
+    """Legge un file a blocchi e scrive ogni blocco normalizzato in un file Arrow IPC.
+
+    Viene eseguita nei processi del pool: restituisce solo i percorsi scritti (per
+    tabella: 'main', più categorie e produttori ricavati dai prodotti per i fornitori
+    che non hanno file propri) e il numero di righe, così i dati non transitano dal
+    processo principale.
+    """
+    normalize, types = (normalize_products, COLUMN_TYPES) if kind == 'products' else (normalize_reference, REFERENCE_TYPES)
+    inline = kind == 'products' and not supplier.reference_files
+    rows = 0
+    parts = _ArrowParts(out_path)
+    try:
+        reader = pd.read_csv(path, dtype=str, chunksize=chunksize, **supplier.read_options(kind))
+        for chunk in reader:
+            chunk = supplier.rename(chunk, kind)
+            if inline:
+                chunk, references = supplier.inline_references(chunk)
+                for name, table in references.items():
+                    parts.write(name, normalize_reference(table), REFERENCE_TYPES)
+            parts.write('main', normalize(chunk), types)
+            rows += len(chunk)
+    finally:
+        parts.close()
+    return parts.paths, rows
+
+
+class _PeakMemory:
+    """Campiona la memoria residente del processo durante l'importazione."""
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.peak = self._rss()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    @staticmethod
+    def _rss():
+        try:
+            with open('/proc/self/statm') as f:
+                return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        except (OSError, ValueError, AttributeError):
+            import resource
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, self._rss())
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self._rss())
+
+
+def _children_peak_bytes():
+    try:
+        import resource
+        return resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * 1024
+    except ImportError:
+        return 0
+
+
+def _collect(parts, kind, paths):
+    """Assegna alle tabelle i file scritti da un worker."""
+    for name, path in paths.items():
+        parts[kind if name == 'main' else name].append(path)
+
+
+def _concat_parts(paths, kind):
+    """Unisce i file Arrow scritti dai worker in un unico DataFrame."""
+    tables = [pa.ipc.open_file(pa.OSFile(path)).read_all() for path in paths]
+    if not tables:
+        columns = PRODUCT_COLUMNS if kind == 'products' else REFERENCE_COLUMNS
+        return pd.DataFrame(columns=columns)
+    table = pa.concat_tables(tables, promote_options='default')
+    del tables
+    return table.to_pandas(split_blocks=True, self_destruct=True)
+
+
+@traced("ingest_files", rows_out=lambda result: result[3]["rows"])
+def ingest_files(product_files, category_files, manufacturer_files, progress=None, workers=None, chunksize=CHUNK_SIZE,
+                 supplier=BIGBUY):
+    """Importa i file di un catalogo in parallelo e a blocchi, con memoria limitata.
+
+    Ogni file viene letto a blocchi di `chunksize` righe da un processo del pool, che lo
+    traduce nello schema normalizzato con l'adattatore del fornitore (utils.suppliers),
+    normalizza i tipi e scrive i blocchi in un file Arrow temporaneo; il processo
+    principale li unisce in un unico DataFrame. `progress`, se indicato, viene chiamata
+    con (file completati, file totali, righe lette).
+
+    Restituisce prodotti, categorie, produttori e un riepilogo con righe, tempo e picco
+    di memoria.
+    """
+    jobs = [(path, 'products') for path in product_files]
+    jobs += [(path, 'categories') for path in category_files]
+    jobs += [(path, 'manufacturers') for path in manufacturer_files]
+
+    total_bytes = sum(os.path.getsize(path) for path, _ in jobs)
+    if workers is None:
+        workers = 1 if total_bytes < PARALLEL_MIN_BYTES else min(len(jobs), os.cpu_count() or 1)
+
+    spool_dir = tempfile.mkdtemp(prefix='ingest_')
+    parts = {'products': [], 'categories': [], 'manufacturers': []}
+    rows = 0
+    start = time.perf_counter()
+    try:
+        with _PeakMemory() as memory:
+            tasks = [(path, kind, os.path.join(spool_dir, f"{i:05d}_{kind}.arrow"), chunksize, supplier)
+                     for i, (path, kind) in enumerate(jobs)]
+            done = 0
+            if workers > 1:
+                context = multiprocessing.get_context('spawn')
+                with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+                    futures = {pool.submit(_ingest_file, *task): task for task in tasks}
+                    for future in as_completed(futures):
+                        paths, n = future.result()
+                        _collect(parts, futures[future][1], paths)
+                        done += 1
+                        rows += n
+                        if progress:
+                            progress(done, len(tasks), rows)
+            else:
+                for task in tasks:
+                    paths, n = _ingest_file(*task)
+                    _collect(parts, task[1], paths)
+                    done += 1
+                    rows += n
+                    if progress:
+                        progress(done, len(tasks), rows)
+
+            # L'ordine dei file caricati viene mantenuto
+            products, categories, manufacturers = (_concat_parts(sorted(parts[kind]), kind) for kind in parts)
+            if not supplier.reference_files:
+                # Ricavate blocco per blocco dai prodotti: ogni ID compare più volte
+                categories = categories.drop_duplicates('ID').reset_index(drop=True)
+                manufacturers = manufacturers.drop_duplicates('ID').reset_index(drop=True)
+    finally:
+        shutil.rmtree(spool_dir, ignore_errors=True)
+
+    report = {
+        'files': len(jobs),
+        'rows': rows,
+        'workers': workers,
+        'seconds': time.perf_counter() - start,
+        'peak_memory_bytes': memory.peak,
+        'worker_peak_memory_bytes': _children_peak_bytes() if workers > 1 else 0,
+    }
+    return products, categories, manufacturers, report
@@ -0,0 +1,216 @@
+import threading
+import time
+
+import pandas as pd
+
+from utils.sqlite_pool import ConnectionPool
+
+# Database del registro delle fatture
+LEDGER_DB = "utils/invoice_ledger.db"
+
+# Fatture per pagina nell'elenco
+INVOICE_PAGE_SIZE = 25
+
+# Colonne per cui si può ordinare l'elenco delle fatture
+INVOICE_SORT_COLUMNS = ("issued_on", "customer", "customer_type", "total")
+
+# Colonne dell'elenco delle fatture (le righe si leggono a parte con invoice_lines)
+INVOICE_COLUMNS = "id, issued_on, customer_type, customer, address, phone, email, total"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS invoices (
+    id TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    issued_on TEXT NOT NULL,
+    customer TEXT NOT NULL,
+    customer_type TEXT,
+    address TEXT,
+    phone TEXT,
+    email TEXT,
+    total REAL NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS invoices_owner_date ON invoices (owner, issued_on);
+CREATE INDEX IF NOT EXISTS invoices_owner_customer ON invoices (owner, customer);
+CREATE INDEX IF NOT EXISTS invoices_owner_total ON invoices (owner, total);
+
+CREATE TABLE IF NOT EXISTS invoice_lines (
+    invoice_id TEXT NOT NULL REFERENCES invoices(id),
+    line_no INTEGER NOT NULL,
+    product_id TEXT,
+    name TEXT,
+    quantity INTEGER NOT NULL,
+    price REAL,
+    PRIMARY KEY (invoice_id, line_no)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS monthly_totals (
+    owner TEXT NOT NULL,
+    month TEXT NOT NULL,
+    invoices INTEGER NOT NULL,
+    revenue REAL NOT NULL,
+    PRIMARY KEY (owner, month)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS customer_totals (
+    owner TEXT NOT NULL,
+    customer TEXT NOT NULL,
+    invoices INTEGER NOT NULL,
+    revenue REAL NOT NULL,
+    last_invoice TEXT NOT NULL,
+    PRIMARY KEY (owner, customer)
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS invoices_no_update BEFORE UPDATE ON invoices
+BEGIN SELECT RAISE(ABORT, 'il registro delle fatture è in sola aggiunta'); END;
+CREATE TRIGGER IF NOT EXISTS invoices_no_delete BEFORE DELETE ON invoices
+BEGIN SELECT RAISE(ABORT, 'il registro delle fatture è in sola aggiunta'); END;
+"""
+
+
+def _lines(invoice):
+    """Righe di una fattura; quelle salvate prima delle righe per ID hanno solo i nomi."""
+    if invoice.get("Righe"):
+        names = invoice.get("Prodotti") or []
+        if len(names) != len(invoice["Righe"]):
+            names = [None] * len(invoice["Righe"])
+        return [
+            (line.get("ID"), name, int(line.get("Quantità", 1)), line.get("Prezzo (€)"))
+            for line, name in zip(invoice["Righe"], names)
+        ]
+    return [(None, name, 1, None) for name in invoice.get("Prodotti") or []]
+
+
+class InvoiceLedger:
+    """Registro delle fatture in sola aggiunta, con riepiloghi aggiornati a ogni fattura.
+
+    Ogni nuova fattura, nella stessa transazione, aggiorna una riga del totale del mese
+    e una del totale del cliente: il costo per fattura è costante e la dashboard legge i
+    riepiloghi senza scorrere le fatture.
+    """
+
+    def __init__(self, path=LEDGER_DB):
+        self.path = path
+        self._db = ConnectionPool(path, SCHEMA)
+
+    def append(self, owner, invoice):
+        """Registra una fattura (nel formato della pagina Finanze); False se era già presente."""
+        issued_on = invoice.get("Data") or time.strftime("%Y-%m-%d")
+        customer = invoice.get("Nome") or ""
+        total = float(invoice.get("Totale (€)") or 0)
+        with self._db.transaction() as conn:
+            inserted = conn.execute(
+                "INSERT OR IGNORE INTO invoices (id, owner, issued_on, customer, customer_type, address, phone, email, total, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (invoice["ID"], owner, issued_on, customer, invoice.get("Tipo Cliente"), invoice.get("Indirizzo"),
+                 invoice.get("Telefono"), invoice.get("Email"), total, time.time()),
+            ).rowcount
+            if not inserted:
+                return False
+            conn.executemany(
+                "INSERT INTO invoice_lines (invoice_id, line_no, product_id, name, quantity, price) VALUES (?, ?, ?, ?, ?, ?)",
+                [(invoice["ID"], line_no, *line) for line_no, line in enumerate(_lines(invoice))],
+            )
+            conn.execute(
+                "INSERT INTO monthly_totals (owner, month, invoices, revenue) VALUES (?, ?, 1, ?) "
+                "ON CONFLICT(owner, month) DO UPDATE SET invoices = invoices + 1, revenue = revenue + excluded.revenue",
+                (owner, issued_on[:7], total),
+            )
+            conn.execute(
+                "INSERT INTO customer_totals (owner, customer, invoices, revenue, last_invoice) VALUES (?, ?, 1, ?, ?) "
+                "ON CONFLICT(owner, customer) DO UPDATE SET invoices = invoices + 1, revenue = revenue + excluded.revenue, "
+                "last_invoice = max(last_invoice, excluded.last_invoice)",
+                (owner, customer, total, issued_on),
+            )
+        return True
+
+    def import_invoices(self, owner, invoices):
+        """Importa fatture salvate in precedenza (quelle già presenti vengono ignorate)."""
+        return sum(self.append(owner, invoice) for invoice in invoices)
+
+    def monthly_totals(self, owner):
+        """Numero di fatture ed entrate per mese (AAAA-MM)."""
+        with self._db.connection() as conn:
+            return pd.read_sql_query(
+                "SELECT month, invoices, revenue FROM monthly_totals WHERE owner = ? ORDER BY month",
+                conn, params=(owner,),
+            )
+
+    def customer_totals(self, owner, limit=10):
+        """Clienti con le entrate maggiori."""
+        with self._db.connection() as conn:
+            return pd.read_sql_query(
+                "SELECT customer, invoices, revenue, last_invoice FROM customer_totals WHERE owner = ? "
+                "ORDER BY revenue DESC LIMIT ?",
+                conn, params=(owner, limit),
+            )
+
+    @staticmethod
+    def _invoice_filter(owner, date_from=None, date_to=None, customer=None, min_total=None, max_total=None):
+        conditions, params = ["owner = ?"], [owner]
+        if date_from:
+            conditions.append("issued_on >= ?")
+            params.append(str(date_from))
+        if date_to:
+            conditions.append("issued_on <= ?")
+            params.append(str(date_to))
+        if customer:
+            escaped = customer.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            conditions.append("customer LIKE ? ESCAPE '\\'")
+            params.append(f"%{escaped}%")
+        if min_total is not None:
+            conditions.append("total >= ?")
+            params.append(float(min_total))
+        if max_total is not None:
+            conditions.append("total <= ?")
+            params.append(float(max_total))
+        return " AND ".join(conditions), params
+
+    def count_invoices(self, owner, **filters):
+        """Numero di fatture che soddisfano i filtri di query_invoices."""
+        where, params = self._invoice_filter(owner, **filters)
+        with self._db.connection() as conn:
+            return conn.execute(f"SELECT COUNT(*) FROM invoices WHERE {where}", params).fetchone()[0]
+
+    def query_invoices(self, owner, sort="issued_on", descending=True, page=0, page_size=INVOICE_PAGE_SIZE, **filters):
+        """Una pagina di fatture, filtrata e ordinata dal database.
+
+        Filtri: date_from/date_to (date o stringhe ISO, estremi inclusi), customer
+        (sottostringa, senza distinzione tra maiuscole e minuscole), min_total/max_total.
+        Viene letta solo la pagina richiesta (page parte da 0).
+        """
+        if sort not in INVOICE_SORT_COLUMNS:
+            raise ValueError(f"Colonna di ordinamento non valida: {sort}")
+        where, params = self._invoice_filter(owner, **filters)
+        direction = "DESC" if descending else "ASC"
+        with self._db.connection() as conn:
+            return pd.read_sql_query(
+                f"SELECT {INVOICE_COLUMNS} FROM invoices WHERE {where} "
+                f"ORDER BY {sort} {direction}, created_at {direction} LIMIT ? OFFSET ?",
+                conn, params=(*params, page_size, page * page_size),
+            )
+
+    def invoice_lines(self, invoice_id):
+        """Righe di una fattura."""
+        with self._db.connection() as conn:
+            return pd.read_sql_query(
+                "SELECT product_id, name, quantity, price FROM invoice_lines WHERE invoice_id = ? ORDER BY line_no",
+                conn, params=(invoice_id,),
+            )
+
+    def close(self):
+        self._db.close()
+
+
+_ledger = None
+_ledger_lock = threading.Lock()
+
+
+def get_invoice_ledger():
+    """Registro delle fatture condiviso dal processo, aperto al primo utilizzo."""
+    global _ledger
+    if _ledger is None:
+        with _ledger_lock:
+            if _ledger is None:
+                _ledger = InvoiceLedger()
+    return _ledger
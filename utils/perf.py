@@ -0,0 +1,283 @@
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+from collections import deque
+
+# Registrazione dei tempi: "" spenta, "1" attiva, "memory" attiva con le allocazioni (tracemalloc)
+PERF_TRACE = os.environ.get("PERF_TRACE", "")
+
+# File JSON-lines con un record per rerun (vuoto: solo in memoria)
+PERF_LOG = os.environ.get("PERF_LOG", "")
+
+# Rerun conservati in memoria per la pagina delle prestazioni
+PERF_HISTORY = 500
+
+
+def _rss():
+    """Memoria residente del processo (byte), None se non disponibile."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+def _session_key():
+    # La sessione Streamlit del thread, se c'è: un rerun interrotto si chiude al successivo
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+    except ImportError:
+        return threading.get_ident()
+    ctx = get_script_run_ctx(suppress_warning=True)
+    return ctx.session_id if ctx is not None else threading.get_ident()
+
+
+class _NullStage:
+    """Fase usata a registrazione spenta: non misura nulla."""
+
+    rows_in = rows_out = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    """Una fase misurata: tempo, righe in ingresso e in uscita, memoria."""
+
+    __slots__ = ("rerun", "name", "rows_in", "rows_out", "_start", "_rss", "_traced", "peak")
+
+    def __init__(self, rerun, name, rows_in=None):
+        self.rerun = rerun
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.peak = 0
+
+    def __enter__(self):
+        self._rss = _rss()
+        self._traced = None
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            stack = self.rerun["_stack"]
+            if stack:
+                # Il picco della fase esterna fino a qui, prima di azzerarlo per questa
+                stack[-1].peak = max(stack[-1].peak, peak - stack[-1]._traced)
+            tracemalloc.reset_peak()
+            self._traced = current
+        self.rerun["_stack"].append(self)
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self._start
+        stack = self.rerun["_stack"]
+        stack.pop()
+        allocated = None
+        if self._traced is not None and tracemalloc.is_tracing():
+            self.peak = allocated = max(self.peak, tracemalloc.get_traced_memory()[1] - self._traced)
+            if stack and stack[-1]._traced is not None:
+                stack[-1].peak = max(stack[-1].peak, allocated + self._traced - stack[-1]._traced)
+        rss = _rss()
+        self.rerun["_last"] = time.perf_counter()
+        self.rerun["stages"].append({
+            "name": self.name,
+            "seconds": round(seconds, 6),
+            "rows_in": self.rows_in,
+            "rows_out": self.rows_out,
+            "rss_delta_bytes": rss - self._rss if rss is not None and self._rss is not None else None,
+            "allocated_bytes": allocated,
+            "depth": len(stack),
+        })
+        return False
+
+
+class PerfTracer:
+    """Tempi delle fasi di ogni rerun, in un buffer circolare e (opzionale) in un file JSON-lines.
+
+    Una pagina apre il rerun con start_rerun e lo chiude con finish_rerun; le fasi misurate
+    nel frattempo dallo stesso thread (stage, traced) finiscono nel rerun. Un rerun
+    interrotto (st.stop, st.rerun, eccezione) viene chiuso dal rerun successivo della stessa
+    sessione, con la durata fino all'ultima fase. Con la registrazione spenta le fasi non
+    misurano nulla. Le allocazioni (tracemalloc) sono globali al processo: con più sessioni
+    attive contengono anche quelle delle altre.
+    """
+
+    def __init__(self, mode=PERF_TRACE, log_path=PERF_LOG, history=PERF_HISTORY):
+        self.log_path = log_path or None
+        self._reruns = deque(maxlen=history)
+        self._open = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.enabled = False
+        self.configure(mode)
+
+    def configure(self, mode):
+        """Attiva ("1"), attiva con le allocazioni ("memory") o spegne ("") la registrazione."""
+        self.enabled = bool(mode)
+        if mode == "memory" and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        elif mode != "memory" and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    @property
+    def mode(self):
+        if not self.enabled:
+            return ""
+        return "memory" if tracemalloc.is_tracing() else "1"
+
+    def _current(self):
+        return getattr(self._local, "rerun", None)
+
+    def start_rerun(self, page, user=None):
+        """Apre il rerun di una pagina per il thread corrente."""
+        if not self.enabled:
+            return
+        key = _session_key()
+        with self._lock:
+            stale = self._open.pop(key, None)
+        if stale is not None:
+            self._close(stale, complete=False)
+        rerun = {"page": page, "user": user, "started_at": time.time(), "stages": [], "_stack": [],
+                 "_key": key}
+        rerun["_start"] = rerun["_last"] = time.perf_counter()
+        with self._lock:
+            self._open[key] = rerun
+        self._local.rerun = rerun
+
+    def finish_rerun(self):
+        """Chiude il rerun del thread corrente (se la registrazione era attiva)."""
+        rerun = self._current()
+        self._local.rerun = None
+        if rerun is None:
+            return
+        with self._lock:
+            if self._open.get(rerun["_key"]) is rerun:
+                del self._open[rerun["_key"]]
+        self._close(rerun, complete=True)
+
+    def _close(self, rerun, complete):
+        # Un rerun interrotto dura fino alla fine dell'ultima fase registrata
+        end = time.perf_counter() if complete else rerun["_last"]
+        seconds = end - rerun["_start"]
+        record = {key: value for key, value in rerun.items() if not key.startswith("_")}
+        record["seconds"] = round(seconds, 6)
+        record["complete"] = complete
+        with self._lock:
+            self._reruns.append(record)
+            if self.log_path:
+                with open(self.log_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def stage(self, name, rows_in=None):
+        """Context manager che misura una fase del rerun corrente.
+
+        Il valore restituito accetta rows_out (e rows_in) da impostare nel blocco.
+        """
+        if not self.enabled:
+            return _NULL_STAGE
+        rerun = self._current()
+        if rerun is None:
+            return _NULL_STAGE
+        return _Stage(rerun, name, rows_in)
+
+    def reruns(self):
+        """Rerun registrati, dal più vecchio."""
+        with self._lock:
+            return list(self._reruns)
+
+    def clear(self):
+        with self._lock:
+            self._reruns.clear()
+
+
+def percentile(values, q):
+    """Percentile q (0-100) per rango più vicino di una lista ordinata."""
+    if not values:
+        return None
+    rank = max(1, -(-len(values) * q // 100))
+    return values[int(rank) - 1]
+
+
+def stage_summary(reruns):
+    """Per ogni fase: numero di esecuzioni, p50, p95 e massimo dei tempi, righe medie."""
+    groups = {}
+    for rerun in reruns:
+        for stage in rerun["stages"]:
+            groups.setdefault(stage["name"], []).append(stage)
+    summary = []
+    for name, stages in groups.items():
+        seconds = sorted(stage["seconds"] for stage in stages)
+        rows_out = [stage["rows_out"] for stage in stages if stage["rows_out"] is not None]
+        allocated = [stage["allocated_bytes"] for stage in stages if stage["allocated_bytes"] is not None]
+        summary.append({
+            "stage": name,
+            "count": len(stages),
+            "p50_ms": percentile(seconds, 50) * 1000,
+            "p95_ms": percentile(seconds, 95) * 1000,
+            "max_ms": seconds[-1] * 1000,
+            "total_ms": sum(seconds) * 1000,
+            "rows_out": sum(rows_out) / len(rows_out) if rows_out else None,
+            "allocated_mb": max(allocated) / 2**20 if allocated else None,
+        })
+    return sorted(summary, key=lambda row: row["p95_ms"], reverse=True)
+
+
+def slowest_reruns(reruns, limit=10):
+    """I rerun più lenti, dal più lento."""
+    return sorted(reruns, key=lambda rerun: rerun["seconds"], reverse=True)[:limit]
+
+
+_tracer = None
+_tracer_lock = threading.Lock()
+
+
+def get_perf_tracer():
+    """Registro dei tempi condiviso da tutte le sessioni del processo."""
+    global _tracer
+    if _tracer is None:
+        with _tracer_lock:
+            if _tracer is None:
+                _tracer = PerfTracer()
+    return _tracer
+
+
+def start_rerun(page, user=None):
+    get_perf_tracer().start_rerun(page, user)
+
+
+def finish_rerun():
+    get_perf_tracer().finish_rerun()
+
+
+def stage(name, rows_in=None):
+    return get_perf_tracer().stage(name, rows_in)
+
+
+def traced(name, rows_in=None, rows_out=None):
+    """Decoratore che misura ogni chiamata come fase del rerun corrente.
+
+    rows_in riceve gli argomenti della chiamata e rows_out il risultato; entrambi
+    restituiscono il numero di righe da registrare.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            tracer = get_perf_tracer()
+            if not tracer.enabled:
+                return fn(*args, **kwargs)
+            with tracer.stage(name, rows_in(*args, **kwargs) if rows_in else None) as measured:
+                result = fn(*args, **kwargs)
+                if rows_out is not None:
+                    measured.rows_out = rows_out(result)
+            return result
+        return wrapper
+    return decorator
@@ -0,0 +1,255 @@
+import hashlib
+import threading
+
+import numpy as np
+import pandas as pd
+
+from utils.suppliers import DEFAULT_SUPPLIER
+
+# Similarità minima (Jaccard sulle parole del nome) per unire due prodotti senza EAN13
+NAME_SIMILARITY_THRESHOLD = 0.75
+
+# Parole più lunghe del nome che formano la chiave di blocco: si confrontano solo i
+# prodotti con la stessa chiave, mai tutte le coppie
+BLOCK_TOKENS = 2
+
+# Blocchi più grandi di così non vengono confrontati (nomi troppo generici)
+MAX_BLOCK_SIZE = 64
+
+# Parole più corte di così non contano nel confronto dei nomi (le cifre singole sì:
+# "Tavolo 3" e "Tavolo 7" sono articoli diversi)
+MIN_TOKEN_LENGTH = 1
+
+# Moltiplicatore per combinare gli hash delle parole nella chiave di blocco
+_BLOCK_HASH_PRIME = np.uint64(1_000_003)
+
+
+def name_tokens(names):
+    """Parole distinte di ogni nome (minuscole, senza accenti né punteggiatura), come hash.
+
+    Restituisce un DataFrame con la posizione del nome (row), l'hash della parola e la
+    sua lunghezza.
+    """
+    text = pd.Series(np.asarray(names, dtype=object)).astype(str).str.lower().str.normalize('NFKD')
+    tokens = text.str.replace(r'[^a-z0-9]+', ' ', regex=True).str.split().explode().dropna()
+    tokens = tokens[tokens.str.len() >= MIN_TOKEN_LENGTH]
+    values = tokens.to_numpy(dtype=object)
+    frame = pd.DataFrame({
+        'row': tokens.index.to_numpy(dtype=np.int64),
+        'hash': pd.util.hash_array(values),
+        'length': tokens.str.len().to_numpy(dtype=np.int64),
+    })
+    return frame.drop_duplicates(['row', 'hash'], ignore_index=True)
+
+
+def block_keys(tokens, size):
+    """Chiave di blocco di ogni nome: le BLOCK_TOKENS parole più lunghe (0 se non ce ne sono)."""
+    ordered = tokens.sort_values(['row', 'length', 'hash'], ascending=[True, False, True], kind='stable')
+    rank = ordered.groupby('row').cumcount().to_numpy()
+    keys = np.zeros(size, dtype=np.uint64)
+    for k in range(BLOCK_TOKENS):
+        top = ordered[rank == k]
+        rows = top['row'].to_numpy()
+        keys[rows] = keys[rows] * _BLOCK_HASH_PRIME ^ top['hash'].to_numpy(dtype=np.uint64)
+    return keys
+
+
+def _components(size, left, right):
+    """Componenti connesse del grafo con archi (left[i], right[i]): etichetta minima per nodo."""
+    parent = np.arange(size)
+    if len(left) == 0:
+        return parent
+    while True:
+        pl, pr = parent[left], parent[right]
+        low = np.minimum(pl, pr)
+        updated = parent.copy()
+        np.minimum.at(updated, pl, low)
+        np.minimum.at(updated, pr, low)
+        updated = updated[updated]
+        if np.array_equal(updated, parent):
+            break
+        parent = updated
+    while not np.array_equal(parent[parent], parent):
+        parent = parent[parent]
+    return parent
+
+
+class ProductMatcher:
+    """Riconosce lo stesso prodotto nei cataloghi di fornitori diversi e ne confronta i prezzi.
+
+    I prodotti si uniscono per EAN13 (hash join sul codice numerico); quelli senza EAN13
+    vengono confrontati per nome solo con i prodotti degli altri fornitori nello stesso
+    blocco. Le parole dei nomi e le chiavi di blocco sono calcolate per fornitore e
+    riutilizzate finché i prodotti di quel fornitore non cambiano, così un nuovo feed
+    ricalcola solo la propria parte.
+    """
+
+    def __init__(self):
+        self._prepared = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _fingerprint(rows):
+        """Impronta di ID e nomi: per le colonne Arrow si leggono direttamente i buffer."""
+        digest = hashlib.blake2b(str(len(rows)).encode(), digest_size=16)
+        for col in ('ID', 'NAME'):
+            values = rows[col].array
+            if hasattr(values, '__arrow_array__'):
+                array = values.__arrow_array__()
+                for chunk in getattr(array, 'chunks', [array]):
+                    for buffer in chunk.buffers():
+                        if buffer is not None:
+                            digest.update(buffer)
+            else:
+                digest.update(pd.util.hash_pandas_object(rows[col], index=False).to_numpy().tobytes())
+        return digest.hexdigest()
+
+    def _prepare(self, supplier, rows):
+        """Parole e chiavi di blocco dei prodotti di un fornitore (in cache per contenuto)."""
+        fingerprint = self._fingerprint(rows)
+        with self._lock:
+            cached = self._prepared.get(supplier)
+        if cached is not None and cached[0] == fingerprint:
+            return cached[1]
+        tokens = name_tokens(rows['NAME'])
+        prepared = {'tokens': tokens, 'blocks': block_keys(tokens, len(rows))}
+        with self._lock:
+            self._prepared[supplier] = (fingerprint, prepared)
+        return prepared
+
+    def match(self, products):
+        """Gruppo di ogni prodotto (stesso gruppo = stesso articolo) e come è stato unito.
+
+        Restituisce tre array allineati alle righe: il gruppo (0..n-1), il codice del
+        fornitore e True per le righe unite a un altro fornitore tramite il nome; più i
+        nomi dei fornitori.
+        """
+        size = len(products)
+        codes, names = self._suppliers(products)
+        ean = products['EAN13'].to_numpy(dtype=np.uint64) if 'EAN13' in products else np.zeros(size, dtype=np.uint64)
+
+        # Parole e blocchi, per fornitore, riportati alle posizioni del catalogo
+        blocks = np.zeros(size, dtype=np.uint64)
+        token_parts = []
+        for code, supplier in enumerate(names):
+            positions = np.flatnonzero(codes == code)
+            prepared = self._prepare(supplier, products.iloc[positions])
+            blocks[positions] = prepared['blocks']
+            tokens = prepared['tokens']
+            token_parts.append(pd.DataFrame({'row': positions[tokens['row'].to_numpy()], 'hash': tokens['hash'].to_numpy()}))
+        tokens = pd.concat(token_parts, ignore_index=True) if token_parts else pd.DataFrame({'row': [], 'hash': []})
+
+        # Gruppi iniziali: stesso EAN13 oppure il solo prodotto
+        has_ean = ean > 0
+        groups = np.arange(size, dtype=np.int64)
+        ean_groups, _ = pd.factorize(ean[has_ean])
+        groups[has_ean] = size + ean_groups
+
+        # Prodotti senza EAN13: coppie con altri fornitori nello stesso blocco che condividono parole
+        orphans = ~has_ean & (blocks > 0)
+        block_sizes = pd.Series(blocks).map(pd.Series(blocks).value_counts()).to_numpy()
+        candidates = (blocks > 0) & (block_sizes <= MAX_BLOCK_SIZE) & np.isin(blocks, blocks[orphans])
+        by_name = np.zeros(size, dtype=bool)
+        if orphans.any() and candidates.any():
+            token_rows = tokens['row'].to_numpy(dtype=np.int64)
+            counts = np.bincount(token_rows, minlength=size)
+            keyed = tokens.assign(block=blocks[token_rows])[candidates[token_rows]]
+            left = keyed[orphans[keyed['row'].to_numpy(dtype=np.int64)]]
+            right = keyed
+            pairs = left.merge(right, on=['block', 'hash'], suffixes=('_a', '_b'))
+            pairs = pairs[codes[pairs['row_a'].to_numpy()] != codes[pairs['row_b'].to_numpy()]]
+            shared = pairs.groupby(['row_a', 'row_b'], sort=False).size().rename('shared').reset_index()
+            a, b = shared['row_a'].to_numpy(), shared['row_b'].to_numpy()
+            similarity = shared['shared'].to_numpy() / (counts[a] + counts[b] - shared['shared'].to_numpy())
+            shared = shared.assign(similarity=similarity)[similarity >= NAME_SIMILARITY_THRESHOLD]
+            # Per ogni prodotto senza EAN13 conta solo il più simile di ciascun altro fornitore
+            shared = shared.assign(supplier_b=codes[shared['row_b'].to_numpy()])
+            shared = shared.sort_values('similarity', ascending=False, kind='stable').drop_duplicates(['row_a', 'supplier_b'])
+            a, b = shared['row_a'].to_numpy(), shared['row_b'].to_numpy()
+            labels, group_codes = pd.factorize(groups)
+            groups = _components(len(group_codes), labels[a], labels[b])[labels]
+            by_name[a] = True
+            by_name[b] = True
+        groups, _ = pd.factorize(groups)
+        return groups, codes, by_name, names
+
+    @staticmethod
+    def _suppliers(products):
+        """Codice del fornitore di ogni riga e nomi dei fornitori (SUPPLIER mancante = BigBuy)."""
+        if 'SUPPLIER' not in products:
+            return np.zeros(len(products), dtype=np.int64), [DEFAULT_SUPPLIER]
+        supplier = products['SUPPLIER']
+        if not isinstance(supplier.dtype, pd.CategoricalDtype):
+            supplier = supplier.astype('category')
+        names = supplier.cat.categories.astype(object).tolist()
+        codes = supplier.cat.codes.to_numpy(dtype=np.int64)
+        if (codes < 0).any():
+            if DEFAULT_SUPPLIER not in names:
+                names.append(DEFAULT_SUPPLIER)
+            codes = np.where(codes < 0, names.index(DEFAULT_SUPPLIER), codes)
+        return codes, names
+
+    def compare(self, products):
+        """Tabella unificata: un articolo per riga, con ID, prezzo e stock di ogni fornitore.
+
+        Per ogni articolo indica il fornitore più conveniente (PRICE minore), il numero di
+        fornitori e come è stato riconosciuto (EAN13 o nome). Gli articoli offerti da più
+        fornitori vengono per primi.
+        """
+        groups, codes, by_name, names = self.match(products)
+        size, count = len(products), int(groups.max()) + 1 if len(groups) else 0
+        ean = products['EAN13'].to_numpy(dtype=np.uint64) if 'EAN13' in products else np.zeros(size, dtype=np.uint64)
+        price = pd.to_numeric(products['PRICE'], errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+        stock = pd.to_numeric(products['STOCK'], errors='coerce').fillna(0).to_numpy(dtype=np.int64) \
+            if 'STOCK' in products else np.zeros(size, dtype=np.int64)
+
+        # Offerte ordinate per articolo, poi per prezzo (i mancanti in fondo) e stock
+        order = np.lexsort((-stock, np.where(np.isnan(price), np.inf, price), groups))
+        # Un'offerta per fornitore e articolo: la più economica
+        _, first = np.unique((groups * len(names) + codes)[order], return_index=True)
+        offers = order[np.sort(first)]
+        # La prima offerta di ogni articolo è la migliore
+        _, first = np.unique(groups[offers], return_index=True)
+        best = offers[first]
+        # EAN13 e nome di riferimento: quelli di un prodotto con EAN13, se c'è
+        reference = np.lexsort((ean == 0, groups))
+        _, first = np.unique(groups[reference], return_index=True)
+        reference = reference[first]
+
+        suppliers = np.bincount(groups[offers], minlength=count)
+        table = pd.DataFrame({
+            'NAME': products['NAME'].iloc[reference].reset_index(drop=True),
+            'EAN13': ean[reference],
+            'SUPPLIERS': suppliers,
+            'MATCH': np.where(suppliers < 2, '', np.where(np.bincount(groups, weights=by_name, minlength=count) > 0, 'Nome', 'EAN13')),
+            'BEST_SUPPLIER': pd.Categorical.from_codes(codes[best], categories=names),
+            'BEST_PRICE': price[best],
+        })
+        ids = products['ID']
+        for code, supplier in enumerate(names):
+            rows = offers[codes[offers] == code]
+            at = groups[rows]
+            supplier_ids = pd.Series(pd.NA, index=range(count), dtype=ids.dtype)
+            supplier_ids.iloc[at] = ids.iloc[rows].to_numpy()
+            supplier_price = np.full(count, np.nan)
+            supplier_price[at] = price[rows]
+            supplier_stock = np.zeros(count, dtype=np.int64)
+            supplier_stock[at] = stock[rows]
+            table[f"ID_{supplier}"] = supplier_ids
+            table[f"PRICE_{supplier}"] = supplier_price
+            table[f"STOCK_{supplier}"] = supplier_stock
+        return table.iloc[np.argsort(-suppliers, kind='stable')].reset_index(drop=True)
+
+
+_matcher = None
+_matcher_lock = threading.Lock()
+
+
+def get_product_matcher():
+    """Confronto tra fornitori condiviso dal processo, con le parti già calcolate per fornitore."""
+    global _matcher
+    if _matcher is None:
+        with _matcher_lock:
+            if _matcher is None:
+                _matcher = ProductMatcher()
+    return _matcher
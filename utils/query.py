@@ -0,0 +1,164 @@
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+
+import numpy as np
+
+from utils.perf import traced
+
+# Risultati memorizzati per ciascun motore di ricerca
+RESULT_CACHE_SIZE = 128
+
+
+def parse_keywords(text):
+    """Divide il testo di un filtro in parole chiave (separate da virgola, in minuscolo)."""
+    if not text:
+        return ()
+    return tuple(kw.strip().lower() for kw in text.split(','))
+
+
+@dataclass(frozen=True)
+class CatalogQuery:
+    """Stato dei filtri della barra laterale; è immutabile e fa da firma per la cache."""
+
+    name_keywords: tuple = ()
+    description_keywords: tuple = ()
+    any_keywords: tuple = ()
+    categories: tuple = ()
+    manufacturers: tuple = ()
+    min_price: float = None
+    max_price: float = None
+    in_stock: bool = False
+
+    @classmethod
+    def from_sidebar(cls, keywords_name="", keywords_description="", keywords_combined="", categories=(),
+                     manufacturers=(), min_price=None, max_price=None, in_stock=False):
+        return cls(
+            name_keywords=parse_keywords(keywords_name),
+            description_keywords=parse_keywords(keywords_description),
+            any_keywords=parse_keywords(keywords_combined),
+            categories=tuple(sorted(categories)),
+            manufacturers=tuple(sorted(manufacturers)),
+            min_price=min_price,
+            max_price=max_price,
+            in_stock=bool(in_stock),
+        )
+
+    def refine(self, **changes):
+        """Restituisce una copia della query con i filtri indicati modificati."""
+        for key in ('categories', 'manufacturers'):
+            if key in changes:
+                changes[key] = tuple(sorted(changes[key]))
+        return replace(self, **changes)
+
+
+class LRUCache:
+    """Cache LRU thread-safe di dimensione fissa."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+
+class QueryEngine:
+    """Valuta una CatalogQuery come un'unica selezione di righe, senza copie del catalogo.
+
+    I filtri risolti dagli indici (parole chiave e categorie) producono liste di righe che
+    vengono intersecate dalla più corta; i filtri sulle colonne (produttore, stock, prezzo)
+    si applicano poi solo ai candidati, in ordine di selettività stimata. I risultati sono
+    memorizzati per (versione del catalogo, query).
+    """
+
+    def __init__(self, products, text_index, category_index, version, cache_size=RESULT_CACHE_SIZE):
+        self.version = version
+        self.size = len(products)
+        self.text_index = text_index
+        self.category_index = category_index
+        self._price_dtype = products['PRICE'].dtype if products['PRICE'].dtype == np.float32 else np.float64
+        self._price = products['PRICE'].to_numpy(dtype=np.float64, na_value=np.nan)
+        self._sorted_price = np.sort(self._price)
+        self._in_stock = products['STOCK'].to_numpy(dtype=np.float64, na_value=np.nan) > 0
+        self._in_stock_count = int(self._in_stock.sum())
+        codes = category_index.manufacturer_codes
+        self._manufacturer_totals = np.bincount(codes[codes >= 0], minlength=len(category_index.manufacturers))
+        self._cache = LRUCache(cache_size)
+
+    def _index_predicates(self, query):
+        """Liste di righe dei filtri risolti dagli indici."""
+        rows = []
+        if query.name_keywords:
+            rows.append(self.text_index.match_all('NAME', query.name_keywords))
+        if query.description_keywords:
+            rows.append(self.text_index.match_all('DESCRIPTION', query.description_keywords))
+        if query.any_keywords:
+            rows.append(self.text_index.match_any(query.any_keywords))
+        if query.categories:
+            rows.append(self.category_index.rows_in_any(query.categories))
+        return rows
+
+    def _column_predicates(self, query):
+        """Filtri sulle colonne con il numero stimato di righe che li soddisfano."""
+        predicates = []
+        if query.manufacturers:
+            wanted = self.category_index.manufacturers.get_indexer(list(query.manufacturers))
+            wanted = wanted[wanted >= 0]
+            codes = self.category_index.manufacturer_codes
+            estimate = int(self._manufacturer_totals[wanted].sum())
+            predicates.append((estimate, lambda rows: np.isin(codes[rows], wanted)))
+        if query.in_stock:
+            predicates.append((self._in_stock_count, lambda rows: self._in_stock[rows]))
+        if query.min_price is not None or query.max_price is not None:
+            # Limiti arrotondati alla precisione della colonna (float32 nello schema compatto)
+            low = -np.inf if query.min_price is None else float(np.asarray(query.min_price, dtype=self._price_dtype))
+            high = np.inf if query.max_price is None else float(np.asarray(query.max_price, dtype=self._price_dtype))
+            estimate = int(np.searchsorted(self._sorted_price, high, side='right') - np.searchsorted(self._sorted_price, low))
+            predicates.append((estimate, lambda rows: (self._price[rows] >= low) & (self._price[rows] <= high)))
+        return sorted(predicates, key=lambda item: item[0])
+
+    @traced("filtri", rows_in=lambda self, query: self.size, rows_out=len)
+    def positions(self, query):
+        """Posizioni (ordinate) delle righe del catalogo che soddisfano la query."""
+        key = (self.version, query)
+        rows = self._cache.get(key)
+        if rows is not None:
+            return rows
+
+        rows = None
+        for candidate in sorted(self._index_predicates(query), key=len):
+            rows = candidate if rows is None else np.intersect1d(rows, candidate, assume_unique=True)
+        if rows is None:
+            rows = np.arange(self.size)
+        for _, predicate in self._column_predicates(query):
+            if len(rows) == 0:
+                break
+            rows = rows[predicate(rows)]
+
+        rows = np.array(rows, dtype=np.int64)
+        rows.flags.writeable = False
+        self._cache.put(key, rows)
+        return rows
+
+    def mask(self, query):
+        """Maschera booleana delle righe che soddisfano la query."""
+        mask = np.zeros(self.size, dtype=bool)
+        mask[self.positions(query)] = True
+        return mask
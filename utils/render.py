@@ -0,0 +1,81 @@
+import math
+
+import pandas as pd
+from utils.perf import traced
+from utils.schema import decimal_values, format_ean13
+
+# Colonne mostrate nella tabella dei prodotti
+TABLE_COLUMNS = ['IMAG', 'ID', 'EAN13', 'NAME', 'DESCRIPTION', 'CATEGORY_1', 'CATEGORY_2', 'CATEGORY_3', 'Manufacturer', 'STOCK', 'PRICE']
+
+# Dimensioni di pagina selezionabili
+PAGE_SIZES = [20, 50, 100]
+
+# Parole mostrate quando la descrizione è abbreviata
+DESCRIPTION_WORDS = 8
+
+
+def page_count(total_items, page_size):
+    """Numero di pagine (almeno una, anche senza risultati)."""
+    return max(math.ceil(total_items / page_size), 1)
+
+
+def clamp_page(page, total_pages):
+    """Riporta il numero di pagina nell'intervallo valido."""
+    try:
+        page = int(page)
+    except (TypeError, ValueError):
+        page = 1
+    return min(max(page, 1), total_pages)
+
+
+def truncate_description(desc, words=DESCRIPTION_WORDS):
+    """Abbrevia una descrizione alle prime parole."""
+    if isinstance(desc, str):
+        parts = desc.split()
+        if len(parts) > words:
+            return " ".join(parts[:words]) + "..."
+    return desc
+
+
+def image_html(url):
+    """Tag HTML della miniatura di un prodotto."""
+    return f'<img src="{url}" width="50">' if pd.notnull(url) and url else ""
+
+
+@traced("build_page", rows_in=lambda products, positions, *args, **kwargs: len(positions), rows_out=len)
+def build_page(products, positions, page, page_size, show_full_description=False, html_images=True, image_urls=None):
+    """Estrae solo le righe della pagina richiesta e applica a quelle le trasformazioni di visualizzazione.
+
+    `positions` sono le posizioni delle righe filtrate in products: la selezione della
+    pagina avviene prima di qualsiasi copia, così il costo non dipende dal numero di
+    risultati. Con html_images=False la colonna IMAG contiene l'URL, per le griglie che
+    mostrano le immagini da sé. `image_urls`, se indicata, riceve gli URL delle immagini
+    della pagina e restituisce quelli da mostrare (es. le miniature in cache; None per
+    mantenere l'originale).
+    """
+    start = (page - 1) * page_size
+    rows = products.iloc[positions[start:start + page_size]]
+    columns = [col for col in TABLE_COLUMNS if col in rows.columns]
+    table = rows[columns].copy()
+
+    # Colonne di categoria assenti nei cataloghi con meno categorie per prodotto
+    for col in TABLE_COLUMNS:
+        if col not in table.columns and col != 'IMAG':
+            table[col] = None
+
+    table['EAN13'] = format_ean13(table['EAN13'])
+    table['PRICE'] = decimal_values(table['PRICE'])
+    if not show_full_description:
+        table['DESCRIPTION'] = table['DESCRIPTION'].map(truncate_description)
+    images = rows['IMAGE1'] if 'IMAGE1' in rows.columns else pd.Series(None, index=rows.index)
+    if image_urls is not None:
+        replaced = pd.Series(image_urls(images.tolist()), index=images.index, dtype=object)
+        images = replaced.where(replaced.notna(), images.astype(object))
+    table['IMAG'] = images.map(image_html) if html_images else images
+    return table[TABLE_COLUMNS]
+
+
+@traced("to_html", rows_in=len)
+def page_table_html(table):
+    """Tabella HTML della pagina."""
+    return table.to_html(escape=False, index=False)
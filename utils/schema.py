@@ -0,0 +1,110 @@
+import re
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+# Testo in buffer Arrow contigui invece che come oggetti Python (valori mancanti come NaN)
+try:
+    TEXT = pd.StringDtype("pyarrow", na_value=np.nan)
+except TypeError:
+    TEXT = pd.StringDtype("pyarrow")
+
+CATEGORY_COLUMN_PATTERN = re.compile(r'^CATEGORY_\d+$')
+
+# Schema compatto del catalogo mappato; CATEGORY_n sono categoriche come Manufacturer
+CATALOG_SCHEMA = {
+    'ID': TEXT,
+    'NAME': TEXT,
+    'DESCRIPTION': TEXT,
+    'IMAGE1': TEXT,
+    'DATE_ADD': TEXT,
+    'DATE_UPD': TEXT,
+    'CATEGORY': 'category',
+    'Manufacturer': 'category',
+    'SUPPLIER': 'category',
+    'BRAND': 'int32',
+    'PRICE': 'float32',
+    'EAN13': 'uint64',
+}
+
+# Colonne intere ridotte al tipo più piccolo che ne contiene i valori
+SMALL_INT_COLUMNS = ('STOCK',)
+
+# Liste di nomi di categoria, memorizzate come codici interi su un dizionario di nomi
+CATEGORY_LIST_TYPE = pa.list_(pa.dictionary(pa.int32(), pa.string()))
+
+
+def category_lists(offsets, codes, labels):
+    """Colonna Category_List dalla CSR: la riga i contiene labels[codes[offsets[i]:offsets[i + 1]]]."""
+    names = pa.DictionaryArray.from_arrays(pa.array(np.asarray(codes, dtype=np.int32)),
+                                           pa.array(np.asarray(labels, dtype=object), type=pa.string()))
+    lists = pa.ListArray.from_arrays(pa.array(np.asarray(offsets, dtype=np.int32)), names)
+    return pd.arrays.ArrowExtensionArray(lists)
+
+
+def _is_category_lists(series):
+    return isinstance(series.dtype, pd.ArrowDtype) and series.dtype.pyarrow_dtype == CATEGORY_LIST_TYPE
+
+
+def _to_category_lists(series):
+    """Converte una colonna di liste Python (o array) nella rappresentazione a codici."""
+    values = [[] if v is None or isinstance(v, float) else [str(name) for name in v] for v in series]
+    lengths = np.fromiter((len(v) for v in values), dtype=np.int64, count=len(values))
+    offsets = np.zeros(len(values) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    codes, labels = pd.factorize(pd.Series([name for v in values for name in v], dtype=object))
+    return category_lists(offsets, codes, labels.to_numpy(dtype=object))
+
+
+def _cast(series, dtype):
+    if dtype in ('int32', 'float32', 'uint64'):
+        values = series
+        if not pd.api.types.is_numeric_dtype(values):
+            values = pd.to_numeric(values.replace('', np.nan), errors='coerce')
+        if dtype == 'float32':
+            return values.astype('float32')
+        return values.fillna(0).clip(lower=0 if dtype == 'uint64' else None).astype(dtype)
+    return series.astype(dtype)
+
+
+def compact_products(products):
+    """Applica lo schema compatto al catalogo mappato; le colonne assenti vengono ignorate."""
+    columns = {}
+    for col in products.columns:
+        series = products[col]
+        dtype = CATALOG_SCHEMA.get(col, 'category' if CATEGORY_COLUMN_PATTERN.match(col) else None)
+        if col == 'Category_List':
+            if not _is_category_lists(series):
+                columns[col] = pd.Series(_to_category_lists(series), index=products.index)
+        elif col in SMALL_INT_COLUMNS:
+            values = pd.to_numeric(series, errors='coerce').fillna(0).astype('int64')
+            columns[col] = pd.to_numeric(values, downcast='integer')
+        elif dtype is not None and series.dtype != dtype:
+            columns[col] = _cast(series, dtype)
+    return products.assign(**columns) if columns else products
+
+
+def format_ean13(ean):
+    """EAN13 come testo di 13 cifre (vuoto se assente), per visualizzazione ed esportazione."""
+    if not pd.api.types.is_numeric_dtype(ean):
+        return ean
+    return ean.astype('uint64').astype(str).str.zfill(13).where(ean > 0, '')
+
+
+def decimal_values(values):
+    """Valori float32 come float64 con le stesse cifre decimali (es. 23.29 e non 23.290000915)."""
+    if values.dtype != np.float32:
+        return values
+    return values.astype(str).astype('float64')
+
+
+def memory_report(before, after):
+    """Memoria per colonna (byte) di un catalogo prima e dopo la compattazione."""
+    report = pd.DataFrame({
+        'before': before.memory_usage(index=False, deep=True),
+        'after': after.memory_usage(index=False, deep=True),
+    }).fillna(0).astype('int64')
+    report.loc['TOTAL'] = report.sum()
+    report['ratio'] = (report['before'] / report['after'].where(report['after'] > 0)).round(2)
+    return report
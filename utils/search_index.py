@@ -0,0 +1,305 @@
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from utils.catalog_utils import build_category_csr
+from utils.schema import decimal_values
+
+# Righe indicizzate per blocco durante la costruzione dell'indice
+BUILD_CHUNK_SIZE = 20_000
+
+# Ricerche memorizzate per ciascun indice
+LOOKUP_CACHE_SIZE = 256
+
+
+def _ranges(starts, stops):
+    """Concatena gli intervalli [starts[i], stops[i]) senza cicli Python."""
+    lengths = stops - starts
+    total = int(lengths.sum())
+    if total == 0:
+        return np.empty(0, dtype=np.int64)
+    offsets = np.cumsum(lengths) - lengths
+    return np.arange(total) - np.repeat(offsets - starts, lengths)
+
+
+def _sorted_unique(values):
+    values = np.sort(values)
+    keep = np.ones(len(values), dtype=bool)
+    keep[1:] = values[1:] != values[:-1]
+    return values[keep]
+
+
+def _freeze(rows):
+    rows.flags.writeable = False
+    return rows
+
+
+class KeywordIndex:
+    """Indice invertito sui token di una colonna di testo, con semantica di sottostringa.
+
+    I token sono le sequenze di caratteri senza spazi del testo in minuscolo. Una parola
+    chiave senza spazi è contenuta nel testo se e solo se è contenuta in uno dei suoi token:
+    basta quindi cercarla nel vocabolario (molto più piccolo del testo) e unire le liste di
+    righe dei token trovati. Le parole chiave con spazi usano le liste dei loro pezzi come
+    candidati e vengono verificate solo su quelle righe.
+    """
+
+    def __init__(self, texts):
+        self._texts = pd.Series(texts).reset_index(drop=True).fillna('').astype(str).str.lower()
+        self.size = len(self._texts)
+
+        vocabulary = {}
+        keys = []
+        for start in range(0, self.size, BUILD_CHUNK_SIZE):
+            # Divisione in token e codifica a dizionario eseguite da Arrow, senza cicli Python
+            texts = pa.array(self._texts.iloc[start:start + BUILD_CHUNK_SIZE], type=pa.large_string())
+            if isinstance(texts, pa.ChunkedArray):
+                texts = texts.combine_chunks()
+            tokens = pc.utf8_split_whitespace(texts)
+            rows = pc.list_parent_indices(tokens).to_numpy().astype(np.int64) + start
+            encoded = pc.dictionary_encode(pc.list_flatten(tokens))
+            distinct = encoded.dictionary.to_pylist()
+            token_ids = np.fromiter((vocabulary.setdefault(token, len(vocabulary)) for token in distinct),
+                                    dtype=np.int64, count=len(distinct))
+            codes = encoded.indices.to_numpy(zero_copy_only=False).astype(np.int64)
+            keys.append(_sorted_unique(token_ids[codes] * self.size + rows))
+
+        # Coppie (token, riga) ordinate e senza duplicati; ordinamento sul posto e limiti dei
+        # token per ricerca binaria, per non tenere altre copie delle coppie in memoria
+        pairs = np.concatenate(keys) if keys else np.empty(0, dtype=np.int64)
+        del keys
+        pairs.sort()
+        self._offsets = np.searchsorted(pairs, np.arange(len(vocabulary) + 1, dtype=np.int64) * max(self.size, 1))
+        np.remainder(pairs, max(self.size, 1), out=pairs)
+        self._postings = pairs.astype(np.int32)
+        del pairs
+        self._vocabulary = pd.Series(list(vocabulary), dtype=str)
+        self.rows_containing = lru_cache(maxsize=LOOKUP_CACHE_SIZE)(self._rows_containing)
+
+    def _rows_containing(self, keyword):
+        """Posizioni (ordinate) delle righe il cui testo contiene la parola chiave."""
+        keyword = keyword.lower()
+        if keyword == '':
+            return _freeze(np.arange(self.size))
+
+        pieces = keyword.split()
+        if pieces == [keyword]:
+            token_ids = np.flatnonzero(self._vocabulary.str.contains(keyword, regex=False).to_numpy(dtype=bool))
+            mask = np.zeros(self.size, dtype=bool)
+            mask[self._postings[_ranges(self._offsets[token_ids], self._offsets[token_ids + 1])]] = True
+            return _freeze(np.flatnonzero(mask))
+
+        # Parola chiave con spazi: candidati dai pezzi, poi verifica sul testo
+        candidates = self.rows_containing(pieces[0]) if pieces else np.arange(self.size)
+        for piece in pieces[1:]:
+            candidates = np.intersect1d(candidates, self.rows_containing(piece), assume_unique=True)
+        texts = self._texts.iloc[candidates]
+        return _freeze(candidates[texts.str.contains(keyword, regex=False).to_numpy(dtype=bool)])
+
+    def rows_containing_all(self, keywords):
+        """Righe che contengono tutte le parole chiave (intersezione delle liste)."""
+        result = None
+        for rows in sorted((self.rows_containing(kw) for kw in keywords), key=len):
+            result = rows if result is None else np.intersect1d(result, rows, assume_unique=True)
+            if len(result) == 0:
+                break
+        return np.arange(self.size) if result is None else result
+
+    def mask_containing_any(self, keywords):
+        """Maschera delle righe che contengono almeno una delle parole chiave (unione)."""
+        mask = np.zeros(self.size, dtype=bool)
+        for kw in keywords:
+            mask[self.rows_containing(kw)] = True
+        return mask
+
+
+class TextSearchIndex:
+    """Indici per parola chiave sulle colonne NAME e DESCRIPTION del catalogo."""
+
+    def __init__(self, products):
+        self.size = len(products)
+        self.name = KeywordIndex(products['NAME'])
+        self.description = KeywordIndex(products['DESCRIPTION'])
+
+    def match_all(self, field, keywords):
+        """Posizioni delle righe il cui campo contiene tutte le parole chiave (logica AND)."""
+        index = self.name if field == 'NAME' else self.description
+        return index.rows_containing_all(keywords)
+
+    def match_any(self, keywords):
+        """Posizioni delle righe in cui nome o descrizione contengono una parola chiave (logica OR)."""
+        mask = self.name.mask_containing_any(keywords) | self.description.mask_containing_any(keywords)
+        return np.flatnonzero(mask)
+
+
+class CategoryIndex:
+    """Liste di righe per categoria e per produttore, con conteggi per le faccette.
+
+    Le categorie di ogni prodotto vengono dalla CSR di build_category_csr; le coppie
+    (categoria, riga) sono ordinate per categoria, così le righe di una categoria sono un
+    intervallo contiguo e i conteggi si ottengono con un solo bincount.
+    """
+
+    def __init__(self, products, categories):
+        self.size = len(products)
+        csr = build_category_csr(products['CATEGORY'], categories)
+
+        # Categorie con lo stesso nome (o ID diversi con lo stesso nome) diventano un solo codice
+        label_codes, self.categories = pd.factorize(pd.Series(csr.labels, dtype=object), sort=True)
+        entry_codes = label_codes[csr.codes] if len(csr.codes) else np.empty(0, dtype=np.int64)
+        entry_rows = np.repeat(np.arange(self.size, dtype=np.int64), np.diff(csr.offsets))
+        valid = entry_codes >= 0
+        pairs = _sorted_unique(entry_codes[valid].astype(np.int64) * max(self.size, 1) + entry_rows[valid])
+        self._entry_categories = (pairs // max(self.size, 1)).astype(np.int32)
+        self._entry_rows = (pairs % max(self.size, 1)).astype(np.int32)
+        self._offsets = np.zeros(len(self.categories) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self._entry_categories, minlength=len(self.categories)), out=self._offsets[1:])
+
+        self.manufacturer_codes, self.manufacturers = pd.factorize(products['Manufacturer'], sort=True)
+
+    def _category_codes(self, names):
+        codes = self.categories.get_indexer(list(names))
+        return codes[codes >= 0]
+
+    def mask_in_any(self, names):
+        """Maschera dei prodotti che appartengono ad almeno una delle categorie."""
+        codes = self._category_codes(names)
+        mask = np.zeros(self.size, dtype=bool)
+        mask[self._entry_rows[_ranges(self._offsets[codes], self._offsets[codes + 1])]] = True
+        return mask
+
+    def rows_in_any(self, names):
+        """Posizioni (ordinate) dei prodotti che appartengono ad almeno una delle categorie."""
+        return np.flatnonzero(self.mask_in_any(names))
+
+    def mask_manufacturers(self, names):
+        """Maschera dei prodotti dei produttori indicati."""
+        codes = self.manufacturers.get_indexer(list(names))
+        return np.isin(self.manufacturer_codes, codes[codes >= 0])
+
+    def category_counts(self, mask=None):
+        """Numero di prodotti per categoria tra quelli selezionati da mask (solo quelle presenti)."""
+        entries = self._entry_categories if mask is None else self._entry_categories[mask[self._entry_rows]]
+        counts = np.bincount(entries, minlength=len(self.categories))
+        return pd.Series(counts, index=self.categories)[counts > 0]
+
+    def manufacturer_counts(self, mask=None):
+        """Numero di prodotti per produttore tra quelli selezionati da mask (solo quelli presenti)."""
+        codes = self.manufacturer_codes if mask is None else self.manufacturer_codes[mask]
+        counts = np.bincount(codes[codes >= 0], minlength=len(self.manufacturers))
+        return pd.Series(counts, index=self.manufacturers)[counts > 0]
+
+
+def _trigram_keys(codes):
+    """Chiavi a 63 bit dei trigrammi di una sequenza di code point (21 bit per carattere)."""
+    codes = codes.astype(np.uint64)
+    return (codes[:-2] << np.uint64(42)) | (codes[1:-1] << np.uint64(21)) | codes[2:]
+
+
+def _code_points(text):
+    return np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32)
+
+
+class ProductLookup:
+    """Ricerca dei prodotti per nome, ID o EAN13, per i selettori con suggerimenti.
+
+    Gli ID si cercano con una tabella hash, gli EAN13 su un array ordinato (entrambi per
+    corrispondenza esatta). I nomi hanno un
+    array ordinato per la ricerca per prefisso e un indice di trigrammi per quella per
+    sottostringa: i trigrammi della ricerca danno i candidati, verificati poi sul testo.
+    I prezzi sono in un array indicizzato per posizione, per calcolare i totali per ID.
+    """
+
+    def __init__(self, products):
+        self.size = len(products)
+        ids = products['ID'].astype(str)
+        first = ~ids.duplicated().to_numpy()
+        self.ids = pd.Index(ids[first])
+        self._id_rows = np.flatnonzero(first)
+        self.ids.get_indexer(self.ids[:1])  # costruisce subito la tabella hash degli ID
+        ean = pd.to_numeric(products['EAN13'], errors='coerce').fillna(0).to_numpy(dtype=np.uint64)
+        self._ean_rows = np.argsort(ean, kind='stable')
+        self._sorted_ean = ean[self._ean_rows]
+        self.prices = decimal_values(products['PRICE']).to_numpy(dtype=np.float64, na_value=np.nan)
+        self._names = products['NAME'].fillna('').astype(str).str.lower().to_numpy(dtype=object)
+
+        # Prefissi: nomi ordinati e posizione della riga di ciascuno
+        self._name_order = np.argsort(self._names, kind='stable')
+        self._sorted_names = self._names[self._name_order]
+
+        # Trigrammi: tutti i nomi in un'unica sequenza separata da \0, senza cicli per riga
+        self._lengths = lengths = np.fromiter((len(name) for name in self._names), dtype=np.int64, count=self.size)
+        # ogni nome è seguito da \0; altri due \0 in coda danno un trigramma per ogni carattere
+        codes = _code_points('\0'.join(self._names) + '\0' * 3)
+        rows = np.repeat(np.arange(self.size, dtype=np.int64), lengths + 1)
+        keys = _trigram_keys(codes)
+        valid = (codes[:-2] != 0) & (codes[1:-1] != 0) & (codes[2:] != 0)
+        keys, rows = keys[valid], rows[valid]
+        order = np.lexsort((rows, keys))
+        keys, rows = keys[order], rows[order]
+        keep = np.ones(len(keys), dtype=bool)
+        keep[1:] = (keys[1:] != keys[:-1]) | (rows[1:] != rows[:-1])
+        self._trigram_keys, self._trigram_rows = keys[keep], rows[keep].astype(np.int32)
+
+    def positions_of(self, ids):
+        """Posizioni dei prodotti con gli ID indicati (-1 se assenti)."""
+        found = self.ids.get_indexer([str(product_id) for product_id in ids])
+        return np.where(found >= 0, self._id_rows[found], -1)
+
+    def _exact(self, text):
+        rows = [position for position in self.positions_of([text]) if position >= 0]
+        if text.isdigit() and len(text) <= 14 and int(text) > 0:
+            ean = np.uint64(int(text))
+            start, stop = np.searchsorted(self._sorted_ean, [ean, ean + np.uint64(1)])
+            rows.extend(self._ean_rows[start:stop].tolist())
+        return rows
+
+    def _prefix(self, text, limit):
+        start = np.searchsorted(self._sorted_names, text, side='left')
+        stop = np.searchsorted(self._sorted_names, text + '\U0010ffff', side='left')
+        return self._name_order[start:min(stop, start + limit)]
+
+    def _substring(self, text, limit):
+        keys = np.unique(_trigram_keys(_code_points(text)))
+        candidates = None
+        for key in keys:
+            start, stop = np.searchsorted(self._trigram_keys, [key, key + np.uint64(1)])
+            rows = self._trigram_rows[start:stop]
+            candidates = rows if candidates is None else np.intersect1d(candidates, rows, assume_unique=True)
+            if len(candidates) == 0:
+                return []
+        # Prima i nomi più corti, cioè quelli in cui la ricerca pesa di più; la verifica sul
+        # testo (i trigrammi possono dare falsi positivi) si ferma ai primi `limit`
+        candidates = candidates[np.argsort(self._lengths[candidates], kind='stable')]
+        if len(keys) == 1 and len(text) == 3:
+            return candidates[:limit].tolist()
+        matches = []
+        for row in candidates.tolist():
+            if text in self._names[row]:
+                matches.append(row)
+                if len(matches) == limit:
+                    break
+        return matches
+
+    def search(self, text, limit=20):
+        """Posizioni dei primi `limit` prodotti per la ricerca: ID/EAN13 esatti, poi nomi per prefisso e per sottostringa."""
+        text = (text or '').strip()
+        if not text:
+            return np.empty(0, dtype=np.int64)
+        results = dict.fromkeys(self._exact(text))
+        query = text.lower()
+        results.update(dict.fromkeys(self._prefix(query, limit).tolist()))
+        if len(results) < limit and len(query) >= 3:
+            results.update(dict.fromkeys(self._substring(query, limit)))
+        return np.array(list(results)[:limit], dtype=np.int64)
+
+    def totals(self, lines):
+        """Totale di righe {ID: quantità} calcolato sull'array dei prezzi."""
+        if not lines:
+            return 0.0
+        positions = self.positions_of(lines.keys())
+        quantities = np.fromiter(lines.values(), dtype=np.float64, count=len(lines))
+        found = positions >= 0
+        return float(np.nansum(self.prices[positions[found]] * quantities[found]))
@@ -0,0 +1,124 @@
+import json
+import os
+import threading
+
+from utils.sqlite_pool import POOL_SIZE, ConnectionPool
+
+# Database delle sessioni e vecchio file JSON da cui migrare
+SESSION_DB = "utils/user_sessions.db"
+LEGACY_SESSION_FILE = "utils/user_sessions.json"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    role TEXT NOT NULL,
+    last_page TEXT NOT NULL DEFAULT 'dashboard'
+);
+CREATE TABLE IF NOT EXISTS user_data (
+    username TEXT NOT NULL REFERENCES users(username),
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (username, key)
+) WITHOUT ROWID;
+"""
+
+
+class SessionStore:
+    """Stato degli utenti in SQLite (modalità WAL), una riga per (utente, chiave).
+
+    Ogni scrittura aggiorna solo la chiave interessata con un upsert atomico, quindi il
+    costo non dipende dai dati degli altri utenti e sessioni concorrenti non si
+    sovrascrivono a vicenda. Le connessioni sono riutilizzate da un piccolo pool.
+    """
+
+    def __init__(self, path=SESSION_DB, legacy_file=LEGACY_SESSION_FILE, pool_size=POOL_SIZE):
+        self.path = path
+        self._db = ConnectionPool(path, SCHEMA, pool_size)
+        if legacy_file:
+            self.migrate_json(legacy_file)
+
+    def migrate_json(self, legacy_file):
+        """Importa il vecchio file JSON delle sessioni, una sola volta.
+
+        Il file viene rinominato in `.migrated` dopo l'importazione; gli utenti già
+        presenti nel database non vengono sovrascritti.
+        """
+        if not os.path.exists(legacy_file):
+            return 0
+        try:
+            with open(legacy_file, "r") as file:
+                sessions = json.load(file)
+        except json.JSONDecodeError:
+            print("Errore nel leggere il file di sessione: migrazione saltata.")
+            return 0
+
+        with self._db.transaction() as conn:
+            for username, session in sessions.items():
+                inserted = conn.execute(
+                    "INSERT OR IGNORE INTO users (username, role, last_page) VALUES (?, ?, ?)",
+                    (username, session.get("role", ""), session.get("last_page") or "dashboard"),
+                ).rowcount
+                if inserted:
+                    conn.executemany(
+                        "INSERT INTO user_data (username, key, value) VALUES (?, ?, ?)",
+                        [(username, key, json.dumps(value)) for key, value in session.get("data", {}).items()],
+                    )
+        os.replace(legacy_file, legacy_file + ".migrated")
+        return len(sessions)
+
+    def ensure_user(self, username, role):
+        """Crea l'utente se non esiste e ne aggiorna il ruolo."""
+        with self._db.connection() as conn:
+            conn.execute(
+                "INSERT INTO users (username, role) VALUES (?, ?) "
+                "ON CONFLICT(username) DO UPDATE SET role = excluded.role",
+                (username, role),
+            )
+
+    def get_user(self, username):
+        """Ruolo, ultima pagina e dati dell'utente, oppure None se non esiste."""
+        with self._db.connection() as conn:
+            row = conn.execute("SELECT role, last_page FROM users WHERE username = ?", (username,)).fetchone()
+            if row is None:
+                return None
+            data = {key: json.loads(value) for key, value in
+                    conn.execute("SELECT key, value FROM user_data WHERE username = ?", (username,))}
+        return {"role": row[0], "last_page": row[1], "data": data}
+
+    def set_value(self, username, key, value):
+        """Salva una chiave dei dati dell'utente; restituisce False se l'utente non esiste."""
+        with self._db.connection() as conn:
+            cursor = conn.execute(
+                "INSERT INTO user_data (username, key, value) "
+                "SELECT username, ?, ? FROM users WHERE username = ? "
+                "ON CONFLICT(username, key) DO UPDATE SET value = excluded.value",
+                (key, json.dumps(value), username),
+            )
+            return cursor.rowcount > 0
+
+    def get_value(self, username, key, default=None):
+        """Legge una sola chiave dei dati dell'utente."""
+        with self._db.connection() as conn:
+            row = conn.execute("SELECT value FROM user_data WHERE username = ? AND key = ?", (username, key)).fetchone()
+        return default if row is None else json.loads(row[0])
+
+    def set_last_page(self, username, page):
+        with self._db.connection() as conn:
+            conn.execute("UPDATE users SET last_page = ? WHERE username = ?", (page, username))
+
+    def close(self):
+        self._db.close()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_session_store():
+    """Archivio delle sessioni condiviso dal processo, aperto al primo utilizzo."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = SessionStore()
+    return _store
@@ -0,0 +1,67 @@
+import os
+import queue
+import sqlite3
+from contextlib import contextmanager
+
+# Connessioni tenute aperte nel pool
+POOL_SIZE = 8
+
+# Attesa massima (ms) quando un altro processo tiene il lock in scrittura
+BUSY_TIMEOUT_MS = 5000
+
+
+class ConnectionPool:
+    """Piccolo pool di connessioni SQLite in modalità WAL, condivisibile tra thread.
+
+    Le connessioni sono in autocommit; transaction() apre una transazione in scrittura
+    (BEGIN IMMEDIATE) che viene annullata se il blocco solleva un'eccezione.
+    """
+
+    def __init__(self, path, schema=None, pool_size=POOL_SIZE):
+        self.path = path
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if schema:
+            with self.connection() as conn:
+                conn.executescript(schema)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+        try:
+            yield conn
+        finally:
+            try:
+                self._pool.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+
+    @contextmanager
+    def transaction(self):
+        with self.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def close(self):
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
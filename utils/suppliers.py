@@ -0,0 +1,164 @@
+import hashlib
+import re
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+# Fornitore dei cataloghi importati prima degli adattatori
+DEFAULT_SUPPLIER = 'BigBuy'
+
+# ID ricavati dai nomi (categorie e produttori senza file propri): tra 2^30 e 2^31, così
+# stanno in BRAND (int32) e non si sovrappongono agli ID numerici dei fornitori
+HASHED_ID_BASE = 1 << 30
+
+# Colonne dei file categorie e produttori BigBuy
+BIGBUY_REFERENCE_COLUMNS = {'ID': 'ID', 'NAME': 'NAME'}
+
+
+def name_id(name):
+    """ID stabile di una categoria o di un produttore identificato solo dal nome."""
+    digest = hashlib.blake2b(name.encode('utf-8'), digest_size=4).digest()
+    return HASHED_ID_BASE | (int.from_bytes(digest, 'little') & (HASHED_ID_BASE - 1))
+
+
+@dataclass(frozen=True)
+class SupplierAdapter:
+    """Formato dei file di un fornitore, tradotto nello schema normalizzato del catalogo.
+
+    `product_columns` associa le colonne del fornitore a quelle normalizzate (ID, NAME,
+    DESCRIPTION, CATEGORY, BRAND, PRICE, STOCK, EAN13, IMAGE1, DATE_ADD, DATE_UPD); le
+    altre colonne non vengono lette. I fornitori senza file di categorie e produttori
+    (`reference_files=False`) hanno nel file prodotti i nomi delle categorie, separati da
+    `category_separator`, e il nome del produttore: gli ID vengono ricavati dai nomi.
+    """
+
+    name: str
+    product_columns: dict
+    reference_columns: dict = field(default_factory=lambda: dict(BIGBUY_REFERENCE_COLUMNS))
+    delimiter: str = ';'
+    # utf-8-sig toglie il BOM all'inizio del file, se presente
+    encoding: str = 'utf-8-sig'
+    decimal: str = '.'
+    reference_files: bool = True
+    category_separator: str = ','
+    # Le categorie sono un percorso (es. "Casa > Cucina"): ogni livello è una categoria
+    category_path: bool = False
+    # Prefisso degli ID prodotto, per non confonderli con quelli degli altri fornitori
+    id_prefix: str = ''
+
+    @property
+    def key(self):
+        return self.name.lower()
+
+    def read_options(self, kind):
+        """Argomenti di pandas.read_csv per un file prodotti, categorie o produttori."""
+        columns = self.product_columns if kind == 'products' else self.reference_columns
+        return {
+            'delimiter': self.delimiter,
+            'encoding': self.encoding,
+            'encoding_errors': 'replace',
+            'usecols': lambda col: col.strip() in columns,
+        }
+
+    def rename(self, chunk, kind):
+        """Porta le colonne di un blocco ai nomi normalizzati."""
+        columns = self.product_columns if kind == 'products' else self.reference_columns
+        chunk.columns = chunk.columns.str.strip()
+        chunk = chunk.rename(columns=columns)
+        if kind == 'products':
+            if self.id_prefix and 'ID' in chunk.columns:
+                chunk['ID'] = self.id_prefix + chunk['ID'].str.strip()
+            if self.decimal != '.' and 'PRICE' in chunk.columns:
+                # I punti sono separatori delle migliaia solo se seguiti dalla virgola decimale
+                # ("1.234,50"); un valore già scritto col punto ("12.50") resta invariato
+                thousands = r'\.(?=.*' + re.escape(self.decimal) + ')'
+                chunk['PRICE'] = chunk['PRICE'].str.replace(thousands, '', regex=True).str.replace(self.decimal, '.', regex=False)
+            chunk['SUPPLIER'] = self.name
+        return chunk
+
+    def _category_ids(self, text):
+        names = [name.strip() for name in text.split(self.category_separator)]
+        names = [name for name in names if name]
+        if self.category_path:
+            keys = [self.category_separator.join(names[:i + 1]) for i in range(len(names))]
+        else:
+            keys = names
+        return [name_id(key) for key in keys], names
+
+    def inline_references(self, chunk):
+        """Sostituisce nomi di categorie e produttori con ID ricavati dai nomi.
+
+        Le stringhe distinte del blocco vengono elaborate una sola volta. Restituisce il
+        blocco e le tabelle (ID, NAME) di categorie e produttori che vi compaiono.
+        """
+        references = {}
+        if 'CATEGORY' in chunk.columns:
+            keys, distinct = pd.factorize(chunk['CATEGORY'].fillna(''))
+            id_strings, names = [], {}
+            for text in distinct:
+                ids, labels = self._category_ids(text)
+                names.update(zip(ids, labels))
+                id_strings.append(','.join(map(str, ids)))
+            chunk['CATEGORY'] = np.asarray(id_strings, dtype=object)[keys] if len(distinct) else ''
+            references['categories'] = pd.DataFrame({'ID': list(names), 'NAME': list(names.values())})
+        if 'BRAND' in chunk.columns:
+            keys, distinct = pd.factorize(chunk['BRAND'].fillna('').str.strip())
+            ids = np.array([name_id(name) if name else 0 for name in distinct], dtype=np.int64)
+            chunk['BRAND'] = ids[keys] if len(distinct) else 0
+            references['manufacturers'] = pd.DataFrame({'ID': ids[ids > 0], 'NAME': np.asarray(distinct, dtype=object)[ids > 0]})
+        return chunk, references
+
+
+BIGBUY = SupplierAdapter(
+    name='BigBuy',
+    product_columns={col: col for col in (
+        'ID', 'NAME', 'DESCRIPTION', 'CATEGORY', 'BRAND', 'PRICE', 'STOCK', 'EAN13', 'IMAGE1', 'DATE_ADD', 'DATE_UPD',
+    )},
+)
+
+# Feed CSV di Dreamlove: categorie e marca per nome, prezzi con la virgola decimale
+DREAMLOVE = SupplierAdapter(
+    name='Dreamlove',
+    product_columns={
+        'reference': 'ID',
+        'name': 'NAME',
+        'description': 'DESCRIPTION',
+        'categories': 'CATEGORY',
+        'brand': 'BRAND',
+        'price': 'PRICE',
+        'stock': 'STOCK',
+        'ean': 'EAN13',
+        'image': 'IMAGE1',
+        'date_upd': 'DATE_UPD',
+    },
+    delimiter=';',
+    decimal=',',
+    reference_files=False,
+    category_separator=',',
+    id_prefix='DL-',
+)
+
+# Feed CSV di vidaXL: categoria come percorso "Livello 1 > Livello 2 > ..."
+VIDAXL = SupplierAdapter(
+    name='VidaXL',
+    product_columns={
+        'SKU': 'ID',
+        'Title': 'NAME',
+        'Description': 'DESCRIPTION',
+        'Category': 'CATEGORY',
+        'Brand': 'BRAND',
+        'B2B price': 'PRICE',
+        'Stock': 'STOCK',
+        'EAN': 'EAN13',
+        'Image 1': 'IMAGE1',
+    },
+    delimiter=',',
+    reference_files=False,
+    category_separator=' > ',
+    category_path=True,
+    id_prefix='VX-',
+)
+
+# Fornitori disponibili, per nome
+SUPPLIERS = {adapter.name: adapter for adapter in (BIGBUY, DREAMLOVE, VIDAXL)}
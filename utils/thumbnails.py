@@ -0,0 +1,275 @@
+import hashlib
+import io
+import os
+import tempfile
+import threading
+import time
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.sqlite_pool import ConnectionPool
+
+# Miniature servite da Streamlit come file statici (server.enableStaticServing). L'URL è
+# relativo alla pagina, così resta valido anche con server.baseUrlPath
+THUMBNAIL_DIR = os.path.join("static", "thumbnails")
+THUMBNAIL_URL = "app/static/thumbnails"
+
+# Indice URL -> miniatura e uso dei file, per la rimozione LRU (fuori dalla directory servita)
+THUMBNAIL_DB = "utils/thumbnails.db"
+
+# Lato massimo delle miniature (px): il doppio dei 50 px della tabella, per gli schermi ad alta densità
+THUMBNAIL_SIZE = (100, 100)
+THUMBNAIL_QUALITY = 75
+
+# Spazio su disco delle miniature (MB, configurabile da ambiente); oltre si rimuovono le meno usate
+THUMBNAIL_CACHE_BYTES = int(os.environ.get("THUMBNAIL_CACHE_MB", "256")) * 1024 * 1024
+
+# Download contemporanei e in coda
+FETCH_WORKERS = 8
+MAX_PENDING = 512
+
+# Limiti di ogni download
+FETCH_TIMEOUT = 10
+MAX_IMAGE_BYTES = 20 * 1024 * 1024
+
+# Schemi scaricabili dal server: gli URL arrivano dai feed caricati, e con file:// o ftp://
+# un feed potrebbe far leggere e pubblicare come miniatura file locali o di altri servizi
+FETCH_SCHEMES = ("http", "https")
+
+# Dopo un errore, un URL non viene riscaricato prima di questo intervallo (s)
+RETRY_AFTER = 3600
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    digest TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    last_used REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS files_last_used ON files (last_used);
+CREATE TABLE IF NOT EXISTS urls (
+    url TEXT PRIMARY KEY,
+    digest TEXT,
+    failed_at REAL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS urls_digest ON urls (digest);
+"""
+
+
+def _check_scheme(url):
+    if urllib.parse.urlsplit(url).scheme.lower() not in FETCH_SCHEMES:
+        raise ValueError(f"Schema non consentito per le miniature: {url}")
+
+
+class _RedirectHandler(urllib.request.HTTPRedirectHandler):
+    """Segue i reindirizzamenti solo verso gli schemi consentiti."""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        _check_scheme(newurl)
+        return super().redirect_request(req, fp, code, msg, headers, newurl)
+
+
+_opener = urllib.request.build_opener(_RedirectHandler)
+
+
+def fetch_url(url):
+    """Scarica un'immagine (solo http e https) fino a MAX_IMAGE_BYTES.
+
+    Gli altri schemi sollevano ValueError, come gli errori di download: l'URL viene
+    segnato come non riuscito e la pagina mostra l'immagine originale.
+    """
+    _check_scheme(url)
+    request = urllib.request.Request(url, headers={"User-Agent": "catalogo-thumbnails"})
+    with _opener.open(request, timeout=FETCH_TIMEOUT) as response:
+        data = response.read(MAX_IMAGE_BYTES + 1)
+    if len(data) > MAX_IMAGE_BYTES:
+        raise ValueError(f"Immagine troppo grande: {url}")
+    return data
+
+
+def make_thumbnail(data, size=THUMBNAIL_SIZE, quality=THUMBNAIL_QUALITY):
+    """Miniatura WebP di un'immagine (proporzioni mantenute)."""
+    from PIL import Image, ImageOps
+
+    with Image.open(io.BytesIO(data)) as image:
+        # I JPEG vengono decodificati direttamente a una risoluzione ridotta
+        image.draft("RGB", (size[0] * 2, size[1] * 2))
+        image = ImageOps.exif_transpose(image)
+        image = image.convert("RGBA" if "A" in image.getbands() or image.mode == "P" else "RGB")
+        image.thumbnail(size, Image.Resampling.LANCZOS, reducing_gap=2.0)
+        out = io.BytesIO()
+        image.save(out, format="WEBP", quality=quality, method=4)
+    return out.getvalue()
+
+
+class ThumbnailCache:
+    """Miniature delle immagini dei prodotti, in una cache su disco indirizzata per contenuto.
+
+    Il file di ogni miniatura ha come nome l'hash del suo contenuto (URL diversi con la
+    stessa immagine condividono il file); un indice SQLite associa gli URL ai file e
+    tiene l'ultimo utilizzo, per rimuovere i meno usati quando si supera `max_bytes`.
+    Le miniature mancanti vengono create in background da un pool di thread limitato,
+    con `fetcher(url) -> bytes` sostituibile (es. per i test).
+    """
+
+    def __init__(self, directory=THUMBNAIL_DIR, url_prefix=THUMBNAIL_URL, fetcher=fetch_url,
+                 max_bytes=THUMBNAIL_CACHE_BYTES, workers=FETCH_WORKERS, size=THUMBNAIL_SIZE, index_path=THUMBNAIL_DB):
+        self.directory = directory
+        self.url_prefix = url_prefix
+        self.max_bytes = max_bytes
+        self.size = size
+        self._fetcher = fetcher
+        os.makedirs(directory, exist_ok=True)
+        self._db = ConnectionPool(index_path, SCHEMA)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="thumbnails")
+        self._pending = set()
+        self._lock = threading.Lock()
+        self.fetched = 0
+        self.failed = 0
+        self.evicted = 0
+
+    def _file_name(self, digest):
+        return f"{digest}.webp"
+
+    def _path(self, digest):
+        return os.path.join(self.directory, self._file_name(digest))
+
+    def thumbnail_urls(self, image_urls):
+        """URL delle miniature pronte (None per quelle non ancora disponibili).
+
+        Le miniature mancanti vengono messe in coda; quelle restituite sono segnate come
+        usate ora.
+        """
+        image_urls = [url if isinstance(url, str) and url else None for url in image_urls]
+        wanted = sorted({url for url in image_urls if url})
+        if not wanted:
+            return [None] * len(image_urls)
+
+        with self._db.connection() as conn:
+            placeholders = ",".join("?" * len(wanted))
+            rows = conn.execute(f"SELECT url, digest, failed_at FROM urls WHERE url IN ({placeholders})", wanted).fetchall()
+            known = {url: (digest, failed_at) for url, digest, failed_at in rows}
+            digests = sorted({digest for digest, _ in known.values() if digest})
+            if digests:
+                conn.execute(f"UPDATE files SET last_used = ? WHERE digest IN ({','.join('?' * len(digests))})",
+                             (time.time(), *digests))
+
+        now = time.time()
+        missing = [url for url in wanted
+                   if url not in known or (known[url][0] is None and now - (known[url][1] or 0) > RETRY_AFTER)]
+        self.prefetch(missing)
+
+        ready = {}
+        for url, (digest, _) in known.items():
+            if digest and os.path.exists(self._path(digest)):
+                ready[url] = f"{self.url_prefix}/{self._file_name(digest)}"
+            elif digest:
+                # File rimosso da fuori: si ricrea
+                self.prefetch([url])
+        return [ready.get(url) if url else None for url in image_urls]
+
+    def prefetch(self, image_urls):
+        """Mette in coda la creazione delle miniature (fino a MAX_PENDING in attesa)."""
+        for url in image_urls:
+            with self._lock:
+                if url in self._pending or len(self._pending) >= MAX_PENDING:
+                    continue
+                self._pending.add(url)
+            self._executor.submit(self._build, url)
+
+    def _build(self, url):
+        try:
+            try:
+                thumbnail = make_thumbnail(self._fetcher(url), self.size)
+            except Exception:
+                with self._db.connection() as conn:
+                    conn.execute(
+                        "INSERT INTO urls (url, digest, failed_at) VALUES (?, NULL, ?) "
+                        "ON CONFLICT(url) DO UPDATE SET digest = NULL, failed_at = excluded.failed_at",
+                        (url, time.time()),
+                    )
+                self.failed += 1
+                return
+
+            digest = hashlib.blake2b(thumbnail, digest_size=16).hexdigest()
+            path = self._path(digest)
+            if not os.path.exists(path):
+                fd, tmp_path = tempfile.mkstemp(prefix=".thumb_", dir=self.directory)
+                with os.fdopen(fd, "wb") as f:
+                    f.write(thumbnail)
+                os.replace(tmp_path, path)
+            with self._db.transaction() as conn:
+                conn.execute(
+                    "INSERT INTO files (digest, size, last_used) VALUES (?, ?, ?) "
+                    "ON CONFLICT(digest) DO UPDATE SET last_used = excluded.last_used",
+                    (digest, len(thumbnail), time.time()),
+                )
+                conn.execute(
+                    "INSERT INTO urls (url, digest, failed_at) VALUES (?, ?, NULL) "
+                    "ON CONFLICT(url) DO UPDATE SET digest = excluded.digest, failed_at = NULL",
+                    (url, digest),
+                )
+            self.fetched += 1
+            self._evict()
+        finally:
+            with self._lock:
+                self._pending.discard(url)
+
+    def _evict(self):
+        """Rimuove le miniature usate meno di recente finché la cache supera max_bytes."""
+        with self._db.connection() as conn:
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM files").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            removed = []
+            for digest, size in conn.execute("SELECT digest, size FROM files ORDER BY last_used"):
+                if total <= self.max_bytes:
+                    break
+                removed.append(digest)
+                total -= size
+        with self._db.transaction() as conn:
+            conn.executemany("DELETE FROM files WHERE digest = ?", [(d,) for d in removed])
+            conn.executemany("DELETE FROM urls WHERE digest = ?", [(d,) for d in removed])
+        for digest in removed:
+            try:
+                os.remove(self._path(digest))
+            except FileNotFoundError:
+                pass
+        self.evicted += len(removed)
+
+    def wait(self, timeout=None):
+        """Attende che le miniature in coda siano pronte (per script e test)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                if not self._pending:
+                    return True
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(0.02)
+
+    def stats(self):
+        with self._db.connection() as conn:
+            files, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM files").fetchone()
+        with self._lock:
+            pending = len(self._pending)
+        return {"files": files, "bytes": size, "budget_bytes": self.max_bytes, "pending": pending,
+                "fetched": self.fetched, "failed": self.failed, "evicted": self.evicted}
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._db.close()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_thumbnail_cache():
+    """Cache delle miniature condivisa dal processo, aperta al primo utilizzo."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ThumbnailCache()
+    return _cache
@@ -0,0 +1,102 @@
+import hashlib
+import os
+import re
+import tempfile
+import time
+
+# Directory in cui vengono salvati i file caricati
+UPLOAD_DIR = "temp_files"
+
+# Byte copiati per volta dal file caricato al disco
+UPLOAD_BLOCK_SIZE = 1024 * 1024
+
+# Spazio massimo dei file caricati (MB, configurabile da ambiente); oltre si rimuovono i meno recenti
+UPLOAD_MAX_BYTES = int(os.environ.get("UPLOAD_SPOOL_MB", "2048")) * 1024 * 1024
+
+# I file caricati non riutilizzati da più di questo intervallo (s) vengono rimossi
+UPLOAD_MAX_AGE = 7 * 24 * 3600
+
+# Nome dei file nella directory: <tipo>_<impronta del contenuto><estensione>
+DIGEST_PATTERN = re.compile(r"_([0-9a-f]{32})(\.[\w.]*)?$")
+
+
+def new_digest():
+    return hashlib.blake2b(digest_size=16)
+
+
+def file_digest(path):
+    """Impronta del contenuto di un file; per quelli caricati è già nel nome."""
+    if os.path.dirname(os.path.abspath(path)) == os.path.abspath(UPLOAD_DIR):
+        match = DIGEST_PATTERN.search(os.path.basename(path))
+        if match:
+            return match.group(1)
+    digest = new_digest()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(UPLOAD_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def spool_upload(uploaded_file, file_type, directory=UPLOAD_DIR):
+    """Salva un file caricato con l'impronta del contenuto nel nome e ne restituisce il percorso.
+
+    Il contenuto viene copiato a blocchi in un file temporaneo e contemporaneamente
+    hashato; se un file con la stessa impronta esiste già, il temporaneo viene scartato
+    e si riusa quello esistente (segnato come usato ora).
+    """
+    os.makedirs(directory, exist_ok=True)
+    digest = new_digest()
+    fd, tmp_path = tempfile.mkstemp(prefix=".upload_", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            uploaded_file.seek(0)
+            for block in iter(lambda: uploaded_file.read(UPLOAD_BLOCK_SIZE), b""):
+                digest.update(block)
+                f.write(block)
+        extension = os.path.splitext(uploaded_file.name)[1].lower()
+        path = os.path.join(directory, f"{file_type}_{digest.hexdigest()}{extension}")
+        if os.path.exists(path):
+            os.remove(tmp_path)
+            os.utime(path)
+        else:
+            os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    finally:
+        uploaded_file.seek(0)
+    return path
+
+
+def evict_uploads(directory=UPLOAD_DIR, max_bytes=UPLOAD_MAX_BYTES, max_age=UPLOAD_MAX_AGE, keep=()):
+    """Rimuove i file caricati troppo vecchi e poi i meno recenti oltre max_bytes.
+
+    Sono considerati solo i file salvati da spool_upload (impronta nel nome) e i loro
+    temporanei: gli altri file della directory, come i CSV di esempio, non vengono toccati
+    né contati nello spazio. I file in `keep` (quelli dell'importazione in corso) non
+    vengono mai rimossi. Restituisce il numero di file rimossi.
+    """
+    keep = {os.path.abspath(path) for path in keep}
+    try:
+        entries = [entry for entry in os.scandir(directory) if entry.is_file()
+                   and (DIGEST_PATTERN.search(entry.name) or entry.name.startswith(".upload_"))]
+    except FileNotFoundError:
+        return 0
+    now = time.time()
+    files = sorted((entry.stat().st_mtime, entry.stat().st_size, entry.path) for entry in entries)
+    total = sum(size for _, size, _ in files)
+    removed = 0
+    for mtime, size, path in files:
+        if os.path.abspath(path) in keep:
+            continue
+        if now - mtime <= max_age and (total <= max_bytes or os.path.basename(path).startswith(".upload_")):
+            # I temporanei recenti sono salvataggi in corso
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        removed += 1
+    return removed
@@ -0,0 +1,41 @@
+import importlib
+import threading
+
+# Moduli delle pagine importati in background dopo la prima pagina servita dal processo
+WARMUP_MODULES = (
+    "pandas",
+    "pyarrow",
+    "utils.data_utils",
+    "utils.catalog_registry",
+    "utils.invoice_ledger",
+    "utils.search_index",
+    "utils.query",
+    "utils.render",
+    "plotly.express",
+)
+
+_started = False
+_started_lock = threading.Lock()
+
+
+def _import_all(modules):
+    for name in modules:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            pass
+
+
+def start_warmup(modules=WARMUP_MODULES):
+    """Importa in background, una volta per processo, le librerie pesanti delle pagine.
+
+    La pagina iniziale non usa pandas: la si mostra subito e le librerie vengono caricate
+    mentre l'utente fa il login, così la prima pagina del catalogo o delle finanze non
+    paga l'import.
+    """
+    global _started
+    with _started_lock:
+        if _started:
+            return
+        _started = True
+    threading.Thread(target=_import_all, args=(modules,), name="warmup", daemon=True).start()